@@ -0,0 +1,172 @@
+"""
+Benchmark the sync, threaded and asyncio channel fetch paths.
+
+A local stand-in HTTP server answers Sky schedule, RadioTimes schedule and
+RadioTimes detail requests after a fixed delay, so the benchmark measures how
+well each orchestrator overlaps network latency without touching the real
+endpoints.
+
+Usage:
+    python benchmarks/bench_async.py [--sky 24] [--rt 4] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import pytz  # noqa: E402
+
+from src.executor import fetch_channels, fetch_channels_async  # noqa: E402
+from src.http import AsyncSession, make_session  # noqa: E402
+from src.providers import radiotimes, sky  # noqa: E402
+from src.providers.base import Context  # noqa: E402
+
+EVENTS_PER_DAY = 30
+EPISODES_PER_DAY = 20
+
+
+def _sky_payload(provider_ids: str, date: str) -> dict:
+    schedule = []
+    for provider_id in provider_ids.split(","):
+        events = [
+            {"t": f"Show {provider_id}/{i}", "sy": "Synopsis", "st": 1_700_000_000 + i * 1800, "d": 1800}
+            for i in range(EVENTS_PER_DAY)
+        ]
+        schedule.append({"sid": provider_id, "events": events})
+    return {"schedule": schedule}
+
+
+def _rt_payload(provider_id: str, date: str) -> list:
+    return [
+        {
+            "type": "episode",
+            "id": f"{provider_id}-{date}-{i}",
+            "title": f"Radio {i}",
+            "start": f"2024-01-02T{i:02d}:00:00Z",
+            "end": f"2024-01-02T{i:02d}:59:00Z",
+        }
+        for i in range(EPISODES_PER_DAY)
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def do_GET(self):  # noqa: N802 - http.server naming
+        time.sleep(self.latency)
+        path = self.path.split("?", 1)[0]
+        query = self.path.split("?", 1)[1] if "?" in self.path else ""
+        if m := re.fullmatch(r"/hawk/linear/schedule/(\d+)/([\w,]+)", path):
+            body = _sky_payload(m.group(2), m.group(1))
+        elif m := re.fullmatch(r"/rt/channels/([\w-]+)/schedule", path):
+            body = _rt_payload(m.group(1), query[5:15])
+        elif m := re.fullmatch(r"/rt/details/([\w:.-]+)", path):
+            body = {"description": f"Details {m.group(1)}", "image": {"url": "http://img/x.png"}}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _channels(n_sky: int, n_rt: int) -> list:
+    channels = [
+        {"src": "sky", "name": f"sky{i}", "provider_id": str(1000 + i), "xmltv_id": f"sky{i}.uk"}
+        for i in range(n_sky)
+    ]
+    channels += [
+        {"src": "rt", "name": f"rt{i}", "provider_id": f"rt-{i}", "xmltv_id": f"rt{i}.uk"}
+        for i in range(n_rt)
+    ]
+    return channels
+
+
+def _new_ctx(workers: int) -> Context:
+    session = make_session(pool_maxsize=max(10, workers))
+    return Context(session=session, tz=pytz.timezone("Europe/London"), days=7, caches={})
+
+
+def _quiet(func, *args, **kwargs):
+    """Call ``func`` with the per-channel progress output suppressed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sky", type=int, default=24, help="number of Sky channels")
+    parser.add_argument("--rt", type=int, default=4, help="number of RadioTimes channels")
+    parser.add_argument("--latency", type=float, default=0.05, help="server delay in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="threaded worker count")
+    args = parser.parse_args()
+
+    _Handler.latency = args.latency
+    server = _Server(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    sky.SCHEDULE_URL = base + "/hawk/linear/schedule/{date}/{provider_id}"
+    radiotimes.SCHEDULE_URL = base + "/rt/channels/{provider_id}/schedule"
+    radiotimes.DETAILS_URL = base + "/rt/details/{programme_id}"
+
+    providers = {"sky": sky, "rt": radiotimes}
+    channels = _channels(args.sky, args.rt)
+    sky_batches = -(-args.sky // sky.BATCH_SIZE)
+    requests_made = (sky_batches + args.rt) * 7 + args.rt * 7 * EPISODES_PER_DAY
+    print(f"{len(channels)} channels, ~{requests_made} requests, {args.latency * 1000:.0f} ms latency")
+
+    results = {}
+
+    start = time.perf_counter()
+    serial = _quiet(fetch_channels, channels, _new_ctx(1), providers, workers=1)
+    results["serial (workers=1)"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    threaded = _quiet(fetch_channels, channels, _new_ctx(args.workers), providers, workers=args.workers)
+    results[f"threaded (workers={args.workers})"] = time.perf_counter() - start
+
+    async def _run_async():
+        ctx = _new_ctx(args.workers)
+        async with AsyncSession(limit=256, limit_per_host=256) as session:
+            ctx.async_session = session
+            return await fetch_channels_async(
+                channels, ctx, providers, provider_limits={"sky": 64, "rt": 16}
+            )
+
+    start = time.perf_counter()
+    async_result = _quiet(asyncio.run, _run_async())
+    results["asyncio"] = time.perf_counter() - start
+
+    server.shutdown()
+    assert serial == threaded == async_result, "orchestrators disagree on output"
+    baseline = results["serial (workers=1)"]
+    for name, elapsed in results.items():
+        print(f"{name:<24} {elapsed:8.2f} s  {baseline / elapsed:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark programme text normalisation against per-call cleaning.
+
+Builds a synthetic guide for the channel count of ``channels.json``, with
+titles and descriptions drawn from a pool of shows so that they repeat
+across days and channels, as repeats, +1 channels and regional variants do.
+Every string is a fresh object, as decoded from a provider response.
+
+The baseline cleans every description at serialisation time with a
+per-character category scan and uncompiled patterns. The normalised path
+runs :func:`src.text.normalise_programmes` at ingestion and then the
+serialisation-time :func:`src.text.clean_text` calls. The memory column is
+the size of the programme list, its records and the distinct strings they
+hold.
+
+Usage:
+    python benchmarks/bench_text.py [--channels N] [--days 7] [--per-day 40] [--shows 5000]
+"""
+
+import argparse
+import gc
+import json
+import random
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.programme import Programme  # noqa: E402
+from src.text import clean_text, normalise_programmes  # noqa: E402
+
+TAGS = ["", " [S]", " [S,SL]", " [AD]", " [HD]"]
+
+
+def _legacy_clean_text(text: str) -> str:
+    """The previous ``src.xmltv.clean_text``."""
+    text = "".join(ch for ch in text if unicodedata.category(ch)[0] != "C")
+    text = re.sub(r"\[[A-Z,]+\]", "", text)
+    text = re.sub(r"\(?[SE]?\d+\s?Ep\s?\d+[\d/]*\)?", "", text)
+    return text.strip()
+
+
+def _shows(count: int, rng: random.Random) -> list:
+    words = "the of news late show live drama quiz match final kitchen garden house".split()
+    shows = []
+    for index in range(count):
+        title = " ".join(rng.choice(words).title() for _ in range(3)) + f" {index}"
+        sentences = " ".join(
+            " ".join(rng.choice(words) for _ in range(12)).capitalize() + "."
+            for _ in range(rng.randint(2, 4))
+        )
+        description = f"{sentences} (S{rng.randint(1, 9)} Ep{rng.randint(1, 12)}){rng.choice(TAGS)}"
+        shows.append((title, description, f"https://images.example/{index}.jpg"))
+    return shows
+
+
+def _programmes(channels: int, days: int, per_day: int, shows: list, seed: int) -> list:
+    rng = random.Random(seed)
+    programmes = []
+    for channel in range(channels):
+        channel_id = f"channel{channel}.uk"
+        for slot in range(days * per_day):
+            title, description, icon = rng.choice(shows)
+            programmes.append(
+                Programme(
+                    # Copy every string, as a JSON decoder would.
+                    channel=json.loads(json.dumps(channel_id)),
+                    start=1_700_000_000 + slot * 1800,
+                    stop=1_700_000_000 + (slot + 1) * 1800,
+                    title=json.loads(json.dumps(title)),
+                    description=json.loads(json.dumps(description)),
+                    icon=json.loads(json.dumps(icon)),
+                )
+            )
+    return programmes
+
+
+def _held_bytes(programmes: list) -> int:
+    """Return the size of the programme list, its records and their strings.
+
+    Strings shared by several programmes are counted once.
+    """
+    seen = set()
+    held = sys.getsizeof(programmes)
+    for programme in programmes:
+        held += sys.getsizeof(programme)
+        for value in (programme.channel, programme.title, programme.description, programme.icon):
+            if value is not None and id(value) not in seen:
+                seen.add(id(value))
+                held += sys.getsizeof(value)
+    return held
+
+
+def _measure(build, process) -> tuple:
+    """Return the seconds spent in ``process`` and the bytes its result holds."""
+    programmes = build()
+    gc.collect()
+    start = time.perf_counter()
+    programmes = process(programmes)
+    elapsed = time.perf_counter() - start
+    return elapsed, _held_bytes(programmes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--channels", type=int, help="channel count (default: channels.json)")
+    parser.add_argument("--days", type=int, default=7, help="days per channel")
+    parser.add_argument("--per-day", type=int, default=40, help="programmes per channel and day")
+    parser.add_argument("--shows", type=int, default=5000, help="distinct shows")
+    args = parser.parse_args()
+
+    channels = args.channels
+    if channels is None:
+        with open(ROOT / "channels.json", encoding="utf-8") as f:
+            channels = len(json.load(f)["channels"])
+    shows = _shows(args.shows, random.Random(0))
+
+    def build():
+        return _programmes(channels, args.days, args.per_day, shows, seed=1)
+
+    def baseline(programmes):
+        for programme in programmes:
+            _legacy_clean_text(programme.description)
+        return programmes
+
+    def normalised(programmes):
+        clean_text.cache_clear()
+        programmes = normalise_programmes(programmes)
+        for programme in programmes:
+            clean_text(programme.description)
+        return programmes
+
+    total = channels * args.days * args.per_day
+    print(f"{channels} channels, {total} programmes, {args.shows} distinct shows")
+    results = {
+        "per-call cleaning": _measure(build, baseline),
+        "normalised at ingestion": _measure(build, normalised),
+    }
+    base_time, base_held = results["per-call cleaning"]
+    for name, (elapsed, held) in results.items():
+        print(
+            f"{name:<24} {elapsed:8.2f} s  {base_time / elapsed:6.1f}x"
+            f"  {held / 2**20:8.1f} MiB held  {base_held / held:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark XMLTV serialisation with and without the timestamp formatter.
+
+Builds a synthetic 7-day guide for the channel count of ``channels.json``,
+spanning the October clock change, and serialises it twice: once formatting
+every start and stop time with ``datetime.fromtimestamp(...).strftime(...)``
+and once with :class:`src.timestamps.TimestampFormatter`. Both documents
+must be byte-identical.
+
+Usage:
+    python benchmarks/bench_xmltv.py [--channels N] [--days 7] [--per-day 40]
+"""
+
+import argparse
+import json
+import sys
+import time
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import pytz  # noqa: E402
+
+from src import xmltv  # noqa: E402
+from src.programme import Programme  # noqa: E402
+from src.timestamps import format_timestamp  # noqa: E402
+
+# 2024-10-23 00:00 UTC; the clocks go back four days later.
+START = 1729641600
+
+
+def _guide(channels: int, days: int, per_day: int) -> tuple:
+    length = 86400 // per_day
+    channel_list = [
+        {"xmltv_id": f"channel{c}.uk", "name": f"Channel {c}", "lang": "en"}
+        for c in range(channels)
+    ]
+    programmes = [
+        Programme(
+            channel=f"channel{c}.uk",
+            start=START + slot * length,
+            stop=START + (slot + 1) * length,
+            title=f"Show {slot % 50}",
+            description="A description.",
+        )
+        for c in range(channels)
+        for slot in range(days * per_day)
+    ]
+    return channel_list, programmes
+
+
+def _strftime_formatter(tz, start, stop):
+    """Stand-in for the formatter, formatting every timestamp with strftime."""
+    return partial(format_timestamp, tz=tz)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--channels", type=int, help="channel count (default: channels.json)")
+    parser.add_argument("--days", type=int, default=7, help="days per channel")
+    parser.add_argument("--per-day", type=int, default=40, help="programmes per channel and day")
+    args = parser.parse_args()
+
+    channels = args.channels
+    if channels is None:
+        with open(ROOT / "channels.json", encoding="utf-8") as f:
+            channels = len(json.load(f)["channels"])
+    channel_list, programmes = _guide(channels, args.days, args.per_day)
+    tz = pytz.timezone("Europe/London")
+    print(f"{channels} channels, {len(programmes)} programmes")
+
+    results = {}
+    with mock.patch.object(xmltv, "TimestampFormatter", _strftime_formatter):
+        start = time.perf_counter()
+        baseline = xmltv.build_xmltv(channel_list, programmes, tz)
+        results["strftime"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    formatted = xmltv.build_xmltv(channel_list, programmes, tz)
+    results["TimestampFormatter"] = time.perf_counter() - start
+
+    assert baseline == formatted, "formatters disagree on output"
+    base = results["strftime"]
+    for name, elapsed in results.items():
+        print(f"{name:<20} {elapsed:8.2f} s  {base / elapsed:6.1f}x")
+
+    # The formatting alone, without building elements.
+    timestamps = [t for p in programmes for t in (p.start, p.stop)]
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        format_timestamp(timestamp, tz)
+    alone = time.perf_counter() - start
+    formatter = xmltv.TimestampFormatter(tz, min(timestamps), max(timestamps) + 1)
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        formatter(timestamp)
+    fast = time.perf_counter() - start
+    print(f"{len(timestamps)} timestamps: strftime {alone:.2f} s, formatter {fast:.2f} s ({alone / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Microbenchmark suite for the build hot paths.
+
+Every case runs on synthetic fixtures sized like the real workload: 284
+channels over 7 days at 40 programmes a day (scale 1), and ten times as many
+channels (scale 10). Nothing touches the network; provider cases feed
+canned JSON payloads through the providers' parsing loops, via their caches
+or an offline stand-in for the HTTP session.
+
+Results are the best and median wall time of several repeats. ``--save``
+writes them as a JSON baseline, and ``--compare`` checks a run against a
+baseline and exits with status 1 when a case got slower than the baseline's
+best time by more than ``--threshold``.
+
+Usage:
+    python benchmarks/suite.py [--scale 1 --scale 10] [--case NAME ...]
+                               [--repeat 3] [--save PATH]
+                               [--compare PATH [--threshold 0.25]]
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import pytz  # noqa: E402
+
+from src.dedupe import dedupe_programmes, dedupe_sorted  # noqa: E402
+from src.details import Schedule  # noqa: E402
+from src.programme import Programme  # noqa: E402
+from src.providers import freesat, freeview, radiotimes, sky, youview  # noqa: E402
+from src.providers.base import Context  # noqa: E402
+from src.text import clean_text, normalise_programmes  # noqa: E402
+from src.utils.parsing import parse_duration_value, parse_timestamp  # noqa: E402
+from src.xmltv import build_xmltv  # noqa: E402
+
+CHANNELS = 284
+DAYS = 7
+PER_DAY = 40
+SHOWS = 5000
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+
+TZ = pytz.timezone("Europe/London")
+# Midnight UTC of the synthetic guide's first day.
+EPOCH = int(
+    datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+)
+SLOT = 86400 // PER_DAY
+
+# A case prepares its fixtures for a scale and returns the callable timed.
+CASES: Dict[str, Callable[[int], Callable[[], Any]]] = {}
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+# Fixtures ---------------------------------------------------------------
+
+
+def _shows(seed: int = 0) -> List[tuple]:
+    rng = random.Random(seed)
+    words = "the of news late show live drama quiz match final kitchen garden house".split()
+    shows = []
+    for index in range(SHOWS):
+        title = " ".join(rng.choice(words).title() for _ in range(3)) + f" {index}"
+        text = " ".join(
+            " ".join(rng.choice(words) for _ in range(12)).capitalize() + "." for _ in range(3)
+        )
+        tag = rng.choice(["S", "AD", "HD"])
+        description = f"{text} (S{rng.randint(1, 9)} Ep{rng.randint(1, 12)}) [{tag}]"
+        shows.append((f"uuid-{index}", title, description))
+    return shows
+
+
+def _slots(scale: int, seed: int = 1):
+    """Yield ``(channel, day, start, show)`` of every slot of the guide."""
+    rng = random.Random(seed)
+    shows = _shows()
+    for channel in range(CHANNELS * scale):
+        for day in range(DAYS):
+            for slot in range(PER_DAY):
+                yield channel, day, EPOCH + day * 86400 + slot * SLOT, rng.choice(shows)
+
+
+def _programmes(scale: int) -> List[Programme]:
+    return [
+        Programme(
+            channel=f"channel{channel}.uk",
+            start=start,
+            stop=start + SLOT,
+            title=title,
+            description=description,
+            icon=f"https://images.example/{uuid}.jpg",
+        )
+        for channel, _, start, (uuid, title, description) in _slots(scale)
+    ]
+
+
+def _iso(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _ctx(session: Any = None) -> Context:
+    return Context(session=session, tz=TZ, days=DAYS, caches={})
+
+
+class _Response:
+    def __init__(self, payload: Any) -> None:
+        self._payload = payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Any:
+        return self._payload
+
+
+class _OfflineSession:
+    """Answers ``get`` with canned payloads chosen by a callable."""
+
+    def __init__(self, answer: Callable[..., Any]) -> None:
+        self._answer = answer
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> _Response:
+        return _Response(self._answer(url, params or {}))
+
+
+# Cases ------------------------------------------------------------------
+
+
+@case("dedupe_programmes")
+def _dedupe(scale: int):
+    # Every day appears twice, as when adjacent days overlap.
+    programmes = _programmes(scale)
+    programmes += programmes[::2]
+    return lambda: dedupe_programmes(programmes)
+
+
+@case("dedupe_sorted")
+def _dedupe_sorted(scale: int):
+    programmes = _programmes(scale)
+    programmes += programmes[::2]
+    random.Random(2).shuffle(programmes)
+    return lambda: dedupe_sorted(programmes)
+
+
+@case("build_xmltv")
+def _build_xmltv(scale: int):
+    programmes = _programmes(scale)
+    channels = [
+        {"xmltv_id": f"channel{c}.uk", "name": f"Channel {c}", "lang": "en"}
+        for c in range(CHANNELS * scale)
+    ]
+    return lambda: build_xmltv(channels, programmes, TZ)
+
+
+@case("clean_text")
+def _clean_text(scale: int):
+    # Fresh string objects, as decoded from provider responses.
+    descriptions = [json.loads(json.dumps(p.description)) for p in _programmes(scale)]
+
+    def run():
+        clean_text.cache_clear()
+        for description in descriptions:
+            clean_text(description)
+
+    return run
+
+
+@case("normalise_programmes")
+def _normalise(scale: int):
+    programmes = _programmes(scale)
+    return lambda: normalise_programmes(programmes)
+
+
+@case("parse_timestamp")
+def _parse_timestamp(scale: int):
+    values = []
+    for _, _, start, _ in _slots(scale):
+        values += [_iso(start), start, str(start * 1000)]
+
+    def run():
+        for value in values:
+            parse_timestamp(value)
+
+    return run
+
+
+@case("parse_duration_value")
+def _parse_duration(scale: int):
+    values = []
+    for _, _, start, _ in _slots(scale):
+        values += ["PT45M", SLOT, str(SLOT), "PT1H2M3S"]
+
+    def run():
+        for value in values:
+            parse_duration_value(value)
+
+    return run
+
+
+@case("provider_sky")
+def _provider_sky(scale: int):
+    # Schedules are read from the prefetch cache, as after a batch prefetch.
+    ctx = _ctx()
+    schedules = ctx.caches.setdefault(sky._SCHEDULES, {})
+    dates = sky._date_strings(ctx.fetch_days())
+    events: Dict[tuple, list] = {}
+    for channel, day, start, (uuid, title, description) in _slots(scale):
+        events.setdefault((dates[day], str(channel)), []).append(
+            {"t": title, "sy": description, "st": start, "d": SLOT, "programmeuuid": uuid}
+        )
+    for key, day_events in events.items():
+        schedules[key] = {"schedule": [{"sid": key[1], "events": day_events}]}
+    channels = [{"provider_id": str(c), "xmltv_id": f"c{c}"} for c in range(CHANNELS * scale)]
+    return lambda: [sky.fetch_programmes(channel, ctx) for channel in channels]
+
+
+@case("provider_radiotimes")
+def _provider_radiotimes(scale: int):
+    days: Dict[int, List[list]] = {}
+    details: Dict[str, Any] = {}
+    for channel, day, start, (uuid, title, description) in _slots(scale):
+        schedule = days.setdefault(channel, [[] for _ in range(DAYS)])
+        schedule[day].append(
+            {
+                "type": "episode",
+                "id": uuid,
+                "title": title,
+                "start": _iso(start),
+                "end": _iso(start + SLOT),
+            }
+        )
+        details[uuid] = {"description": description, "image": {"url": f"https://img/{uuid}"}}
+    ctx = _ctx()
+    return lambda: [
+        radiotimes.assemble_programmes({"xmltv_id": f"c{c}"}, Schedule(items), details, ctx)
+        for c, items in days.items()
+    ]
+
+
+@case("provider_freeview")
+def _provider_freeview(scale: int):
+    # Region guides are read from the context cache, as after a prefetch.
+    ctx = _ctx()
+    epochs = freeview._epochs(ctx)
+    events: Dict[tuple, Dict[str, list]] = {}
+    details: Dict[str, Any] = {}
+    for channel, day, start, (uuid, title, description) in _slots(scale):
+        services = events.setdefault((channel % 10, epochs[day]), {})
+        services.setdefault(str(channel), []).append(
+            {
+                "program_id": uuid,
+                "main_title": title,
+                "secondary_title": description,
+                "start_time": _iso(start),
+                "duration": "PT45M",
+                "fallback_image_url": f"https://img/{uuid}",
+            }
+        )
+        details[uuid] = {"synopsis": {"medium": description}, "image_url": f"https://img/{uuid}"}
+    ctx.caches["freeview_events"] = events
+    channels = [
+        {"region_id": c % 10, "provider_id": str(c), "xmltv_id": f"c{c}"}
+        for c in range(CHANNELS * scale)
+    ]
+
+    def run():
+        for channel in channels:
+            schedule = freeview.fetch_schedule(channel, ctx)
+            freeview.assemble_programmes(channel, schedule, details, ctx)
+
+    return run
+
+
+@case("provider_youview")
+def _provider_youview(scale: int):
+    entries: Dict[str, list] = {}
+    details: Dict[str, Any] = {}
+    for channel, day, start, (uuid, title, description) in _slots(scale):
+        entries.setdefault(str(channel), []).append(
+            {
+                "id": f"{uuid}-{start}",
+                "title": title,
+                "publishedStartTime": _iso(start),
+                "publishedDuration": "PT45M",
+            }
+        )
+        details[f"{uuid}-{start}"] = {"synopsis": {"long": description}, "seasonNumber": 1}
+    # Every schedule request of a channel returns its whole week.
+    ctx = _ctx(_OfflineSession(lambda url, params: {"items": entries[params["serviceLocator"]]}))
+    ctx.days = 1
+    channels = [{"provider_id": str(c), "xmltv_id": f"c{c}"} for c in range(CHANNELS * scale)]
+
+    def run():
+        for channel in channels:
+            schedule = youview.fetch_schedule(channel, ctx)
+            youview.assemble_programmes(channel, schedule, details, ctx)
+
+    return run
+
+
+@case("provider_freesat")
+def _provider_freesat(scale: int):
+    events: Dict[tuple, list] = {}
+    for channel, day, start, (uuid, title, description) in _slots(scale):
+        events.setdefault((str(channel), day), []).append(
+            {
+                "name": title,
+                "description": description,
+                "startTime": start,
+                "duration": SLOT,
+                "image": f"/{uuid}.jpg",
+            }
+        )
+
+    def answer(url: str, params: Dict[str, Any]) -> Any:
+        day = int(url.rsplit("/", 1)[1])
+        return [{"event": events[(params["channel"][0], day)]}]
+
+    # The region session is already set up, as after the handshake.
+    ctx = _ctx()
+    ctx.caches["freesat_sessions"] = {"AB1 2CD": _OfflineSession(answer)}
+    channels = [
+        {"provider_id": str(c), "xmltv_id": f"c{c}", "postcode": "AB1 2CD"}
+        for c in range(CHANNELS * scale)
+    ]
+    return lambda: [freesat.fetch_programmes(channel, ctx) for channel in channels]
+
+
+# Runner -----------------------------------------------------------------
+
+
+def run_case(name: str, scale: int, repeat: int) -> Dict[str, float]:
+    """Time one case at one scale, returning its best and median seconds."""
+    target = CASES[name](scale)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        target()
+        times.append(time.perf_counter() - start)
+    return {"best": min(times), "median": statistics.median(times), "repeat": repeat}
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """Return the cases slower than their baseline by more than ``threshold``."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base and result["best"] > base["best"] * (1 + threshold):
+            regressions.append(key)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scale",
+        type=int,
+        action="append",
+        help="workload multiple (repeatable; default: 1 and 10)",
+    )
+    parser.add_argument(
+        "--case", action="append", choices=sorted(CASES), help="case to run (repeatable)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per case (default: %(default)s)"
+    )
+    parser.add_argument("--save", type=Path, metavar="PATH", help="write the results as a baseline")
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        nargs="?",
+        const=DEFAULT_BASELINE,
+        metavar="PATH",
+        help=f"fail on regressions against a baseline (default: {DEFAULT_BASELINE.name})",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed slowdown against the baseline, as a fraction (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    baseline: Dict[str, Dict[str, float]] = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results: Dict[str, Dict[str, float]] = {}
+    for scale in args.scale or [1, 10]:
+        for name in args.case or list(CASES):
+            key = f"{name}@{scale}x"
+            result = results[key] = run_case(name, scale, args.repeat)
+            line = f"{key:<28} best {result['best']:8.3f} s  median {result['median']:8.3f} s"
+            if key in baseline:
+                line += f"  {result['best'] / baseline[key]['best']:6.2f}x baseline"
+            print(line, flush=True)
+
+    if args.save:
+        document = {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        text = json.dumps(document, indent=2, sort_keys=True) + "\n"
+        args.save.write_text(text, encoding="utf-8")
+        print(f"Baseline saved: {args.save}")
+
+    regressions = compare(results, baseline, args.threshold)
+    for key in regressions:
+        print(f"REGRESSION {key}: more than {args.threshold:.0%} slower than the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
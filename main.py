@@ -2,103 +2,669 @@
 Entry point for building the XMLTV file.
 
 This script loads the channel configuration, dispatches programme fetching to the
-provider-specific modules, deduplicates the programmes, and writes the output
+provider-specific modules, deduplicates the programmes, and streams the output
 to `epg.xml` using an atomic file write. The goal is to keep this file thin
 and focused on orchestration rather than scraping logic.
 
 The providers themselves live in `src/providers/`, and each exposes a
-`fetch_programmes(channel: dict, ctx: Context) -> list[dict]` function. The
+`fetch_programmes(channel: dict, ctx: Context) -> list[Programme]` function. The
 `Context` object provides shared state, such as a `requests.Session` with
-retries and a timezone.
+retries and a timezone. Providers are looked up by the channels' ``src`` code
+in the registry of `src/providers/__init__.py`, and only those the channel
+list refers to are imported.
+
+A channel may list several sources in priority order under ``sources``. The
+primary source is fetched for every channel, and lower-priority sources are
+fetched only for the days the sources above them leave uncovered, filling
+the gaps (see `src/sources.py`). With ``--hedge``, a channel whose primary
+fetch is still running after a latency percentile learned during the run is
+raced against its second source (see `src/hedge.py`).
+
+Channels declaring ``timeshift_of`` (e.g. +1 channels) are not fetched:
+their parent's programmes are shifted instead. ``--check-timeshifts``
+spot-checks one day of each against its own source (see `src/timeshift.py`).
 
 Usage:
-    python main.py
+    python main.py [--workers N] [--provider-limit SRC=N ...] [--async]
+                   [--hedge [--hedge-percentile P]] [--check-timeshifts]
+                   [--rate-limit HOST=RATE[:BURST] ...] [--no-rate-limit]
+                   [--cache-path PATH] [--cache-max-mb N] [--no-cache] [--clear-cache]
+                   [--incremental [--refresh-days N]] [--xz]
+                   [--record DIR | --replay DIR [--zero-latency]]
+                   [--report-dir DIR | --no-report]
+
+Channels are fetched concurrently on a bounded worker pool (see
+`src/executor.py`). ``--workers 1`` restores a strictly serial build. With
+``--async`` the build runs on an asyncio event loop instead, using
+``fetch_programmes_async`` where a provider implements it.
+
+Requests are rate limited per host (see `src/ratelimit.py`). The wait time
+spent on each host is logged at the end of the run to help tune the limits.
+
+Successful responses are kept in a persistent on-disk cache (see
+`src/cache.py`) so that routine rebuilds only re-request schedules that may
+have changed. Expired entries are revalidated with conditional requests, and
+the number of responses served from the cache, revalidated or transferred in
+full is logged per provider. Programme detail lookups are additionally kept
+in a persistent enrichment store (see `src/enrichment.py`) next to the
+cache, so that only newly scheduled programmes need their details fetched.
+``--no-cache`` bypasses both and ``--clear-cache`` empties both before the
+build.
+
+``--record DIR`` captures every HTTP exchange of the build, with its
+latency, into an archive in ``DIR``; ``--replay DIR`` answers the build's
+requests from that archive instead of the network, waiting the recorded
+latencies unless ``--zero-latency`` is given (see `src/cassette.py`). Both
+bypass the cache and the enrichment store, so that a replay issues exactly
+the requests that were recorded.
+
+Every request is measured (see `src/telemetry.py`). At the end of the run,
+a JSON report (`run.json`) and an OpenMetrics file (`metrics.prom`) with
+latency percentiles per host, the slowest channels and request totals per
+provider are written to ``--report-dir`` (`reports/` by default), unless
+``--no-report`` is given.
+
+With ``--incremental`` the previous `epg.xml` seeds the build: only today,
+tomorrow and the days it does not cover yet are fetched again, and the rest
+of the guide is carried over (see `src/incremental.py`).
+
+Next to `epg.xml`, a gzip copy `epg.xml.gz` (and with ``--xz`` an xz copy
+`epg.xml.xz`) is compressed while the XML is being written. Gzip headers
+carry no timestamp, so an unchanged guide compresses to identical bytes.
 
 You can adjust logging verbosity by setting the `LOGLEVEL` environment
 variable (e.g. ``LOGLEVEL=DEBUG python main.py``).
 """
 
+import argparse
+import asyncio
 import logging
 import os
+from dataclasses import replace
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Optional, Tuple
 
 import pytz
 
+from src.cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, ResponseCache
+from src.cassette import RECORD, REPLAY, Cassette
 from src.config import load_channels
-from src.dedupe import dedupe_programmes
-from src.http import make_session
-from src.xmltv import build_xmltv, write_atomic
-from src.providers import sky, freeview, freesat, radiotimes, youview
+from src.dedupe import dedupe_sorted
+from src.enrichment import DEFAULT_ENRICHMENT_PATH, EnrichmentStore
+from src.executor import (
+    DEFAULT_ASYNC_PROVIDER_LIMITS,
+    DEFAULT_PROVIDER_LIMITS,
+    DEFAULT_WORKERS,
+    StartCallback,
+    Transform,
+    fetch_channels,
+    fetch_channels_async,
+)
+from src.hedge import DEFAULT_HEDGE_PERCENTILE, Hedger, LatencyTracker
+from src.http import AsyncSession, make_session
+from src.incremental import (
+    DEFAULT_REFRESH_DAYS,
+    days_to_refresh,
+    load_programmes,
+    merge_programmes,
+)
+from src.programme import Programme, ProgrammeLike
+from src.providers import PROVIDERS
 from src.providers.base import Context
+from src.ratelimit import DEFAULT_RATE_LIMITS, HostRateLimiter
+from src.sources import fetch_sources, source_codes
+from src.telemetry import DEFAULT_REPORT_DIR, METRICS_NAME, PERCENTILES, REPORT_NAME, Telemetry
+from src.text import TextPool, normalise_programmes
+from src.timeshift import apply_timeshifts, check_timeshifts, split_timeshifts
+from src.xmltv import write_xmltv
 
+# Location of the generated guide, also read back by incremental builds.
+OUTPUT_PATH = "epg.xml"
 
-def main() -> None:
-    """Main orchestration function."""
-    # Load channel configuration from the default file. You can change this
-    # argument to point to a different JSON file if desired.
-    channels = load_channels("channels.json")
+
+def _parse_provider_limit(value: str) -> tuple:
+    """Parse a ``SRC=N`` command line value into a ``(src, n)`` tuple."""
+    src, sep, limit = value.partition("=")
+    if not sep or not src:
+        raise argparse.ArgumentTypeError(f"expected SRC=N, got '{value}'")
+    try:
+        return src, int(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid limit in '{value}'") from None
+
+
+def _parse_rate_limit(value: str) -> tuple:
+    """Parse a ``HOST=RATE[:BURST]`` value into a ``(host, (rate, burst))`` tuple."""
+    host, sep, spec = value.partition("=")
+    if not sep or not host:
+        raise argparse.ArgumentTypeError(f"expected HOST=RATE[:BURST], got '{value}'")
+    rate, _, burst = spec.partition(":")
+    try:
+        rate_value = float(rate)
+        burst_value = int(burst) if burst else max(1, int(rate_value))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate limit in '{value}'") from None
+    if rate_value <= 0:
+        raise argparse.ArgumentTypeError(f"rate must be positive in '{value}'")
+    return host, (rate_value, burst_value)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Build the XMLTV guide.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="number of channels fetched concurrently (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--provider-limit",
+        type=_parse_provider_limit,
+        action="append",
+        default=[],
+        metavar="SRC=N",
+        help="cap concurrent channel fetches for one provider (repeatable)",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="fetch channels on an asyncio event loop",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="race slow primary fetches of multi-source channels against their"
+        " second source",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=DEFAULT_HEDGE_PERCENTILE,
+        help="percentile of a provider's fetch latencies after which the second"
+        " source is tried (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--check-timeshifts",
+        action="store_true",
+        help="fetch one day of each timeshift channel and fetch it in full if it"
+        " diverged from its parent",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=_parse_rate_limit,
+        action="append",
+        default=[],
+        metavar="HOST=RATE[:BURST]",
+        help="requests per second and burst size for a host (repeatable)",
+    )
+    parser.add_argument(
+        "--no-rate-limit",
+        action="store_true",
+        help="disable per-host rate limiting",
+    )
+    parser.add_argument(
+        "--cache-path",
+        default=DEFAULT_CACHE_PATH,
+        help="location of the HTTP response cache; the enrichment store is kept"
+        " in the same directory (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="size bound of the HTTP response cache in MiB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="bypass the HTTP response cache and the enrichment store",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="empty the HTTP response cache and the enrichment store before building",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"only refetch the days of {OUTPUT_PATH} that need refreshing",
+    )
+    parser.add_argument(
+        "--refresh-days",
+        type=int,
+        default=DEFAULT_REFRESH_DAYS,
+        help="days from today always refetched by --incremental (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--xz",
+        action="store_true",
+        help=f"also write an xz-compressed {OUTPUT_PATH}.xz",
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record",
+        metavar="DIR",
+        help="record every HTTP exchange of the build into DIR",
+    )
+    cassette.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="answer HTTP requests from the exchanges recorded in DIR",
+    )
+    parser.add_argument(
+        "--zero-latency",
+        action="store_true",
+        help="with --replay, answer at once instead of after the recorded latency",
+    )
+    report = parser.add_mutually_exclusive_group()
+    report.add_argument(
+        "--report-dir",
+        default=DEFAULT_REPORT_DIR,
+        metavar="DIR",
+        help="directory of the run report and metrics (default: %(default)s)",
+    )
+    report.add_argument(
+        "--no-report",
+        action="store_true",
+        help="do not measure requests or write a run report",
+    )
+    args = parser.parse_args(argv)
+    if args.zero_latency and not args.replay:
+        parser.error("--zero-latency requires --replay")
+    return args
+
+
+async def _fetch_async(
+    channels: List[Dict],
+    ctx: Context,
+    providers: Dict[str, ModuleType],
+    workers: int,
+    provider_limits: Dict[str, int],
+    rate_limiter: Optional[HostRateLimiter],
+    cache: Optional[ResponseCache],
+    cassette: Optional[Cassette] = None,
+    telemetry: Optional[Telemetry] = None,
+    transform: Optional[Transform] = None,
+    on_start: Optional[StartCallback] = None,
+) -> List[ProgrammeLike]:
+    """Run the asyncio orchestrator with an open async session on ``ctx``."""
+    async with AsyncSession(
+        rate_limiter=rate_limiter, cache=cache, cassette=cassette, telemetry=telemetry
+    ) as async_session:
+        ctx.async_session = async_session
+        try:
+            return await fetch_channels_async(
+                channels,
+                ctx,
+                providers,
+                workers=workers,
+                provider_limits=provider_limits,
+                transform=transform,
+                on_start=on_start,
+            )
+        finally:
+            ctx.async_session = None
+
+
+def _fetch(
+    channels: List[Dict],
+    ctx: Context,
+    providers: Dict[str, ModuleType],
+    args: argparse.Namespace,
+    provider_limits: Dict[str, int],
+    rate_limiter: Optional[HostRateLimiter],
+    cache: Optional[ResponseCache],
+    hedger: Optional[Hedger] = None,
+    cassette: Optional[Cassette] = None,
+    telemetry: Optional[Telemetry] = None,
+    text_pool: Optional[TextPool] = None,
+) -> List[Programme]:
+    """Fetch ``channels`` with the orchestrator selected on the command line.
+
+    Channels listing several sources are fetched from their primary source
+    first; lower-priority sources only fill the gaps it leaves (see
+    `src/sources.py`). With a ``hedger``, channels slow to fetch from their
+    primary source are raced against their second source (see `src/hedge.py`). Each channel's
+    programmes are normalised into ``text_pool`` as soon as they arrive (see
+    `src/text.py`).
+    """
+
+    def fetch_tier(
+        tier: List[Dict],
+        tier_ctx: Context,
+        on_start: Optional[StartCallback] = None,
+        on_result: Optional[Transform] = None,
+    ) -> List[ProgrammeLike]:
+        # Fetch every channel concurrently. Unknown sources are skipped with
+        # a warning and failing channels are logged and skipped, so one
+        # misbehaving source does not take down the whole build. Results are
+        # returned in channel order so the output is identical to a serial
+        # run. The hedger follows each channel through ``on_start`` and
+        # ``on_result``.
+        if not tier:
+            return []
+
+        def normalise(channel: Dict, ch_programmes: List[Dict]) -> List[Programme]:
+            ch_programmes = normalise_programmes(ch_programmes, text_pool)
+            if on_result is not None:
+                on_result(channel, ch_programmes)
+            return ch_programmes
+
+        if args.use_async:
+            return asyncio.run(
+                _fetch_async(
+                    tier,
+                    tier_ctx,
+                    providers,
+                    args.workers,
+                    provider_limits,
+                    rate_limiter,
+                    cache,
+                    cassette,
+                    telemetry,
+                    normalise,
+                    on_start,
+                )
+            )
+        return fetch_channels(
+            tier,
+            tier_ctx,
+            providers,
+            workers=args.workers,
+            provider_limits=provider_limits,
+            transform=normalise,
+            on_start=on_start,
+        )
+
+    return fetch_sources(channels, ctx, fetch_tier, hedger=hedger)
+
+
+def _build(
+    args: argparse.Namespace,
+    channels: List[Dict],
+    providers: Dict[str, ModuleType],
+    rate_limiter: Optional[HostRateLimiter],
+    cassette: Optional[Cassette],
+) -> None:
+    """Fetch the guide and write it, reporting on the run."""
+    # Open the persistent response cache and enrichment store unless they
+    # are bypassed. Clearing works even when they are then bypassed for this
+    # run. A cassette bypasses them too, since requests they answer would be
+    # missing from a recording.
+    bypass_cache = args.no_cache or cassette is not None
+    cache = None
+    enrichment = None
+    if args.clear_cache or not bypass_cache:
+        cache = ResponseCache(args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024)
+        enrichment = EnrichmentStore(
+            Path(args.cache_path).parent / Path(DEFAULT_ENRICHMENT_PATH).name
+        )
+        if args.clear_cache:
+            cache.clear()
+            enrichment.clear()
+        if bypass_cache:
+            cache.close()
+            enrichment.close()
+            cache = None
+            enrichment = None
+
+    # Measure every request for the run report.
+    telemetry = None if args.no_report else Telemetry()
 
     # Set up a shared HTTP session with retry behaviour. All network
     # interactions should go through this session so that timeouts and
-    # retries are handled consistently.
-    session = make_session()
+    # retries are handled consistently. The connection pool is sized so that
+    # every worker can keep its own connection alive.
+    session = make_session(
+        pool_maxsize=max(10, args.workers),
+        rate_limiter=rate_limiter,
+        cache=cache,
+        cassette=cassette,
+        telemetry=telemetry,
+    )
 
     # Create a context object that holds shared state. The timezone is set
     # explicitly so that timestamps are converted to the correct offset when
     # writing the XMLTV. Caches live on the context to avoid recomputing
     # expensive lookups (e.g. Freeview programme details).
     # Build a 7-day guide by default.
-    ctx = Context(session=session, tz=pytz.timezone("Europe/London"), days=7, caches={})
-
-    programmes = []
-
-    # Iterate over each channel and dispatch to the appropriate provider
-    # implementation. Unknown sources are skipped with a warning.
-    for channel in channels:
-        print("Fetching programmes for", channel.get("name"))
-        src = channel.get("src")
-        if src == "sky":
-            fetcher = sky.fetch_programmes
-        elif src == "freeview":
-            fetcher = freeview.fetch_programmes
-        elif src == "freesat":
-            fetcher = freesat.fetch_programmes
-        elif src == "rt":
-            fetcher = radiotimes.fetch_programmes
-        elif src == "yv":
-            fetcher = youview.fetch_programmes
+    ctx = Context(
+        session=session,
+        tz=pytz.timezone("Europe/London"),
+        days=7,
+        caches={},
+        enrichment=enrichment,
+    )
+
+    provider_limits: Dict[str, int] = dict(
+        DEFAULT_ASYNC_PROVIDER_LIMITS if args.use_async else DEFAULT_PROVIDER_LIMITS
+    )
+    provider_limits.update(dict(args.provider_limit))
+
+    hedger = None
+    if args.hedge:
+        hedger = Hedger(args.workers, LatencyTracker(percentile=args.hedge_percentile))
+
+    # Timeshift channels are derived from their parent instead of fetched.
+    fetched, derived = split_timeshifts(channels)
+    # Programme text is normalised per channel as it is fetched, with
+    # strings repeated across programmes sharing one object for the rest of
+    # the build.
+    text_pool = TextPool()
+    fetch_args = (
+        providers,
+        args,
+        provider_limits,
+        rate_limiter,
+        cache,
+        hedger,
+        cassette,
+        telemetry,
+        text_pool,
+    )
+
+    previous: List[Dict] = []
+    if args.incremental:
+        previous = normalise_programmes(load_programmes(OUTPUT_PATH), text_pool)
+    if previous:
+        # Channels already in the previous guide only need the days that may
+        # have changed since; new channels are fetched in full.
+        seeded = {p.channel for p in previous}
+        known = [ch for ch in fetched if ch.get("xmltv_id") in seeded]
+        new = [ch for ch in fetched if ch.get("xmltv_id") not in seeded]
+        refresh = days_to_refresh(
+            [ch.get("xmltv_id") for ch in known],
+            previous,
+            ctx.days,
+            refresh_days=args.refresh_days,
+        )
+        # Channels refetching the same days are fetched together, so that
+        # providers can still batch them.
+        groups: Dict[Tuple[int, ...], List[Dict]] = {}
+        for ch in known:
+            days = tuple(refresh[ch.get("xmltv_id")])
+            if days:
+                groups.setdefault(days, []).append(ch)
+        fresh = []
+        for days, group in sorted(groups.items(), key=lambda item: -len(item[1])):
+            logging.info(
+                "Incremental build: refetching days %s of %d channels", list(days), len(group)
+            )
+            fresh += _fetch(group, replace(ctx, day_offsets=days), *fetch_args)
+        logging.info("Incremental build: %d new channels", len(new))
+        fresh += _fetch(new, ctx, *fetch_args)
+        programmes = merge_programmes(
+            previous, fresh, [ch.get("xmltv_id") for ch in channels]
+        )
+    else:
+        if args.incremental:
+            logging.info("No previous guide to seed from; building in full.")
+        programmes = _fetch(fetched, ctx, *fetch_args)
+
+    if derived:
+        if args.check_timeshifts:
+            diverged = check_timeshifts(
+                derived,
+                programmes,
+                ctx,
+                lambda chs, c: _fetch(chs, c, *fetch_args),
+                parents=fetched,
+            )
+            if diverged:
+                diverged_ids = {ch.get("xmltv_id") for ch in diverged}
+                programmes = [p for p in programmes if p.channel not in diverged_ids]
+                programmes += _fetch(diverged, ctx, *fetch_args)
+                derived = [ch for ch in derived if ch.get("xmltv_id") not in diverged_ids]
+        logging.info("Deriving %d timeshift channels from their parents", len(derived))
+        programmes = apply_timeshifts(derived, programmes)
+
+    if hedger is not None:
+        # Let losing fetches finish before the cache and stores they write
+        # to are closed.
+        hedger.close()
+        for provider, stats in sorted(hedger.stats().items()):
+            logging.info(
+                "Hedging %s: %d channels, %d hedged (%.0f%%) after %.1fs,"
+                " %d won by the second source, %d fetches abandoned",
+                provider,
+                stats.fetches,
+                stats.hedged,
+                100 * stats.hedged / stats.fetches if stats.fetches else 0,
+                stats.delay,
+                stats.alternate_wins,
+                stats.abandoned,
+            )
+
+    if rate_limiter is not None:
+        for host, stats in sorted(rate_limiter.stats().items()):
+            logging.info(
+                "Rate limit %s: %d requests, %d delayed, %.1fs waited (max %.2fs)",
+                host,
+                stats.requests,
+                stats.delayed,
+                stats.wait_seconds,
+                stats.max_wait,
+            )
+
+    if cache is not None:
+        logging.info(
+            "HTTP cache: %d hits, %d misses, %.1f MiB stored",
+            cache.hits,
+            cache.misses,
+            cache.total_bytes / (1024 * 1024),
+        )
+        for provider, stats in sorted(cache.stats().items()):
+            logging.info(
+                "HTTP cache %s: %d cached, %d revalidated, %d transferred"
+                " (%.1f MiB reused, %.1f MiB downloaded)",
+                provider,
+                stats.hits,
+                stats.revalidated,
+                stats.transferred,
+                stats.bytes_reused / (1024 * 1024),
+                stats.bytes_transferred / (1024 * 1024),
+            )
+        cache.close()
+
+    if telemetry is not None:
+        report_dir = Path(args.report_dir)
+        report = telemetry.write_report(report_dir / REPORT_NAME)
+        telemetry.write_openmetrics(report_dir / METRICS_NAME, report=report)
+        for host, stats in report["hosts"].items():
+            logging.info(
+                "Requests %s: %d (%d networked), %s, %d errors, %d retries",
+                host,
+                stats["requests"],
+                stats["network_requests"],
+                ", ".join(f"p{p} {stats[f'p{p}']:.2f}s" for p in PERCENTILES),
+                stats["errors"],
+                stats["retries"],
+            )
+        for channel in report["slowest_channels"][:3]:
+            logging.info(
+                "Slow channel %s: %d requests, %.1fs",
+                channel["channel"],
+                channel["requests"],
+                channel["seconds"] + channel["wait_seconds"],
+            )
+        logging.info("Run report written to %s", report_dir)
+
+    if cassette is not None:
+        cassette.close()
+        if cassette.recording:
+            logging.info("Recorded %d HTTP exchanges to %s", cassette.recorded, cassette.path)
         else:
-            logging.warning(
-                "Unknown source '%s' for channel %s; skipping.",
-                src,
-                channel.get("name"),
+            logging.info(
+                "Replayed %d HTTP exchanges from %s, %d requests not recorded",
+                cassette.replayed,
+                cassette.path,
+                cassette.missed,
             )
-            continue
 
-        try:
-            ch_programmes = fetcher(channel, ctx)
-            programmes.extend(ch_programmes)
-        except Exception as exc:
-            # Log and continue on provider-specific exceptions so that one
-            # misbehaving source does not take down the whole build.
-            logging.error(
-                "Error fetching programmes for %s: %s", channel.get("name"), exc
+    if enrichment is not None:
+        for provider, stats in sorted(enrichment.stats().items()):
+            logging.info(
+                "Enrichment store %s: %d hits, %d known missing, %d looked up, %d stored",
+                provider,
+                stats.hits,
+                stats.negative_hits,
+                stats.misses,
+                stats.stored,
             )
-            continue
+        # Drop expired entries so the store does not grow without bound.
+        removed = enrichment.compact()
+        logging.info("Enrichment store: %d entries, %d expired removed", len(enrichment), removed)
+        enrichment.close()
 
     # Deduplicate programmes across days and providers. We remove duplicates
     # based on the trio of (channel, start timestamp, title) and keep the
     # most recently fetched entry. This prevents multiple identical entries
     # appearing if, for example, the same programme is returned for several
-    # days in a row.
-    programmes = dedupe_programmes(programmes)
+    # days in a row. The result comes back in output order, so the writer's
+    # sort only has to confirm it.
+    programmes = dedupe_sorted(programmes)
+
+    # Stream the XMLTV document into epg.xml and its compressed copies.
+    # Sorting of channels and programmes is performed by the writer for
+    # deterministic output, and every file is written to a temporary path and
+    # renamed into place so that consumers never read a partially written file.
+    compress = ("gz", "xz") if args.xz else ("gz",)
+    write_xmltv(OUTPUT_PATH, channels, programmes, tz=ctx.tz, compress=compress)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Main orchestration function."""
+    args = parse_args(argv)
+
+    # Load channel configuration from the default file. You can change this
+    # argument to point to a different JSON file if desired.
+    channels = load_channels("channels.json")
+    # Import only the providers the channel list refers to.
+    providers = PROVIDERS.load(source_codes(channels))
+
+    # Rate limit requests per host so that concurrent fetches do not hammer
+    # the upstream APIs into returning 429s.
+    rate_limiter = None
+    if not args.no_rate_limit:
+        rate_limiter = HostRateLimiter({**DEFAULT_RATE_LIMITS, **dict(args.rate_limit)})
 
-    # Build the XMLTV document. Sorting of channels and programmes is
-    # performed within build_xmltv for deterministic output.
-    xml_bytes = build_xmltv(channels, programmes, tz=ctx.tz)
+    # Record or replay the build's HTTP traffic if asked to.
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, RECORD)
+    elif args.replay:
+        cassette = Cassette(args.replay, REPLAY, latency=not args.zero_latency)
 
-    # Write to epg.xml atomically. This ensures that consumers never read
-    # partially written files.
-    write_atomic("epg.xml", xml_bytes)
+    # Close the cassette however the build ends, so that a recording
+    # interrupted by an error is still a complete archive.
+    try:
+        _build(args, channels, providers, rate_limiter, cassette)
+    finally:
+        if cassette is not None:
+            cassette.close()
 
 
 if __name__ == "__main__":
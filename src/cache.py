@@ -0,0 +1,436 @@
+"""
+Persistent on-disk HTTP response cache.
+
+The in-memory ``ctx.caches`` are lost when the process exits, so every build
+used to re-download all seven days of every channel even though most of the
+guide does not change between runs. :class:`ResponseCache` keeps successful
+GET responses in a SQLite database that survives between builds and is
+consulted by the session transport before any request goes on the wire.
+
+How long a response stays fresh depends on its URL. Each :class:`TTLRule`
+matches a URL pattern; rules whose pattern captures the schedule day, as a
+``date`` or an ``epoch`` group, can use a shorter ``near_ttl`` for today's
+and tomorrow's schedules, which are the ones most likely to change. A later
+day's schedule stays fresh across scheduled builds, but never beyond the
+moment its day becomes near. URLs matching no rule are never cached.
+
+The database is bounded in size: once the stored bodies exceed
+``max_bytes``, the least recently used entries are evicted.
+
+Expired entries are not dropped straight away. When the stored response
+carried an ``ETag`` or ``Last-Modified`` header, the transport revalidates it
+with a conditional request instead; a ``304 Not Modified`` answer renews the
+entry and its stored body is reused without being transferred again. The
+cache counts fresh hits, revalidations and full transfers per provider so
+that the savings can be reported at the end of a build.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dt_time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Match, Optional, Pattern, Sequence, Tuple, Union
+
+# Default location of the cache database, relative to the working directory.
+DEFAULT_CACHE_PATH = ".cache/http.sqlite"
+
+# Default upper bound on the total size of cached bodies.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Headers of a 304 response describing the (absent) body rather than the
+# stored representation; they must not overwrite the stored values.
+_BODY_HEADERS = frozenset(["content-length", "content-encoding", "transfer-encoding"])
+
+_HOUR = 60 * 60
+_DAY = 24 * _HOUR
+
+# Interval between scheduled builds (the cron of .github/workflows/build_epg.yml).
+BUILD_INTERVAL = 12 * _HOUR
+
+# Lifetime of schedules of later days. It must outlast the build interval,
+# or the next build finds them all expired.
+FAR_TTL = 36 * _HOUR
+
+
+@dataclass(frozen=True)
+class TTLRule:
+    """Freshness lifetime for URLs matching a regular expression.
+
+    Attributes:
+        pattern: Regular expression searched for in the full request URL.
+        ttl: Seconds a matching response stays fresh.
+        near_ttl: Optional shorter lifetime used when the pattern captures a
+            ``date`` (``YYYYMMDD`` or ``YYYY-MM-DD``) or ``epoch`` group
+            within one day of the current date. Entries of later days then
+            expire when their day comes within one day.
+    """
+
+    pattern: Union[str, Pattern]
+    ttl: int
+    near_ttl: Optional[int] = None
+
+    def compiled(self) -> Pattern:
+        return re.compile(self.pattern) if isinstance(self.pattern, str) else self.pattern
+
+
+DEFAULT_TTL_RULES: Sequence[TTLRule] = (
+    TTLRule(r"awk\.epgsky\.com/hawk/linear/schedule/(?P<date>\d{8})/", FAR_TTL, _HOUR),
+    TTLRule(
+        r"radiotimes\.com/api/broadcast/broadcast/channels/[^/]+/schedule"
+        r"\?from=(?P<date>\d{4}-\d{2}-\d{2})",
+        FAR_TTL,
+        _HOUR,
+    ),
+    TTLRule(r"radiotimes\.com/api/broadcast/broadcast/details/", 7 * _DAY),
+    TTLRule(r"freeview\.co\.uk/api/tv-guide\?.*\bstart=(?P<epoch>\d+)", FAR_TTL, _HOUR),
+    TTLRule(r"freeview\.co\.uk/api/program\?", 7 * _DAY),
+    TTLRule(
+        r"api\.youview\.tv/metadata/linear/v2/schedule/.*\binterval=(?P<date>\d{4}-\d{2}-\d{2})T",
+        FAR_TTL,
+        _HOUR,
+    ),
+    TTLRule(r"api\.youview\.tv/metadata/resolution/v4/episodes/", 7 * _DAY),
+)
+
+
+@dataclass
+class CachedResponse:
+    """A response body and metadata as stored in the cache."""
+
+    url: str
+    status: int
+    headers: Dict[str, str]
+    content: bytes
+    stored_at: float
+    expires_at: float
+
+    def validators(self) -> Dict[str, str]:
+        """Return the conditional request headers revalidating this entry."""
+        conditional: Dict[str, str] = {}
+        for name, value in self.headers.items():
+            if name.lower() == "etag":
+                conditional["If-None-Match"] = value
+            elif name.lower() == "last-modified":
+                conditional["If-Modified-Since"] = value
+        return conditional
+
+
+@dataclass
+class ProviderStats:
+    """Counters of how one provider's requests were answered."""
+
+    hits: int = 0
+    revalidated: int = 0
+    transferred: int = 0
+    bytes_reused: int = 0
+    bytes_transferred: int = 0
+
+
+def _rule_day(match: Match) -> Optional[date]:
+    """Return the schedule day captured by a :class:`TTLRule` pattern, if any."""
+    groups = match.groupdict()
+    try:
+        if groups.get("date"):
+            return datetime.strptime(groups["date"].replace("-", ""), "%Y%m%d").date()
+        if groups.get("epoch"):
+            return datetime.fromtimestamp(int(groups["epoch"]), timezone.utc).date()
+    except (ValueError, OverflowError, OSError):
+        return None
+    return None
+
+
+def cache_key(method: str, url: str) -> str:
+    """Return the cache key of a request."""
+    return hashlib.sha256(f"{method.upper()} {url}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache of HTTP responses with per-URL TTLs.
+
+    The cache is safe to share between threads: a single connection is used
+    and serialised with a lock.
+
+    Args:
+        path: Location of the SQLite database. Parent directories are
+            created as needed.
+        rules: TTL rules tried in order; the first matching rule applies.
+        max_bytes: Upper bound on the total size of stored bodies.
+        clock: Wall clock returning epoch seconds, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_CACHE_PATH,
+        rules: Iterable[TTLRule] = DEFAULT_TTL_RULES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.rules = [(rule, rule.compiled()) for rule in rules]
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self._total_bytes = int(row[0])
+        self.hits = 0
+        self.misses = 0
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def ttl_for(self, url: str) -> Optional[int]:
+        """Return the freshness lifetime of ``url``, or ``None`` if uncacheable."""
+        expiry = self._expiry(url)
+        return expiry[0] if expiry is not None else None
+
+    def _expiry(self, url: str) -> Optional[Tuple[int, Optional[date]]]:
+        """Return the lifetime of ``url`` and the schedule day it requests.
+
+        The day is only returned for a later day with a ``near_ttl``, whose
+        entry must expire once the day is near.
+        """
+        for rule, pattern in self.rules:
+            match = pattern.search(url)
+            if match is None:
+                continue
+            if rule.near_ttl is not None:
+                day = _rule_day(match)
+                if day is not None:
+                    today = datetime.fromtimestamp(self._clock(), timezone.utc).date()
+                    if abs((day - today).days) <= 1:
+                        return rule.near_ttl, None
+                    return rule.ttl, day
+            return rule.ttl, None
+        return None
+
+    def _expires_at(self, url: str, now: float) -> float:
+        """Return when a response to ``url`` stored at ``now`` expires."""
+        ttl, day = self._expiry(url) or (0, None)
+        expires_at = now + ttl
+        if day is not None and day > datetime.fromtimestamp(now, timezone.utc).date():
+            # The day is near from midnight UTC of the day before.
+            near_from = datetime.combine(day - timedelta(days=1), dt_time(), timezone.utc)
+            expires_at = min(expires_at, near_from.timestamp())
+        return expires_at
+
+    def _stats_for(self, provider: Optional[str]) -> ProviderStats:
+        return self._stats.setdefault(provider or "other", ProviderStats())
+
+    def get(
+        self, method: str, url: str, provider: Optional[str] = None
+    ) -> Optional[CachedResponse]:
+        """Return the fresh cached response of a request, if there is one."""
+        if method.upper() != "GET" or self.ttl_for(url) is None:
+            return None
+        entry = self.lookup(method, url)
+        now = self._clock()
+        with self._lock:
+            if entry is None or entry.expires_at <= now:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (now, cache_key(method, url)),
+            )
+            self._conn.commit()
+            self.hits += 1
+            stats = self._stats_for(provider)
+            stats.hits += 1
+            stats.bytes_reused += len(entry.content)
+        return entry
+
+    def lookup(self, method: str, url: str) -> Optional[CachedResponse]:
+        """Return the stored response of a request, whether fresh or expired.
+
+        Unlike :meth:`get`, this does not count as a hit or miss.
+        """
+        if method.upper() != "GET" or self.ttl_for(url) is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, content, stored_at, expires_at"
+                " FROM responses WHERE key = ?",
+                (cache_key(method, url),),
+            ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(
+            url=row[0],
+            status=row[1],
+            headers=json.loads(row[2]),
+            content=row[3],
+            stored_at=row[4],
+            expires_at=row[5],
+        )
+
+    def revalidated(
+        self,
+        method: str,
+        url: str,
+        entry: CachedResponse,
+        headers: Dict[str, str],
+        provider: Optional[str] = None,
+    ) -> CachedResponse:
+        """Renew ``entry`` after the server answered ``304 Not Modified``.
+
+        The stored body is kept and the headers of the 304 response, such as
+        a new ``ETag``, are merged into the stored ones.
+
+        Returns:
+            The renewed entry.
+        """
+        merged = dict(entry.headers)
+        for name, value in headers.items():
+            if name.lower() in _BODY_HEADERS:
+                continue
+            # Replace the stored header regardless of the case it was sent in.
+            for stored_name in [n for n in merged if n.lower() == name.lower()]:
+                del merged[stored_name]
+            merged[name] = value
+        now = self._clock()
+        renewed = CachedResponse(
+            url=entry.url,
+            status=entry.status,
+            headers=merged,
+            content=entry.content,
+            stored_at=now,
+            expires_at=self._expires_at(url, now),
+        )
+        # Upsert rather than update so that an entry evicted while the
+        # conditional request was in flight is restored.
+        self._store(method, url, renewed)
+        with self._lock:
+            stats = self._stats_for(provider)
+            stats.revalidated += 1
+            stats.bytes_reused += len(entry.content)
+        return renewed
+
+    def put(
+        self,
+        method: str,
+        url: str,
+        status: int,
+        headers: Dict[str, str],
+        content: bytes,
+        provider: Optional[str] = None,
+    ) -> bool:
+        """Store a response if its URL is cacheable.
+
+        Only successful (HTTP 200) GET responses are stored. Every such
+        response counts as a full transfer for ``provider``.
+
+        Returns:
+            ``True`` if the response was stored.
+        """
+        if method.upper() != "GET" or status != 200:
+            return False
+        with self._lock:
+            stats = self._stats_for(provider)
+            stats.transferred += 1
+            stats.bytes_transferred += len(content)
+        if self.ttl_for(url) is None:
+            return False
+        now = self._clock()
+        self._store(
+            method,
+            url,
+            CachedResponse(
+                url=url,
+                status=status,
+                headers=dict(headers),
+                content=content,
+                stored_at=now,
+                expires_at=self._expires_at(url, now),
+            ),
+        )
+        return True
+
+    def _store(self, method: str, url: str, entry: CachedResponse) -> None:
+        key = cache_key(method, url)
+        size = len(entry.content)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, url, status, headers, content, size, stored_at, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    url,
+                    entry.status,
+                    json.dumps(entry.headers),
+                    entry.content,
+                    size,
+                    entry.stored_at,
+                    entry.expires_at,
+                    entry.stored_at,
+                ),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        """Drop least recently used entries until below 90% of the size bound."""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the stored bodies."""
+        return self._total_bytes
+
+    def stats(self) -> Dict[str, ProviderStats]:
+        """Return a snapshot of the per-provider counters."""
+        with self._lock:
+            return {name: ProviderStats(**vars(stats)) for name, stats in self._stats.items()}
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._total_bytes = 0
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,228 @@
+"""
+Record and replay the HTTP traffic of a build.
+
+Two builds against the live provider APIs are never comparable: schedules
+change, and so do the latencies of every endpoint. A :class:`Cassette` in
+record mode captures every request made through the project's sessions,
+with its response and how long the response took, into a single gzip
+compressed JSON lines archive. A cassette in replay mode answers the same
+requests from the archive without touching the network, optionally waiting
+the recorded latency before each answer, so that a build can be repeated
+with identical inputs and either realistic or zero network time.
+
+Requests are matched by method, URL and a digest of the body. A request
+made several times during the recording is answered with its recorded
+responses in order, the last one being repeated once they run out. A
+request missing from the archive fails like an unreachable host.
+
+Providers derive schedule URLs from the current date, so a cassette is only
+fully replayable on the (UTC) day it was recorded, or under a frozen clock.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+# Name of the archive within a cassette directory.
+ARCHIVE_NAME = "cassette.jsonl.gz"
+
+# Version of the archive format, written in its header line.
+FORMAT_VERSION = 1
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Headers describing the transfer of the body rather than the body itself;
+# recorded bodies are stored decoded.
+_TRANSFER_HEADERS = frozenset(["content-encoding", "content-length", "transfer-encoding"])
+
+
+@dataclass(frozen=True)
+class Interaction:
+    """A recorded request and its response."""
+
+    method: str
+    url: str
+    body: str
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    content: bytes
+    elapsed: float
+
+
+def body_digest(body: Union[str, bytes, None]) -> str:
+    """Return the digest identifying a request body, empty without one."""
+    if not body:
+        return ""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+def _encode(interaction: Interaction) -> str:
+    record = {
+        "method": interaction.method,
+        "url": interaction.url,
+        "body": interaction.body,
+        "status": interaction.status,
+        "reason": interaction.reason,
+        "headers": interaction.headers,
+        "elapsed": round(interaction.elapsed, 6),
+    }
+    try:
+        record["text"] = interaction.content.decode("utf-8")
+    except UnicodeDecodeError:
+        record["base64"] = base64.b64encode(interaction.content).decode("ascii")
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode(line: str) -> Interaction:
+    record = json.loads(line)
+    if "text" in record:
+        content = record["text"].encode("utf-8")
+    else:
+        content = base64.b64decode(record["base64"])
+    return Interaction(
+        method=record["method"],
+        url=record["url"],
+        body=record["body"],
+        status=record["status"],
+        reason=record["reason"],
+        headers=record["headers"],
+        content=content,
+        elapsed=record["elapsed"],
+    )
+
+
+class Cassette:
+    """Archive of a build's HTTP interactions, either recorded or replayed.
+
+    The cassette is safe to share between threads and is used by
+    :class:`src.http.EPGAdapter` and :class:`src.http.AsyncSession`.
+
+    Args:
+        directory: Directory holding the archive. It is created when
+            recording, replacing an earlier recording.
+        mode: :data:`RECORD` or :data:`REPLAY`.
+        latency: Whether replayed responses wait their recorded latency.
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], mode: str = REPLAY, latency: bool = True
+    ) -> None:
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = Path(directory) / ARCHIVE_NAME
+        self.mode = mode
+        self.latency = latency
+        self.recorded = 0
+        self.replayed = 0
+        self.missed = 0
+        self._lock = threading.Lock()
+        self._archive = None
+        self._interactions: Dict[Tuple[str, str, str], List[Interaction]] = {}
+        self._played: Dict[Tuple[str, str, str], int] = {}
+        if mode == RECORD:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._archive = gzip.open(self.path, "wt", encoding="utf-8")
+            header = {
+                "version": FORMAT_VERSION,
+                "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            self._archive.write(json.dumps(header) + "\n")
+        else:
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as archive:
+            header = json.loads(archive.readline())
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported cassette format {header.get('version')!r} in {self.path}"
+                )
+            for line in archive:
+                interaction = _decode(line)
+                key = (interaction.method, interaction.url, interaction.body)
+                self._interactions.setdefault(key, []).append(interaction)
+        recorded_at = datetime.fromisoformat(header["recorded_at"])
+        if recorded_at.date() != datetime.now(timezone.utc).date():
+            logging.warning(
+                "Cassette %s was recorded on %s; requests for other dates will miss.",
+                self.path,
+                recorded_at.date(),
+            )
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        body: Union[str, bytes, None],
+        status: int,
+        reason: str,
+        headers: Dict[str, str],
+        content: bytes,
+        elapsed: float,
+    ) -> None:
+        """Append a request and its decoded response to the archive."""
+        if not self.recording:
+            raise RuntimeError("Cassette is not recording")
+        interaction = Interaction(
+            method=method.upper(),
+            url=url,
+            body=body_digest(body),
+            status=status,
+            reason=reason or "",
+            headers={k: v for k, v in headers.items() if k.lower() not in _TRANSFER_HEADERS},
+            content=content,
+            elapsed=elapsed,
+        )
+        line = _encode(interaction) + "\n"
+        with self._lock:
+            self._archive.write(line)
+            self.recorded += 1
+
+    def play(
+        self, method: str, url: str, body: Union[str, bytes, None] = None
+    ) -> Optional[Interaction]:
+        """Return the next recorded response to a request, or ``None``.
+
+        The caller waits :meth:`delay` before answering with it.
+        """
+        key = (method.upper(), url, body_digest(body))
+        with self._lock:
+            recorded = self._interactions.get(key)
+            if not recorded:
+                self.missed += 1
+                logging.debug("Cassette miss: %s %s", method, url)
+                return None
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            self.replayed += 1
+        return recorded[min(index, len(recorded) - 1)]
+
+    def delay(self, interaction: Interaction) -> float:
+        """Return the seconds to wait before answering with ``interaction``."""
+        return interaction.elapsed if self.latency else 0.0
+
+    def close(self) -> None:
+        """Finish writing the archive of a recording cassette."""
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
@@ -19,7 +19,8 @@ def load_channels(path: str) -> List[Dict]:
 
     Returns:
         A list of channel dictionaries. Each dictionary must at least
-        contain ``src`` and ``xmltv_id`` keys.
+        contain ``xmltv_id`` and either a ``src`` key or a ``sources`` list
+        of sources in priority order (see :mod:`src.sources`).
     """
     with open(path, encoding="utf-8") as f:
         data = json.load(f)
@@ -6,30 +6,38 @@ from different providers or multiple days may include the same programme
 multiple times, deduplication is important before writing the final XMLTV
 file. The dedupe strategy here keeps the most recently seen entry for any
 given (channel, start timestamp, title) triple.
+
+:func:`dedupe_sorted` also puts the programmes in the XMLTV writer's order.
+Large guides are handed to the NumPy store in :mod:`src.columnar` when NumPy
+is installed.
 """
 
-from typing import List, Dict, Tuple, Set
+from operator import attrgetter
+from typing import List, Sequence, Set, Tuple
+
+from .programme import Programme, ProgrammeLike, as_programmes
 
 
-def dedupe_programmes(programmes: List[Dict]) -> List[Dict]:
-    """Deduplicate a list of programme dictionaries.
+def dedupe_programmes(programmes: Sequence[ProgrammeLike]) -> List[Programme]:
+    """Deduplicate a list of programmes.
 
     A programme is considered duplicate if it has the same channel ID,
     start timestamp and title as another programme. The last occurrence of
     a programme in the input list is kept.
 
     Args:
-        programmes: A list of programme dictionaries.
+        programmes: A list of programmes. Dictionaries returned by older
+            providers are converted.
 
     Returns:
         A new list with duplicates removed, preserving order of first
         appearance of unique entries.
     """
     seen: Set[Tuple[str, float, str]] = set()
-    deduped: List[Dict] = []
+    deduped: List[Programme] = []
     # Iterate in reverse to keep the last occurrence
-    for pr in reversed(programmes):
-        key = (pr.get("channel"), pr.get("start"), pr.get("title"))
+    for pr in reversed(as_programmes(programmes)):
+        key = (pr.channel, pr.start, pr.title)
         if key in seen:
             continue
         seen.add(key)
@@ -37,3 +45,36 @@ def dedupe_programmes(programmes: List[Dict]) -> List[Dict]:
     # Restore original order
     deduped.reverse()
     return deduped
+
+
+# Inputs at least this long are deduped and sorted by the columnar store; below
+# it, building the columns costs more than it saves.
+COLUMNAR_THRESHOLD = 50_000
+
+# Order of programmes in the XMLTV output.
+_output_key = attrgetter("channel", "start", "stop", "title")
+
+
+def dedupe_sorted(
+    programmes: Sequence[ProgrammeLike], threshold: int = COLUMNAR_THRESHOLD
+) -> List[Programme]:
+    """Deduplicate programmes and return them in XMLTV output order.
+
+    The result holds the same programmes as :func:`dedupe_programmes`,
+    stably sorted by channel ID, start, stop and title, so that the writer's
+    own sort has nothing left to do.
+
+    Args:
+        programmes: A list of programmes. Dictionaries returned by older
+            providers are converted.
+        threshold: Minimum number of programmes for which the columnar store
+            is used, if NumPy is installed.
+    """
+    if len(programmes) >= threshold:
+        try:
+            from .columnar import dedupe_and_sort
+        except ImportError:
+            pass
+        else:
+            return dedupe_and_sort(programmes)
+    return sorted(dedupe_programmes(programmes), key=_output_key)
@@ -0,0 +1,64 @@
+"""
+Shared detail prefetch stage of the build pipeline.
+
+Several providers enrich every schedule item with a second, per-programme
+request (RadioTimes episode details, YouView episodes, Freeview programme
+details). Doing that inside the per-item loop makes the detail latency
+strictly serial with schedule parsing. Providers that declare a *detail
+resolver* are instead fetched in two phases:
+
+1. ``fetch_schedule(channel, ctx)`` returns a :class:`Schedule` holding the
+   channel's schedule items and the detail lookups they need.
+2. Once all of a provider's schedules are in, the orchestrator merges their
+   lookups, so a programme listed on many channels is looked up once, and
+   runs them in parallel through ``resolve_details(key, request, ctx)``.
+3. ``assemble_programmes(channel, schedule, details, ctx)`` then builds the
+   final programmes from the schedule and the resolved details.
+
+Providers may add ``async def fetch_schedule_async(channel, ctx)`` and
+``async def resolve_details_async(key, request, ctx)`` for the asyncio
+orchestrator; the sync functions run in worker threads otherwise.
+"""
+
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+# Functions a provider module must expose to use the detail stage.
+RESOLVER_HOOKS = ("fetch_schedule", "resolve_details", "assemble_programmes")
+
+
+@dataclass
+class Schedule:
+    """Schedule items of one channel and the detail lookups they need.
+
+    Attributes:
+        items: Provider-specific schedule items, handed back unchanged to
+            the provider's ``assemble_programmes``.
+        details: Detail lookups keyed by the identity of the looked-up
+            programme. Each value holds whatever ``resolve_details`` needs
+            to make the request, e.g. the listing it came from.
+    """
+
+    items: Any
+    details: Dict[Hashable, Any] = field(default_factory=dict)
+
+
+def has_detail_resolver(provider: Optional[ModuleType]) -> bool:
+    """Return whether a provider module declares a detail resolver."""
+    return all(callable(getattr(provider, hook, None)) for hook in RESOLVER_HOOKS)
+
+
+def merge_detail_requests(schedules: Iterable[Optional[Schedule]]) -> Dict[Hashable, Any]:
+    """Merge the detail lookups of several schedules.
+
+    The first request seen for a key wins, so the merged lookups follow
+    channel order. Schedules that failed to load are ``None`` and skipped.
+    """
+    merged: Dict[Hashable, Any] = {}
+    for schedule in schedules:
+        if schedule is None:
+            continue
+        for key, request in schedule.details.items():
+            merged.setdefault(key, request)
+    return merged
@@ -0,0 +1,200 @@
+"""
+Persistent store of programme enrichment results.
+
+Providers enrich schedule entries with a second, per-programme request
+(RadioTimes episode details, YouView episodes, Freeview programme details).
+Those results rarely change, yet the in-memory ``ctx.caches`` start empty on
+every build. :class:`EnrichmentStore` keeps them in a SQLite database between
+builds, so that a routine run only looks up programmes it has not seen yet.
+
+Entries expire after a per-provider lifetime. Lookups the upstream API
+answered definitively, e.g. with a 404, are stored as negative entries with a
+much shorter lifetime, so a missing programme is not requested on every run
+but is retried eventually. Transient failures are never stored.
+
+Unlike :class:`src.cache.ResponseCache`, which stores raw HTTP bodies, the
+store holds the decoded values providers actually use, keyed by provider and
+programme ID.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Union
+
+# Default location of the store, next to the HTTP response cache.
+DEFAULT_ENRICHMENT_PATH = ".cache/enrichment.sqlite"
+
+_DAY = 24 * 60 * 60
+
+# Lifetime of stored results per provider ``src`` code.
+DEFAULT_TTLS: Dict[str, int] = {
+    "rt": 30 * _DAY,
+    "yv": 30 * _DAY,
+    "freeview": 14 * _DAY,
+}
+
+# Lifetime of results for providers without an entry in the TTLs.
+DEFAULT_TTL = 7 * _DAY
+
+# Lifetime of negative entries, i.e. lookups that found nothing.
+DEFAULT_NEGATIVE_TTL = _DAY
+
+# Returned by :meth:`EnrichmentStore.get` when nothing usable is stored. A
+# stored ``None`` is a negative entry and is returned as ``None``.
+MISSING = object()
+
+
+def is_permanent_failure(exc: BaseException) -> bool:
+    """Return whether a failed lookup should be stored as a negative entry.
+
+    Client errors other than 429 mean the programme is unknown upstream;
+    anything else (timeouts, 5xx, rate limiting) may succeed on retry.
+    """
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None:
+        # aiohttp.ClientResponseError carries the status directly.
+        status = getattr(exc, "status", None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+@dataclass
+class EnrichmentStats:
+    """Counters of one provider's use of the store."""
+
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    stored: int = 0
+
+
+class EnrichmentStore:
+    """SQLite-backed key-value store of enrichment results.
+
+    The store is safe to share between threads: a single connection is used
+    and serialised with a lock.
+
+    Args:
+        path: Location of the SQLite database. Parent directories are
+            created as needed.
+        ttls: Lifetime in seconds of stored results per provider.
+        default_ttl: Lifetime for providers missing from ``ttls``.
+        negative_ttl: Lifetime of negative entries.
+        clock: Wall clock returning epoch seconds, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_ENRICHMENT_PATH,
+        ttls: Mapping[str, int] = DEFAULT_TTLS,
+        default_ttl: int = DEFAULT_TTL,
+        negative_ttl: int = DEFAULT_NEGATIVE_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EnrichmentStats] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS enrichment (
+                provider TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (provider, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS enrichment_expires ON enrichment (expires_at)"
+        )
+        self._conn.commit()
+
+    def _stats_for(self, provider: str) -> EnrichmentStats:
+        return self._stats.setdefault(provider, EnrichmentStats())
+
+    def get(self, provider: str, key: Any) -> Any:
+        """Return the stored result of a lookup.
+
+        Returns:
+            The stored value, ``None`` for a negative entry, or
+            :data:`MISSING` if nothing unexpired is stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM enrichment WHERE provider = ? AND key = ?",
+                (provider, str(key)),
+            ).fetchone()
+            stats = self._stats_for(provider)
+            if row is None or row[1] <= self._clock():
+                stats.misses += 1
+                return MISSING
+            if row[0] is None:
+                stats.negative_hits += 1
+                return None
+            stats.hits += 1
+        return json.loads(row[0])
+
+    def put(self, provider: str, key: Any, value: Any) -> None:
+        """Store the result of a lookup; ``None`` stores a negative entry."""
+        if value is None:
+            ttl = self.negative_ttl
+            encoded = None
+        else:
+            ttl = self.ttls.get(provider, self.default_ttl)
+            encoded = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO enrichment (provider, key, value, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (provider, str(key), encoded, self._clock() + ttl),
+            )
+            self._conn.commit()
+            self._stats_for(provider).stored += 1
+
+    def compact(self) -> int:
+        """Drop expired entries and reclaim their space.
+
+        Returns:
+            The number of entries removed.
+        """
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM enrichment WHERE expires_at <= ?", (self._clock(),)
+            ).rowcount
+            self._conn.commit()
+            if removed:
+                self._conn.execute("VACUUM")
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM enrichment").fetchone()[0]
+
+    def stats(self) -> Dict[str, EnrichmentStats]:
+        """Return a snapshot of the per-provider counters."""
+        with self._lock:
+            return {name: EnrichmentStats(**vars(stats)) for name, stats in self._stats.items()}
+
+    def clear(self) -> None:
+        """Remove every entry from the store."""
+        with self._lock:
+            self._conn.execute("DELETE FROM enrichment")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,516 @@
+"""
+Concurrent channel fetching for the build pipeline.
+
+Channel fetches are almost entirely network bound, so running them one after
+another leaves the build waiting on sockets. This module runs them on a
+bounded thread pool while keeping two guarantees of the original serial loop:
+
+* A failing channel is logged and skipped; it never takes down the build.
+* The combined programme list is in channel order regardless of completion
+  order, so :func:`src.dedupe.dedupe_programmes` and
+  :func:`src.xmltv.build_xmltv` see exactly the same input as before.
+
+Each provider can additionally be capped to a maximum number of in-flight
+channels so that a single upstream host is not hammered by every worker.
+
+:func:`fetch_channels_async` offers the same guarantees on an asyncio event
+loop. Providers implementing ``fetch_programmes_async`` run directly on the
+loop; the rest fall back to their sync ``fetch_programmes`` in a thread pool.
+
+Providers may also implement a ``prefetch(channels, ctx)`` hook (and
+``prefetch_async`` for the asyncio orchestrator), which receives all of the
+provider's channels at once, e.g. to request them in batches. A provider's
+channels are only dispatched once its prefetch has finished; other providers
+are not held up. A failing prefetch is logged and its channels are fetched
+one by one as usual.
+
+Providers declaring a detail resolver (see :mod:`src.details`) are fetched in
+two phases: the schedules of all their channels first, then one shared,
+deduplicated round of detail lookups, and finally the programme assembly.
+Detail lookups are capped per provider like channels, using
+:data:`DEFAULT_DETAIL_LIMITS` (:data:`DEFAULT_ASYNC_DETAIL_LIMITS` on the
+asyncio orchestrator).
+
+Both orchestrators accept a ``transform`` applied to each channel's
+programmes as soon as they are fetched, e.g. to normalise their text while
+the rest of the channels are still in flight rather than holding every raw
+provider result until the end. An ``on_start`` callback is told when the
+fetch of each channel starts, once it is no longer held back by a prefetch
+or a provider cap; together they time every channel's fetch.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import ModuleType
+from typing import Any, Callable, Deque, Dict, Hashable, List, Mapping, Optional, Tuple
+
+from .details import Schedule, has_detail_resolver, merge_detail_requests
+from .http import tag_channel, tag_provider
+from .providers.base import Context
+
+logger = logging.getLogger(__name__)
+
+# Default size of the worker pool used for channel fetches.
+DEFAULT_WORKERS = 8
+
+# Default per-provider caps on concurrently fetched channels. Freesat issues
+# its day requests concurrently within each channel, so it gets few slots.
+# Providers without an entry are only bounded by the pool size.
+DEFAULT_PROVIDER_LIMITS: Dict[str, int] = {
+    "sky": 8,
+    "freeview": 2,
+    "freesat": 2,
+    "rt": 4,
+    "yv": 4,
+}
+
+# Per-provider caps used by the asyncio orchestrator for providers with a
+# native async implementation. A channel there costs a coroutine rather than
+# a thread, so many more can be in flight; the connection limit of the
+# :class:`src.http.AsyncSession` bounds the actual sockets.
+DEFAULT_ASYNC_PROVIDER_LIMITS: Dict[str, int] = {
+    **DEFAULT_PROVIDER_LIMITS,
+    "sky": 64,
+    "rt": 16,
+}
+
+# Per-provider caps on concurrent detail lookups made by the shared detail
+# stage. Lookups are single small requests, so more of them can be in flight
+# than channels; providers without an entry are only bounded by the pool.
+DEFAULT_DETAIL_LIMITS: Dict[str, int] = {
+    "freeview": 8,
+    "rt": 8,
+    "yv": 8,
+}
+
+# Per-provider caps on detail lookups used by the asyncio orchestrator for
+# providers with a native ``resolve_details_async``.
+DEFAULT_ASYNC_DETAIL_LIMITS: Dict[str, int] = {
+    **DEFAULT_DETAIL_LIMITS,
+    "rt": 64,
+}
+
+
+# Applied to a channel and its programmes as soon as they are fetched.
+Transform = Callable[[Dict[str, Any], List[Dict[str, Any]]], List[Any]]
+
+# Called with a channel when its fetch starts.
+StartCallback = Callable[[Dict[str, Any]], None]
+
+
+def _log_channel_error(channel: Dict[str, Any], exc: Exception) -> None:
+    # Log and continue on provider-specific exceptions so that one
+    # misbehaving source does not take down the whole build.
+    logging.error("Error fetching programmes for %s: %s", channel.get("name"), exc)
+
+
+def _queue_channels(
+    channels: List[Dict[str, Any]], providers: Mapping[str, ModuleType]
+) -> Dict[str, Deque[int]]:
+    """Group channel indices by source, warning about unknown sources."""
+    queues: Dict[str, Deque[int]] = {}
+    for index, channel in enumerate(channels):
+        src = channel.get("src")
+        if src not in providers:
+            logging.warning(
+                "Unknown source '%s' for channel %s; skipping.",
+                src,
+                channel.get("name"),
+            )
+            continue
+        queues.setdefault(src, deque()).append(index)
+    return queues
+
+
+def _identity(channel: Dict[str, Any], programmes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return programmes
+
+
+def _ignore(channel: Dict[str, Any]) -> None:
+    pass
+
+
+def _concatenate(results: List[Optional[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    programmes: List[Dict[str, Any]] = []
+    for ch_programmes in results:
+        if ch_programmes:
+            programmes.extend(ch_programmes)
+    return programmes
+
+
+def _prefetch(
+    src: str, channels: List[Dict[str, Any]], ctx: Context, provider: ModuleType
+) -> None:
+    """Run a provider's ``prefetch`` hook, isolating any error it raises."""
+    try:
+        with tag_provider(src):
+            provider.prefetch(channels, ctx)
+    except Exception as exc:
+        logging.error("Error prefetching programmes for %s: %s", src, exc)
+
+
+def _fetch_channel(
+    channel: Dict[str, Any], ctx: Context, provider: ModuleType
+) -> List[Dict[str, Any]]:
+    """Run a single provider fetch, isolating any error it raises."""
+    logger.info("Fetching programmes for %s", channel.get("name"))
+    try:
+        with tag_provider(channel.get("src")), tag_channel(channel.get("xmltv_id")):
+            return provider.fetch_programmes(channel, ctx)
+    except Exception as exc:
+        _log_channel_error(channel, exc)
+        return []
+
+
+def _fetch_schedule(
+    channel: Dict[str, Any], ctx: Context, provider: ModuleType
+) -> Optional[Schedule]:
+    """Run a provider's ``fetch_schedule``, isolating any error it raises."""
+    logger.info("Fetching programmes for %s", channel.get("name"))
+    try:
+        with tag_provider(channel.get("src")), tag_channel(channel.get("xmltv_id")):
+            return provider.fetch_schedule(channel, ctx)
+    except Exception as exc:
+        _log_channel_error(channel, exc)
+        return None
+
+
+def _resolve_detail(
+    src: str, key: Hashable, request: Any, ctx: Context, provider: ModuleType
+) -> Any:
+    """Run a single detail lookup; a failing lookup resolves to ``None``."""
+    try:
+        with tag_provider(src):
+            return provider.resolve_details(key, request, ctx)
+    except Exception as exc:
+        logging.error("Error fetching details %r for %s: %s", key, src, exc)
+        return None
+
+
+def _assemble(
+    channel: Dict[str, Any],
+    schedule: Optional[Schedule],
+    details: Dict[Hashable, Any],
+    ctx: Context,
+    provider: ModuleType,
+) -> List[Dict[str, Any]]:
+    """Build a channel's programmes from its schedule and resolved details."""
+    if schedule is None:
+        return []
+    try:
+        return provider.assemble_programmes(channel, schedule, details, ctx)
+    except Exception as exc:
+        _log_channel_error(channel, exc)
+        return []
+
+
+def fetch_channels(
+    channels: List[Dict[str, Any]],
+    ctx: Context,
+    providers: Mapping[str, ModuleType],
+    workers: int = DEFAULT_WORKERS,
+    provider_limits: Optional[Mapping[str, int]] = None,
+    detail_limits: Optional[Mapping[str, int]] = None,
+    transform: Optional[Transform] = None,
+    on_start: Optional[StartCallback] = None,
+) -> List[Dict[str, Any]]:
+    """Fetch programmes for all channels using a bounded worker pool.
+
+    Args:
+        channels: Channel definitions as loaded from ``channels.json``.
+        ctx: Shared context passed to every provider fetch.
+        providers: Mapping of ``src`` codes to provider modules exposing
+            ``fetch_programmes``. Channels with an unknown source are skipped
+            with a warning.
+        workers: Maximum number of channels fetched at the same time.
+        provider_limits: Optional mapping of ``src`` codes to the maximum
+            number of channels of that source fetched at the same time.
+            Defaults to :data:`DEFAULT_PROVIDER_LIMITS`.
+        detail_limits: Optional mapping of ``src`` codes to the maximum
+            number of detail lookups of that source made at the same time.
+            Defaults to :data:`DEFAULT_DETAIL_LIMITS`.
+        transform: Optional function applied to each channel and its
+            programmes as soon as they are fetched, on the calling thread.
+        on_start: Optional callback told of each channel whose fetch, or
+            schedule fetch, is submitted to the pool, on the calling thread.
+
+    Returns:
+        The programmes of all channels, concatenated in channel order.
+    """
+    if provider_limits is None:
+        provider_limits = DEFAULT_PROVIDER_LIMITS
+    if detail_limits is None:
+        detail_limits = DEFAULT_DETAIL_LIMITS
+    if transform is None:
+        transform = _identity
+    if on_start is None:
+        on_start = _ignore
+    workers = max(1, int(workers))
+
+    # Queue jobs per source so that caps can be honoured without parking
+    # worker threads on a semaphore. A job is a ``(kind, argument)`` pair:
+    # a channel index for "channel" and "schedule" jobs, a key and request
+    # for "detail" jobs.
+    queues: Dict[str, Deque[Tuple[str, Any]]] = {}
+    staged: Dict[str, List[int]] = {}
+    for src, indices in _queue_channels(channels, providers).items():
+        kind = "channel"
+        if has_detail_resolver(providers[src]):
+            kind = "schedule"
+            staged[src] = list(indices)
+        queues[src] = deque((kind, index) for index in indices)
+
+    results: List[Optional[List[Dict[str, Any]]]] = [None] * len(channels)
+    schedules: Dict[int, Optional[Schedule]] = {}
+    details: Dict[str, Dict[Hashable, Any]] = {src: {} for src in staged}
+    # Outstanding schedule or detail jobs of each staged provider.
+    outstanding: Dict[str, int] = {src: len(indices) for src, indices in staged.items()}
+    resolving: set = set()
+    in_flight: Dict[str, int] = {src: 0 for src in queues}
+    futures: Dict[Any, tuple] = {}
+
+    def _has_capacity(src: str) -> bool:
+        limits = detail_limits if queues[src][0][0] == "detail" else provider_limits
+        limit = limits.get(src)
+        return limit is None or in_flight[src] < max(1, int(limit))
+
+    def _submit(src: str, kind: str, arg: Any):
+        provider = providers[src]
+        if kind == "detail":
+            return pool.submit(_resolve_detail, src, *arg, ctx, provider)
+        on_start(channels[arg])
+        if kind == "schedule":
+            return pool.submit(_fetch_schedule, channels[arg], ctx, provider)
+        return pool.submit(_fetch_channel, channels[arg], ctx, provider)
+
+    def _advance(src: str) -> None:
+        """Move a staged provider on once all of its current jobs are done."""
+        if outstanding[src]:
+            return
+        if src not in resolving:
+            resolving.add(src)
+            requests = merge_detail_requests(schedules[index] for index in staged[src])
+            if requests:
+                queues[src] = deque(("detail", item) for item in requests.items())
+                outstanding[src] = len(requests)
+                return
+        for index in staged[src]:
+            results[index] = transform(
+                channels[index],
+                _assemble(channels[index], schedules[index], details[src], ctx, providers[src]),
+            )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Hold back the channels of providers with a prefetch hook until it
+        # has completed; the hook occupies one worker meanwhile.
+        held: Dict[str, Deque[Tuple[str, Any]]] = {}
+        for src in list(queues):
+            if getattr(providers[src], "prefetch", None) is None:
+                continue
+            held[src] = queues.pop(src)
+            batch = [channels[index] for _, index in held[src]]
+            future = pool.submit(_prefetch, src, batch, ctx, providers[src])
+            futures[future] = ("prefetch", src, None)
+
+        while queues or futures:
+            # Fill free worker slots round-robin across sources so one large
+            # provider cannot starve the others.
+            progressed = True
+            while progressed and len(futures) < workers:
+                progressed = False
+                for src in list(queues):
+                    if len(futures) >= workers:
+                        break
+                    if not _has_capacity(src):
+                        continue
+                    kind, arg = queues[src].popleft()
+                    if not queues[src]:
+                        del queues[src]
+                    futures[_submit(src, kind, arg)] = (kind, src, arg)
+                    in_flight[src] += 1
+                    progressed = True
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, src, arg = futures.pop(future)
+                if kind == "prefetch":
+                    queues[src] = held.pop(src)
+                    continue
+                in_flight[src] -= 1
+                if kind == "channel":
+                    results[arg] = transform(channels[arg], future.result())
+                    continue
+                if kind == "schedule":
+                    schedules[arg] = future.result()
+                else:
+                    details[src][arg[0]] = future.result()
+                outstanding[src] -= 1
+                _advance(src)
+
+    return _concatenate(results)
+
+
+async def fetch_channels_async(
+    channels: List[Dict[str, Any]],
+    ctx: Context,
+    providers: Mapping[str, ModuleType],
+    workers: int = DEFAULT_WORKERS,
+    provider_limits: Optional[Mapping[str, int]] = None,
+    detail_limits: Optional[Mapping[str, int]] = None,
+    transform: Optional[Transform] = None,
+    on_start: Optional[StartCallback] = None,
+) -> List[Dict[str, Any]]:
+    """Fetch programmes for all channels on the running event loop.
+
+    ``ctx.async_session`` must be an open :class:`src.http.AsyncSession`.
+    Providers without ``fetch_programmes_async`` run their sync
+    ``fetch_programmes`` on a pool of ``workers`` threads.
+
+    Args:
+        channels: Channel definitions as loaded from ``channels.json``.
+        ctx: Shared context passed to every provider fetch.
+        providers: Mapping of ``src`` codes to provider modules.
+        workers: Size of the thread pool used for sync-only providers.
+        provider_limits: Optional mapping of ``src`` codes to the maximum
+            number of channels of that source fetched at the same time.
+            Defaults to :data:`DEFAULT_ASYNC_PROVIDER_LIMITS`.
+        detail_limits: Optional mapping of ``src`` codes to the maximum
+            number of detail lookups of that source made at the same time.
+            Defaults to :data:`DEFAULT_ASYNC_DETAIL_LIMITS`.
+        transform: Optional function applied to each channel and its
+            programmes as soon as they are fetched, on the event loop.
+        on_start: Optional callback told of each channel whose fetch, or
+            schedule fetch, starts, on the event loop.
+
+    Returns:
+        The programmes of all channels, concatenated in channel order.
+    """
+    if provider_limits is None:
+        provider_limits = DEFAULT_ASYNC_PROVIDER_LIMITS
+    if detail_limits is None:
+        detail_limits = DEFAULT_ASYNC_DETAIL_LIMITS
+    if transform is None:
+        transform = _identity
+    if on_start is None:
+        on_start = _ignore
+    queues = _queue_channels(channels, providers)
+    semaphores = {
+        src: asyncio.Semaphore(max(1, int(provider_limits[src])))
+        for src in queues
+        if provider_limits.get(src) is not None
+    }
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+
+        async def _prefetch_async(src: str) -> None:
+            provider = providers[src]
+            batch = [channels[index] for index in queues[src]]
+            prefetch_async = getattr(provider, "prefetch_async", None)
+            if prefetch_async is None:
+                await loop.run_in_executor(pool, _prefetch, src, batch, ctx, provider)
+                return
+            try:
+                with tag_provider(src):
+                    await prefetch_async(batch, ctx)
+            except Exception as exc:
+                logging.error("Error prefetching programmes for %s: %s", src, exc)
+
+        prefetches = {
+            src: asyncio.ensure_future(_prefetch_async(src))
+            for src in queues
+            if getattr(providers[src], "prefetch_async", None) is not None
+            or getattr(providers[src], "prefetch", None) is not None
+        }
+
+        # Providers with a detail resolver are fetched in two phases.
+        staged = {src for src in queues if has_detail_resolver(providers[src])}
+
+        async def _fetch(index: int, src: str) -> Any:
+            """Fetch a channel's programmes, or its schedule if ``src`` is staged."""
+            channel = channels[index]
+            provider = providers[src]
+            if src in prefetches:
+                await prefetches[src]
+            if src in staged:
+                fetch_async = getattr(provider, "fetch_schedule_async", None)
+                fetch_sync, failed = _fetch_schedule, None
+            else:
+                fetch_async = getattr(provider, "fetch_programmes_async", None)
+                fetch_sync, failed = _fetch_channel, []
+            semaphore = semaphores.get(src)
+            if semaphore is not None:
+                await semaphore.acquire()
+            on_start(channel)
+            try:
+                if fetch_async is None:
+                    return await loop.run_in_executor(pool, fetch_sync, channel, ctx, provider)
+                logger.info("Fetching programmes for %s", channel.get("name"))
+                try:
+                    with tag_provider(src), tag_channel(channel.get("xmltv_id")):
+                        return await fetch_async(channel, ctx)
+                except Exception as exc:
+                    _log_channel_error(channel, exc)
+                    return failed
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+
+        async def _resolve_stage(src: str) -> Dict[Hashable, Any]:
+            """Resolve the merged detail lookups of a staged provider's channels."""
+            provider = providers[src]
+            requests = merge_detail_requests([await fetches[index] for index in queues[src]])
+            resolve_async = getattr(provider, "resolve_details_async", None)
+            limit = detail_limits.get(src)
+            semaphore = asyncio.Semaphore(max(1, int(limit))) if limit is not None else None
+
+            async def _resolve(key: Hashable, request: Any) -> Any:
+                if semaphore is not None:
+                    await semaphore.acquire()
+                try:
+                    if resolve_async is None:
+                        return await loop.run_in_executor(
+                            pool, _resolve_detail, src, key, request, ctx, provider
+                        )
+                    try:
+                        with tag_provider(src):
+                            return await resolve_async(key, request, ctx)
+                    except Exception as exc:
+                        logging.error("Error fetching details %r for %s: %s", key, src, exc)
+                        return None
+                finally:
+                    if semaphore is not None:
+                        semaphore.release()
+
+            values = await asyncio.gather(*(_resolve(*item) for item in requests.items()))
+            return dict(zip(requests, values))
+
+        fetches = {
+            index: asyncio.ensure_future(_fetch(index, src))
+            for src, indices in queues.items()
+            for index in indices
+        }
+        stages = {src: asyncio.ensure_future(_resolve_stage(src)) for src in staged}
+
+        async def _finish(index: int, src: str) -> List[Dict[str, Any]]:
+            """Assemble and transform a channel's programmes once they are ready."""
+            outcome = await fetches[index]
+            if src in staged:
+                outcome = _assemble(
+                    channels[index], outcome, await stages[src], ctx, providers[src]
+                )
+            return transform(channels[index], outcome)
+
+        finishes = {
+            index: asyncio.ensure_future(_finish(index, src))
+            for src, indices in queues.items()
+            for index in indices
+        }
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(channels)
+        for index, finish in finishes.items():
+            results[index] = await finish
+
+    return _concatenate(results)
@@ -0,0 +1,313 @@
+"""
+Hedged channel fetches across a channel's alternate sources.
+
+A single slow host can hold up a whole build: a stalled schedule request
+only gives up after its read timeout. For channels listing more than one
+source (see :mod:`src.sources`), the :class:`Hedger` starts the primary
+fetch and, for each channel whose fetch has been running longer than a
+latency percentile learned from the channel fetches of the run so far, also
+starts a fetch of the channel from its alternate source. Each channel keeps
+the programmes of whichever fetch returns them first.
+
+The primary channels of a provider are fetched together, and so are the
+alternates hedged at the same moment, so that both still go through the
+executor's batched path (prefetch hooks, the shared detail stage and a
+single async session). The executor reports when each channel's fetch
+starts and when its programmes are ready, which times every channel on its
+own: only the slow channels of a batch are hedged, and a channel waiting
+for a prefetch or a provider cap is not counted as slow. A channel whose
+primary returns nothing is hedged at once. An empty or failed result never
+wins while the other fetch may still return programmes for the channel.
+
+A losing fetch cannot be interrupted in its worker thread; it finishes in
+the background and its programmes are discarded. :meth:`Hedger.close` waits
+for those fetches, and must be called before the cache, stores or cassette
+they may still write to are closed.
+
+Until enough latencies of a provider have been observed, the hedge delay is
+a fixed :data:`DEFAULT_HEDGE_DELAY`.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .programme import Programme, ProgrammeLike, as_programmes
+from .providers.base import Context
+from .utils import percentile
+
+# Percentile of a provider's observed channel fetch latencies after which
+# the alternate source is tried.
+DEFAULT_HEDGE_PERCENTILE = 95.0
+
+# Hedge delay in seconds used until a provider has enough observed latencies.
+DEFAULT_HEDGE_DELAY = 10.0
+
+# Observed latencies needed before the percentile is trusted.
+MIN_SAMPLES = 5
+
+# Fetches a list of channels with a context and returns their programmes.
+# Hedged fetches also pass the ``on_start`` and ``on_result`` keywords, to be
+# called with each channel when its fetch starts and with each channel and
+# its programmes once they are ready (see :mod:`src.executor`).
+Fetcher = Callable[..., List[ProgrammeLike]]
+
+
+@dataclass
+class HedgeStats:
+    """Counters of one provider's hedged channels, reported after the run."""
+
+    fetches: int = 0
+    hedged: int = 0
+    alternate_wins: int = 0
+    abandoned: int = 0
+    delay: float = DEFAULT_HEDGE_DELAY
+
+
+class LatencyTracker:
+    """Thread-safe record of fetch latencies per provider.
+
+    Args:
+        percentile: Percentile returned by :meth:`threshold`, from 0 to 100.
+        default: Threshold used while fewer than ``min_samples`` latencies
+            of a provider have been recorded.
+        min_samples: Number of latencies needed to use the percentile.
+    """
+
+    def __init__(
+        self,
+        percentile: float = DEFAULT_HEDGE_PERCENTILE,
+        default: float = DEFAULT_HEDGE_DELAY,
+        min_samples: int = MIN_SAMPLES,
+    ) -> None:
+        self.percentile = percentile
+        self.default = default
+        self.min_samples = min_samples
+        self._samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, src: str, seconds: float) -> None:
+        """Record the latency of one fetch from ``src``."""
+        with self._lock:
+            bisect.insort(self._samples.setdefault(src, []), seconds)
+
+    def threshold(self, src: str) -> float:
+        """Return the hedge delay of ``src``, by the nearest-rank percentile."""
+        with self._lock:
+            samples = self._samples.get(src, [])
+            if len(samples) < self.min_samples:
+                return self.default
+            return percentile(samples, self.percentile)
+
+
+def _by_channel(programmes: List[ProgrammeLike]) -> Dict[Any, List[Programme]]:
+    by_channel: Dict[Any, List[Programme]] = {}
+    for programme in as_programmes(programmes):
+        by_channel.setdefault(programme.channel, []).append(programme)
+    return by_channel
+
+
+class _Batch:
+    """One batched fetch of a race, and what it reported of each channel."""
+
+    def __init__(self, channels: List[Dict[str, Any]]) -> None:
+        self.ids = [channel.get("xmltv_id") for channel in channels]
+        self.started: Dict[Any, float] = {}
+        self.answers: Dict[Any, List[Programme]] = {}
+        self.future: Optional[Future] = None
+
+    def settle(self) -> None:
+        """Take the channels a finished fetch did not report from its result."""
+        if not self.future.done() or len(self.answers) == len(self.ids):
+            return
+        try:
+            by_channel = _by_channel(self.future.result())
+        except Exception:
+            by_channel = {}
+        for channel in self.ids:
+            self.answers.setdefault(channel, by_channel.get(channel, []))
+
+
+class Hedger:
+    """Fetch channels from their primary source, hedged by an alternate.
+
+    Args:
+        workers: Number of threads running hedged fetches, primaries and
+            alternates together. It is raised to one per primary provider
+            and hedged channel, so that no hedged fetch waits for a thread.
+        tracker: Latency tracker deciding the hedge delays, fed with the
+            latency of every channel fetch.
+    """
+
+    def __init__(self, workers: int, tracker: Optional[LatencyTracker] = None) -> None:
+        self.workers = max(2, workers)
+        self.tracker = tracker or LatencyTracker()
+        self._stats: Dict[str, HedgeStats] = {}
+        self._pools: List[ThreadPoolExecutor] = []
+        self._lock = threading.Lock()
+
+    def _count(self, src: str, **increments: Any) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(src, HedgeStats())
+            for name, value in increments.items():
+                setattr(stats, name, getattr(stats, name) + value)
+
+    def stats(self) -> Dict[str, HedgeStats]:
+        """Return a snapshot of the counters of each primary provider."""
+        with self._lock:
+            snapshot = {src: HedgeStats(**vars(stats)) for src, stats in self._stats.items()}
+        for src, stats in snapshot.items():
+            stats.delay = self.tracker.threshold(src)
+        return snapshot
+
+    def _race(
+        self,
+        pool: ThreadPoolExecutor,
+        src: str,
+        pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+        ctx: Context,
+        fetch: Fetcher,
+    ) -> List[ProgrammeLike]:
+        alternates = {primary.get("xmltv_id"): alternate for primary, alternate in pairs}
+        ids = list(alternates)
+        self._count(src, fetches=len(ids))
+        # Guards the batches and wakes the race whenever one reports.
+        changed = threading.Condition()
+
+        def submit(channels: List[Dict[str, Any]]) -> _Batch:
+            batch = _Batch(channels)
+
+            def on_start(channel: Dict[str, Any]) -> None:
+                with changed:
+                    batch.started.setdefault(channel.get("xmltv_id"), time.monotonic())
+                    changed.notify_all()
+
+            def on_result(channel: Dict[str, Any], programmes: List[ProgrammeLike]) -> None:
+                channel_id = channel.get("xmltv_id")
+                with changed:
+                    started = batch.started.get(channel_id)
+                    batch.answers[channel_id] = as_programmes(programmes)
+                    changed.notify_all()
+                if started is not None:
+                    self.tracker.record(channel.get("src"), time.monotonic() - started)
+
+            def on_done(future: Future) -> None:
+                with changed:
+                    changed.notify_all()
+
+            # The async orchestrator opens its session on the context, so
+            # concurrent fetches each get a copy. Copy the caller's context
+            # variables too so provider tags carry over.
+            batch.future = pool.submit(
+                contextvars.copy_context().run,
+                fetch,
+                channels,
+                replace(ctx),
+                on_start=on_start,
+                on_result=on_result,
+            )
+            batch.future.add_done_callback(on_done)
+            return batch
+
+        primary = submit([primary for primary, _ in pairs])
+        hedges: Dict[Any, _Batch] = {}
+        won: Dict[Any, List[Programme]] = {}
+        with changed:
+            while True:
+                for batch in {primary, *hedges.values()}:
+                    batch.settle()
+                for channel in ids:
+                    if channel in won:
+                        continue
+                    answer = primary.answers.get(channel)
+                    hedge = hedges.get(channel)
+                    alternate = hedge.answers.get(channel) if hedge is not None else None
+                    if answer:
+                        won[channel] = answer
+                    elif alternate:
+                        won[channel] = alternate
+                        self._count(src, alternate_wins=1)
+                    elif answer is not None and alternate is not None:
+                        won[channel] = []
+                if len(won) == len(ids):
+                    break
+                # Hedge the channels the primary returned nothing for, and
+                # those it has been fetching for longer than the threshold.
+                # A channel not started yet is held back by the executor,
+                # not by its host.
+                now = time.monotonic()
+                delay = self.tracker.threshold(src)
+                slow: List[Any] = []
+                wake: Optional[float] = None
+                for channel in ids:
+                    if channel in won or channel in hedges:
+                        continue
+                    started = primary.started.get(channel)
+                    if channel in primary.answers or (
+                        started is not None and now - started >= delay
+                    ):
+                        slow.append(channel)
+                    elif started is not None:
+                        remaining = started + delay - now
+                        wake = remaining if wake is None else min(wake, remaining)
+                if slow:
+                    self._count(src, hedged=len(slow))
+                    batch = submit([alternates[channel] for channel in slow])
+                    hedges.update((channel, batch) for channel in slow)
+                    continue
+                changed.wait(wake)
+        batches = {primary, *hedges.values()}
+        self._count(src, abandoned=sum(not batch.future.done() for batch in batches))
+        return [p for channel in ids for p in won[channel]]
+
+    def fetch(
+        self,
+        pairs: Sequence[Tuple[Dict[str, Any], Dict[str, Any]]],
+        ctx: Context,
+        fetch: Fetcher,
+    ) -> List[ProgrammeLike]:
+        """Fetch channels from hedged ``(primary, alternate)`` source pairs.
+
+        Args:
+            pairs: Primary and alternate definitions of each channel.
+            ctx: Shared context.
+            fetch: Fetches a list of single-source channel definitions.
+
+        Returns:
+            The winning programmes of every channel, in the channel order of
+            each primary provider.
+        """
+        programmes: List[ProgrammeLike] = []
+        if not pairs:
+            return programmes
+        by_src: Dict[str, List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+        for primary, alternate in pairs:
+            by_src.setdefault(primary.get("src"), []).append((primary, alternate))
+        # Every race holds a thread while it waits on its fetches, so the
+        # races and the fetches run on separate pools.
+        fetches = ThreadPoolExecutor(max_workers=max(self.workers, len(by_src) + len(pairs)))
+        with self._lock:
+            self._pools.append(fetches)
+        with ThreadPoolExecutor(max_workers=len(by_src)) as races:
+            futures = [
+                races.submit(
+                    contextvars.copy_context().run, self._race, fetches, src, group, ctx, fetch
+                )
+                for src, group in by_src.items()
+            ]
+            for future in futures:
+                programmes.extend(future.result())
+        # Losing fetches still running are left to finish; see close().
+        fetches.shutdown(wait=False)
+        return programmes
+
+    def close(self) -> None:
+        """Wait for the losing fetches still running in the background."""
+        with self._lock:
+            pools, self._pools = self._pools, []
+        for pool in pools:
+            pool.shutdown(wait=True)
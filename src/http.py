@@ -4,31 +4,541 @@ HTTP utilities for the Freeview-EPG project.
 Provides a helper to create a configured ``requests.Session`` with retry
 behaviour. All network I/O throughout the project should use the same
 session to benefit from connection pooling and consistent timeouts.
+
+For providers that implement the optional asyncio interface, an
+:class:`AsyncSession` offers the same retry policy on top of ``aiohttp`` so
+that many requests can be in flight on a single thread.
+
+Both sessions accept an optional :class:`src.ratelimit.HostRateLimiter`, so
+every provider is rate limited per host without any changes of its own, and
+an optional :class:`src.cache.ResponseCache` that answers repeat requests
+from disk before they reach the limiter or the network. Expired cache entries
+are revalidated with ``If-None-Match``/``If-Modified-Since`` so that an
+unchanged schedule costs a ``304`` rather than a full download.
+
+Requests are attributed to the provider whose fetch issued them through
+:data:`request_provider`, which the executor sets around every channel
+fetch; the cache uses it to report its savings per provider. The executor
+likewise sets :data:`request_channel` around the fetch of each channel.
+
+Both sessions also accept a :class:`src.cassette.Cassette`. Recording, it
+captures every exchange with the network along with its latency; replaying,
+it answers requests in place of the network, after the cache and the rate
+limiter have had their say. Given a :class:`src.telemetry.Telemetry`, both
+sessions record the latency, size, status, retries and cache outcome of
+every request they handle.
 """
 
+import asyncio
+import contextlib
+import json
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
 import requests
 from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
 from urllib3.util.retry import Retry
 
+from .cache import CachedResponse, ResponseCache
+from .cassette import Cassette, Interaction
+from .ratelimit import HostRateLimiter
+from .telemetry import (
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_REVALIDATED,
+    RequestSample,
+    Telemetry,
+    request_day,
+)
+
+# Retry policy shared by the sync and async sessions.
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Source code (e.g. ``"sky"``) of the provider fetch issuing the current
+# request. Context variables follow threads' own calls and asyncio tasks, so
+# concurrent channel fetches each see their own value.
+request_provider: ContextVar[Optional[str]] = ContextVar("request_provider", default=None)
+
+
+@contextlib.contextmanager
+def tag_provider(src: Optional[str]) -> Iterator[None]:
+    """Attribute requests made within the block to the provider ``src``."""
+    token = request_provider.set(src)
+    try:
+        yield
+    finally:
+        request_provider.reset(token)
+
+
+# ``xmltv_id`` of the channel whose fetch issues the current request, if the
+# request belongs to a single channel.
+request_channel: ContextVar[Optional[str]] = ContextVar("request_channel", default=None)
+
+
+@contextlib.contextmanager
+def tag_channel(channel_id: Optional[str]) -> Iterator[None]:
+    """Attribute requests made within the block to the channel ``channel_id``."""
+    token = request_channel.set(channel_id)
+    try:
+        yield
+    finally:
+        request_channel.reset(token)
+
+
+@dataclass
+class _Exchange:
+    """Measurements of one request, filled in while it is handled."""
+
+    status: Optional[int] = None
+    wait: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+    cache: Optional[str] = None
+
+
+def _observe(
+    telemetry: Telemetry,
+    method: str,
+    url: str,
+    provider: Optional[str],
+    exchange: _Exchange,
+    started: float,
+) -> None:
+    """Record the measurements of a request that started at ``started``."""
+    telemetry.record(
+        RequestSample(
+            provider=provider,
+            channel=request_channel.get(),
+            host=urlsplit(url).hostname,
+            day=request_day(url),
+            method=method,
+            status=exchange.status,
+            seconds=max(0.0, time.perf_counter() - started - exchange.wait),
+            wait=exchange.wait,
+            bytes=exchange.bytes,
+            retries=exchange.retries,
+            cache=exchange.cache,
+        )
+    )
+
+
+def _retries(response) -> int:
+    """Return how many attempts urllib3 retried before ``response``."""
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    return len(getattr(retries, "history", None) or ())
+
+
+class EPGAdapter(HTTPAdapter):
+    """Transport adapter applying the project's per-request policies.
+
+    Requests with a fresh entry in the response cache are answered from it
+    directly. Otherwise the adapter waits for the rate limiter of the
+    request's host before handing the request to urllib3, and stores a
+    successful response in the cache. An expired entry with validators turns
+    the request into a conditional one; a ``304`` answer is replaced by the
+    stored response. Retries performed by urllib3 within one ``send`` are
+    covered by its own backoff rather than the limiter.
+
+    With a recording cassette, every response received from urllib3 is
+    recorded with the time it took, retries included. A replaying cassette
+    answers in place of urllib3, after the recorded latency unless it is
+    zeroed.
+
+    With telemetry, every request is recorded once it is answered or has
+    failed. The body of a non-streamed response is read within ``send`` so
+    that its download counts towards the request's latency.
+
+    Args:
+        rate_limiter: Optional limiter shared by every request on the adapter.
+        cache: Optional persistent response cache.
+        cassette: Optional cassette recording or replaying the traffic.
+        telemetry: Optional collector of per-request measurements.
+        **kwargs: Passed through to :class:`requests.adapters.HTTPAdapter`.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        cassette: Optional[Cassette] = None,
+        telemetry: Optional[Telemetry] = None,
+        **kwargs,
+    ) -> None:
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.cassette = cassette
+        self.telemetry = telemetry
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        provider = request_provider.get()
+        exchange = _Exchange()
+        if self.telemetry is None:
+            return self._send(request, provider, exchange, **kwargs)
+        started = time.perf_counter()
+        try:
+            response = self._send(request, provider, exchange, **kwargs)
+            exchange.status = response.status_code
+            if not kwargs.get("stream"):
+                exchange.bytes = len(response.content)
+            return response
+        finally:
+            _observe(self.telemetry, request.method, request.url, provider, exchange, started)
+
+    def _send(self, request, provider: Optional[str], exchange: _Exchange, **kwargs):
+        stale = None
+        if self.cache is not None:
+            cached = self.cache.get(request.method, request.url, provider)
+            if cached is not None:
+                exchange.cache = CACHE_HIT
+                return _cached_response(request, cached)
+            exchange.cache = CACHE_MISS
+            stale = self.cache.lookup(request.method, request.url)
+            validators = stale.validators() if stale is not None else {}
+            if validators:
+                request = request.copy()
+                request.headers.update(validators)
+            else:
+                stale = None
+        if self.rate_limiter is not None:
+            exchange.wait = self.rate_limiter.acquire(urlsplit(request.url).hostname)
+        response = self._transfer(request, **kwargs)
+        exchange.retries = _retries(response)
+        if self.cache is None:
+            return response
+        if stale is not None and response.status_code == 304:
+            exchange.cache = CACHE_REVALIDATED
+            renewed = self.cache.revalidated(
+                request.method, request.url, stale, dict(response.headers), provider
+            )
+            response.close()
+            return _cached_response(request, renewed, revalidated=True)
+        if not kwargs.get("stream"):
+            self.cache.put(
+                request.method,
+                request.url,
+                response.status_code,
+                dict(response.headers),
+                response.content,
+                provider,
+            )
+        return response
+
+    def _transfer(self, request, **kwargs):
+        """Exchange ``request`` with the network or the cassette."""
+        cassette = self.cassette
+        if cassette is None:
+            return super().send(request, **kwargs)
+        if cassette.replaying:
+            interaction = cassette.play(request.method, request.url, request.body)
+            if interaction is None:
+                raise requests.ConnectionError(
+                    f"No recorded response to {request.method} {request.url}",
+                    request=request,
+                )
+            time.sleep(cassette.delay(interaction))
+            return _replayed_response(request, interaction)
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        if not kwargs.get("stream"):
+            cassette.record(
+                request.method,
+                request.url,
+                request.body,
+                response.status_code,
+                response.reason,
+                dict(response.headers),
+                response.content,
+                time.perf_counter() - started,
+            )
+        return response
+
 
-def make_session() -> requests.Session:
+def _stored_response(
+    request, status: int, headers: Dict[str, str], content: bytes, reason: str = "OK"
+) -> requests.Response:
+    """Build a :class:`requests.Response` from a stored, decoded body."""
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    # The body was stored decoded, so transfer encodings no longer apply.
+    response.headers.pop("Content-Encoding", None)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = content
+    response.url = request.url
+    response.reason = reason
+    response.request = request
+    return response
+
+
+def _cached_response(
+    request, cached: CachedResponse, revalidated: bool = False
+) -> requests.Response:
+    """Build a :class:`requests.Response` from a cache entry."""
+    response = _stored_response(request, cached.status, cached.headers, cached.content)
+    response.from_cache = True
+    response.revalidated = revalidated
+    return response
+
+
+def _replayed_response(request, interaction: Interaction) -> requests.Response:
+    """Build a :class:`requests.Response` from a recorded interaction."""
+    response = _stored_response(
+        request,
+        interaction.status,
+        interaction.headers,
+        interaction.content,
+        reason=interaction.reason,
+    )
+    response.replayed = True
+    return response
+
+
+def make_session(
+    pool_maxsize: int = 10,
+    rate_limiter: Optional[HostRateLimiter] = None,
+    cache: Optional[ResponseCache] = None,
+    cassette: Optional[Cassette] = None,
+    telemetry: Optional[Telemetry] = None,
+) -> requests.Session:
     """Create and return a configured ``requests.Session``.
 
     The returned session is configured with a retry strategy that will
     automatically retry idempotent requests on transient errors (HTTP 429 and
     5xx responses). A backoff factor controls the delay between retries.
 
+    Args:
+        pool_maxsize: Number of connections kept alive per host. This should
+            be at least the number of threads sharing the session.
+        rate_limiter: Optional per-host rate limiter applied to every request.
+        cache: Optional persistent cache consulted before every request.
+        cassette: Optional cassette recording or replaying the traffic.
+        telemetry: Optional collector of per-request measurements.
+
     Returns:
         A :class:`requests.Session` instance with retry behaviour.
     """
     session = requests.Session()
     retry = Retry(
-        total=3,
-        backoff_factor=0.3,
-        status_forcelist=[429, 500, 502, 503, 504],
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=list(RETRY_STATUSES),
         allowed_methods=["GET", "POST"],
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = EPGAdapter(
+        rate_limiter=rate_limiter,
+        cache=cache,
+        cassette=cassette,
+        telemetry=telemetry,
+        max_retries=retry,
+        pool_maxsize=pool_maxsize,
+    )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
+
+
+def fork_session(session: requests.Session) -> requests.Session:
+    """Return a session sharing ``session``'s transport but not its cookies.
+
+    The fork uses the same adapters, so connection pools, retries, rate
+    limiting, the response cache, the cassette and telemetry are shared,
+    while cookies set on it do not leak into ``session`` or other forks.
+    """
+    fork = requests.Session()
+    fork.headers.update(session.headers)
+    for prefix, adapter in session.adapters.items():
+        fork.mount(prefix, adapter)
+    return fork
+
+
+class AsyncSession:
+    """Asyncio counterpart of the session returned by :func:`make_session`.
+
+    The session must be used as an async context manager. ``aiohttp`` is
+    imported lazily so that sync-only builds do not require it.
+
+    Args:
+        limit: Maximum number of simultaneously open connections.
+        limit_per_host: Maximum number of open connections per host.
+        rate_limiter: Optional per-host rate limiter applied to every attempt.
+        cache: Optional persistent cache consulted before every request.
+        cassette: Optional cassette recording or replaying the traffic. Only
+            successful responses are recorded by this session.
+        telemetry: Optional collector of per-request measurements.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 32,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        cassette: Optional[Cassette] = None,
+        telemetry: Optional[Telemetry] = None,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.cassette = cassette
+        self.telemetry = telemetry
+        self._session = None
+
+    async def __aenter__(self) -> "AsyncSession":
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit, limit_per_host=self.limit_per_host
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Tuple[float, float] = (5, 30),
+    ) -> Any:
+        """GET ``url`` and return the decoded JSON body.
+
+        Transient failures (connection errors and HTTP 429/5xx) are retried
+        with exponential backoff, mirroring the sync session. Cached
+        responses are used and revalidated as by :class:`EPGAdapter`, and a
+        replaying cassette answers in place of the network.
+
+        Raises:
+            aiohttp.ClientError: If the request still fails after retrying.
+        """
+        import aiohttp
+
+        if self._session is None:
+            raise RuntimeError("AsyncSession must be used as an async context manager")
+        connect_timeout, read_timeout = timeout
+        client_timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        provider = request_provider.get()
+        exchange = _Exchange()
+        started = time.perf_counter()
+        try:
+            content = await self._get(full_url, provider, headers, client_timeout, exchange)
+            exchange.bytes = len(content)
+        finally:
+            if self.telemetry is not None:
+                _observe(self.telemetry, "GET", full_url, provider, exchange, started)
+        return json.loads(content)
+
+    async def _get(
+        self,
+        full_url: str,
+        provider: Optional[str],
+        headers: Optional[Dict[str, str]],
+        client_timeout: Any,
+        exchange: _Exchange,
+    ) -> bytes:
+        """Return the body of a GET request, filling in its measurements."""
+        import aiohttp
+
+        stale = None
+        if self.cache is not None:
+            cached = self.cache.get("GET", full_url, provider)
+            if cached is not None:
+                exchange.status = cached.status
+                exchange.cache = CACHE_HIT
+                return cached.content
+            exchange.cache = CACHE_MISS
+            stale = self.cache.lookup("GET", full_url)
+            validators = stale.validators() if stale is not None else {}
+            if validators:
+                headers = {**(headers or {}), **validators}
+            else:
+                stale = None
+        host = urlsplit(full_url).hostname
+        if self.cassette is not None and self.cassette.replaying:
+            if self.rate_limiter is not None:
+                exchange.wait = await self.rate_limiter.acquire_async(host)
+            return await self._replay(full_url, exchange)
+        recording = self.cassette is not None and self.cassette.recording
+        attempt = 0
+        while True:
+            exchange.retries = attempt
+            exchange.status = None
+            if self.rate_limiter is not None:
+                exchange.wait += await self.rate_limiter.acquire_async(host)
+            started = time.perf_counter()
+            try:
+                async with self._session.get(
+                    full_url, headers=headers, timeout=client_timeout
+                ) as resp:
+                    exchange.status = resp.status
+                    if resp.status in RETRY_STATUSES and attempt < RETRY_TOTAL:
+                        raise _RetryableStatus(resp.status)
+                    if stale is not None and resp.status == 304:
+                        renewed = self.cache.revalidated(
+                            "GET", full_url, stale, dict(resp.headers), provider
+                        )
+                        exchange.status = renewed.status
+                        exchange.cache = CACHE_REVALIDATED
+                        return renewed.content
+                    resp.raise_for_status()
+                    content = await resp.read()
+                    if recording:
+                        self.cassette.record(
+                            "GET",
+                            full_url,
+                            None,
+                            resp.status,
+                            resp.reason,
+                            dict(resp.headers),
+                            content,
+                            time.perf_counter() - started,
+                        )
+                    if self.cache is not None:
+                        self.cache.put(
+                            "GET", full_url, resp.status, dict(resp.headers), content, provider
+                        )
+                    return content
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError, _RetryableStatus):
+                if attempt >= RETRY_TOTAL:
+                    raise
+            attempt += 1
+            await asyncio.sleep(RETRY_BACKOFF_FACTOR * (2 ** (attempt - 1)))
+
+    async def _replay(self, url: str, exchange: _Exchange) -> bytes:
+        """Return the recorded body of a GET request to ``url``."""
+        import aiohttp
+        from multidict import CIMultiDict, CIMultiDictProxy
+        from yarl import URL
+
+        interaction = self.cassette.play("GET", url)
+        if interaction is None:
+            raise aiohttp.ClientConnectionError(f"No recorded response to GET {url}")
+        await asyncio.sleep(self.cassette.delay(interaction))
+        exchange.status = interaction.status
+        if interaction.status >= 400:
+            request_info = aiohttp.RequestInfo(
+                URL(url), "GET", CIMultiDictProxy(CIMultiDict()), URL(url)
+            )
+            raise aiohttp.ClientResponseError(
+                request_info, (), status=interaction.status, message=interaction.reason
+            )
+        return interaction.content
+
+
+class _RetryableStatus(Exception):
+    """Internal signal that a response status should be retried."""
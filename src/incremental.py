@@ -0,0 +1,195 @@
+"""
+Incremental rebuilds seeded from the previous XMLTV output.
+
+A routine refresh does not need to re-download the whole guide: most of the
+previous ``epg.xml`` is still valid. This module reads the programmes back
+from that file, works out which days have to be fetched again, and merges the
+freshly fetched programmes over the previous ones.
+
+The days fetched again are worked out per channel: the first
+``refresh_days`` (today and tomorrow by default, where late schedule changes
+happen) plus every day the channel's previous programmes do not reach, such
+as the day newly opened at the end of the horizon. A channel with a short
+guide therefore does not make every other channel fetch its missing days.
+Channels missing from the previous file are fetched in full.
+
+When merging, fresh data always wins: a previous programme is dropped when
+it overlaps a freshly fetched programme of the same channel. A day whose
+fetch failed therefore keeps its previous programmes instead of leaving a
+gap in the guide.
+"""
+
+import bisect
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from lxml import etree
+
+from .programme import Programme, ProgrammeLike, as_programmes
+
+# Days at the start of the horizon that are always fetched again.
+DEFAULT_REFRESH_DAYS = 2
+
+_DT_FORMAT = "%Y%m%d%H%M%S %z"
+_ONSCREEN = re.compile(r"^S(\d+)E(\d+)$")
+
+
+def _timestamp(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(datetime.strptime(value, _DT_FORMAT).timestamp())
+    except ValueError:
+        return None
+
+
+def load_programmes(path: Union[str, Path]) -> List[Programme]:
+    """Read the programmes of a previously written XMLTV file.
+
+    The returned programmes can be passed to :func:`src.xmltv.build_xmltv`
+    again.
+
+    Args:
+        path: Location of the XMLTV file.
+
+    Returns:
+        The programmes in file order. Missing or unreadable files yield an
+        empty list.
+    """
+    programmes: List[Programme] = []
+    try:
+        for _, element in etree.iterparse(str(path), tag="programme"):
+            start = _timestamp(element.get("start"))
+            stop = _timestamp(element.get("stop"))
+            if start is None or stop is None:
+                element.clear()
+                continue
+            programme = Programme(
+                channel=element.get("channel"),
+                start=start,
+                stop=stop,
+                title=element.findtext("title"),
+                description=element.findtext("desc"),
+                premiere=element.find("premiere") is not None,
+            )
+            icon = element.find("icon")
+            if icon is not None:
+                programme.icon = icon.get("src")
+            for episode_num in element.iterfind("episode-num"):
+                if episode_num.get("system") != "onscreen":
+                    continue
+                match = _ONSCREEN.match(episode_num.text or "")
+                if match:
+                    programme.season = int(match.group(1))
+                    programme.episode = int(match.group(2))
+            programmes.append(programme)
+            element.clear()
+    except (OSError, etree.XMLSyntaxError) as exc:
+        logging.warning("Could not read previous guide %s: %s", path, exc)
+        return []
+    return programmes
+
+
+def _today(now: Optional[datetime]) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def days_to_refresh(
+    channel_ids: Iterable[str],
+    previous: Sequence[ProgrammeLike],
+    days: int,
+    refresh_days: int = DEFAULT_REFRESH_DAYS,
+    now: Optional[datetime] = None,
+) -> Dict[str, List[int]]:
+    """Return the day offsets each channel must fetch again.
+
+    Args:
+        channel_ids: XMLTV ids of the channels seeded from ``previous``.
+        previous: Programmes loaded with :func:`load_programmes`.
+        days: Length of the guide horizon in days.
+        refresh_days: Number of days from today that are always fetched.
+        now: Current time, injectable for tests.
+
+    Returns:
+        Sorted offsets from today, in UTC days, of every channel in
+        ``channel_ids``. A channel without previous programmes refetches
+        every day.
+    """
+    horizon: Dict[str, int] = {channel_id: 0 for channel_id in channel_ids}
+    for programme in as_programmes(previous):
+        channel = programme.channel
+        if channel in horizon:
+            horizon[channel] = max(horizon[channel], programme.stop)
+    base = _today(now)
+    day_ends = [int((base + timedelta(days=day + 1)).timestamp()) for day in range(days)]
+    return {
+        channel_id: [
+            day
+            for day, day_end in enumerate(day_ends)
+            if day < refresh_days or day_end > covered_until
+        ]
+        for channel_id, covered_until in horizon.items()
+    }
+
+
+def _merged_intervals(programmes: List[Programme]) -> Tuple[List[int], List[int]]:
+    """Return the union of the programmes' time spans as start/stop lists."""
+    starts: List[int] = []
+    stops: List[int] = []
+    for start, stop in sorted((p.start, p.stop) for p in programmes):
+        if stops and start <= stops[-1]:
+            stops[-1] = max(stops[-1], stop)
+        else:
+            starts.append(start)
+            stops.append(stop)
+    return starts, stops
+
+
+def merge_programmes(
+    previous: Sequence[ProgrammeLike],
+    fresh: Sequence[ProgrammeLike],
+    channel_ids: Iterable[str],
+    now: Optional[datetime] = None,
+) -> List[Programme]:
+    """Merge freshly fetched programmes over the previous ones.
+
+    Previous programmes are dropped when their channel is no longer
+    configured, when they ended before today, or when they overlap a fresh
+    programme of the same channel.
+
+    Args:
+        previous: Programmes loaded with :func:`load_programmes`.
+        fresh: Programmes fetched by the providers during this run.
+        channel_ids: XMLTV ids of the configured channels.
+        now: Current time, injectable for tests.
+
+    Returns:
+        The kept previous programmes followed by the fresh ones, ready for
+        :func:`src.dedupe.dedupe_programmes`.
+    """
+    configured = set(channel_ids)
+    today = int(_today(now).timestamp())
+    fresh = as_programmes(fresh)
+    by_channel: Dict[Any, List[Programme]] = {}
+    for programme in fresh:
+        by_channel.setdefault(programme.channel, []).append(programme)
+    intervals = {channel: _merged_intervals(progs) for channel, progs in by_channel.items()}
+
+    kept: List[Programme] = []
+    for programme in as_programmes(previous):
+        channel = programme.channel
+        if channel not in configured or programme.stop <= today:
+            continue
+        if channel in intervals:
+            starts, stops = intervals[channel]
+            # The last fresh span starting before this programme ends is the
+            # only one that can overlap it, since the spans are disjoint.
+            i = bisect.bisect_left(starts, programme.stop) - 1
+            if i >= 0 and stops[i] > programme.start:
+                continue
+        kept.append(programme)
+    return kept + fresh
@@ -0,0 +1,81 @@
+"""
+The programme record passed from providers to the XMLTV writer.
+
+A guide holds tens of thousands of programmes, and every one of them is
+sorted, deduplicated and serialised. :class:`Programme` is a slotted
+dataclass: an instance is a fraction of the size of the equivalent ``dict``
+and its fields are read as plain attributes rather than hashed lookups.
+
+Providers return lists of :class:`Programme`. Third-party providers written
+against the older interface may still return dictionaries with the same
+keys; :func:`as_programmes` converts them where programme lists enter the
+pipeline. For code that still reads programmes like dictionaries,
+``programme["title"]`` and ``programme.get("title")`` keep working.
+"""
+
+from dataclasses import dataclass, fields
+from typing import Any, Iterable, List, Mapping, Optional, Union
+
+
+@dataclass(slots=True)
+class Programme:
+    """One broadcast of a programme on a channel.
+
+    Attributes:
+        channel: XMLTV id of the channel.
+        start: Start time as a UNIX timestamp.
+        stop: End time as a UNIX timestamp.
+        title: Programme title.
+        description: Optional synopsis.
+        icon: Optional image URL.
+        season: Optional season number.
+        episode: Optional episode number within the season.
+        premiere: Whether this broadcast is a premiere.
+    """
+
+    channel: Optional[str]
+    start: float
+    stop: float
+    title: Optional[str] = None
+    description: Optional[str] = None
+    icon: Optional[str] = None
+    season: Optional[Any] = None
+    episode: Optional[Any] = None
+    premiere: bool = False
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Programme":
+        """Build a programme from a provider's dictionary, ignoring unknown keys."""
+        return cls(
+            channel=data.get("channel"),
+            start=data.get("start"),
+            stop=data.get("stop"),
+            title=data.get("title"),
+            description=data.get("description"),
+            icon=data.get("icon"),
+            season=data.get("season"),
+            episode=data.get("episode"),
+            premiere=bool(data.get("premiere")),
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a field like :meth:`dict.get`, for dict-style readers."""
+        if key not in _FIELDS:
+            return default
+        return getattr(self, key)
+
+
+_FIELDS = frozenset(field.name for field in fields(Programme))
+
+# A programme, or a dictionary with the same keys from an older provider.
+ProgrammeLike = Union[Programme, Mapping[str, Any]]
+
+
+def as_programmes(items: Iterable[ProgrammeLike]) -> List[Programme]:
+    """Return ``items`` as a list of programmes, converting any dictionaries."""
+    return [item if type(item) is Programme else Programme.from_dict(item) for item in items]
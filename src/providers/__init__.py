@@ -2,15 +2,138 @@
 Provider package initialisation.
 
 This package contains provider-specific modules responsible for fetching
-programme data from various sources (Sky, Freeview, Freesat, RadioTimes).
-Individual provider modules are imported here for convenience.
+programme data from various sources (Sky, Freeview, Freesat, RadioTimes,
+YouView).
+
+Provider modules are not imported here. :data:`PROVIDERS` maps channel
+``src`` codes to provider modules and imports each one on first use, so a
+build only imports the providers its channel list refers to. Third-party
+packages can add sources without touching this project by declaring an
+entry point in the :data:`ENTRY_POINT_GROUP` group, named after the ``src``
+code and pointing at the provider module::
+
+    [project.entry-points."freeview_epg.providers"]
+    mysrc = "my_package.my_provider"
+
+Entry points are only looked up for codes that are not built in, and cannot
+replace a built-in provider.
 """
 
-# Re-export provider modules for convenient access
-from . import sky  # noqa: F401
-from . import freeview  # noqa: F401
-from . import freesat  # noqa: F401
-from . import radiotimes  # noqa: F401
-from . import youview  # noqa: F401
+import importlib
+import logging
+from importlib.metadata import EntryPoint, entry_points
+from types import ModuleType
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Union
+
+# Entry point group in which third-party providers register.
+ENTRY_POINT_GROUP = "freeview_epg.providers"
+
+# Map of built-in ``src`` codes to provider module names.
+BUILTIN_PROVIDERS: Dict[str, str] = {
+    "sky": f"{__name__}.sky",
+    "freeview": f"{__name__}.freeview",
+    "freesat": f"{__name__}.freesat",
+    "rt": f"{__name__}.radiotimes",
+    "yv": f"{__name__}.youview",
+}
 
 __all__ = ["sky", "freeview", "freesat", "radiotimes", "youview"]
+
+
+class ProviderRegistry(Mapping[str, ModuleType]):
+    """Mapping of ``src`` codes to lazily imported provider modules.
+
+    Args:
+        targets: Initial mapping of ``src`` codes to module names or modules.
+        group: Entry point group searched for codes missing from
+            ``targets``, or ``None`` to disable entry points.
+    """
+
+    def __init__(
+        self,
+        targets: Optional[Mapping[str, Union[str, ModuleType]]] = None,
+        group: Optional[str] = ENTRY_POINT_GROUP,
+    ) -> None:
+        self._targets: Dict[str, Union[str, ModuleType, EntryPoint]] = dict(targets or {})
+        self._modules: Dict[str, ModuleType] = {}
+        self._group = group
+        self._discovered = group is None
+
+    def register(self, src: str, target: Union[str, ModuleType]) -> None:
+        """Register a provider module, or the name to import it from, as ``src``."""
+        self._targets[src] = target
+        self._modules.pop(src, None)
+
+    def _discover(self) -> None:
+        """Add the providers registered through entry points, once."""
+        if self._discovered:
+            return
+        self._discovered = True
+        for entry_point in entry_points(group=self._group):
+            if entry_point.name in self._targets:
+                logging.warning(
+                    "Ignoring provider entry point %s; '%s' is already registered.",
+                    entry_point.value,
+                    entry_point.name,
+                )
+                continue
+            self._targets[entry_point.name] = entry_point
+
+    def __getitem__(self, src: str) -> ModuleType:
+        module = self._modules.get(src)
+        if module is not None:
+            return module
+        if src not in self._targets:
+            self._discover()
+        target = self._targets[src]
+        if isinstance(target, str):
+            module = importlib.import_module(target)
+        elif isinstance(target, EntryPoint):
+            module = target.load()
+        else:
+            module = target
+        self._modules[src] = module
+        return module
+
+    def __contains__(self, src: object) -> bool:
+        if src not in self._targets:
+            self._discover()
+        return src in self._targets
+
+    def __iter__(self) -> Iterator[str]:
+        self._discover()
+        return iter(list(self._targets))
+
+    def __len__(self) -> int:
+        self._discover()
+        return len(self._targets)
+
+    def load(self, sources: Iterable[Optional[str]]) -> Dict[str, ModuleType]:
+        """Import the providers of ``sources``.
+
+        Unknown sources are left out, for the orchestrators to warn about per
+        channel. Providers that fail to import are logged and left out too.
+
+        Returns:
+            The imported provider modules keyed by ``src`` code.
+        """
+        modules: Dict[str, ModuleType] = {}
+        for src in dict.fromkeys(sources):
+            if src not in self:
+                continue
+            try:
+                modules[src] = self[src]
+            except Exception as exc:
+                logging.error("Error importing provider '%s': %s", src, exc)
+        return modules
+
+
+# Registry of the built-in providers and those registered through entry points.
+PROVIDERS = ProviderRegistry(BUILTIN_PROVIDERS)
+
+
+def __getattr__(name: str) -> ModuleType:
+    # Keep ``src.providers.sky`` and friends working as attributes.
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,14 +4,38 @@ Base definitions for provider modules.
 The :class:`Context` class encapsulates shared state used by all provider
 implementations, including a pre-configured HTTP session, a timezone
 definition, and arbitrary caches for expensive lookups.
+
+Every provider module exposes a synchronous
+``fetch_programmes(channel, ctx) -> list[Programme]`` function, returning
+:class:`src.programme.Programme` records. Providers may additionally
+implement ``async def fetch_programmes_async(channel, ctx)`` returning the
+same list; the asyncio orchestrator prefers it when present and falls back to
+running the sync function in a worker thread otherwise.
+
+Providers that can request several channels at once may implement
+``prefetch(channels, ctx)`` (and ``async def prefetch_async(channels, ctx)``).
+The orchestrators call it with all of the provider's channels before any of
+them is fetched; it should store what it fetched in ``ctx.caches`` for the
+per-channel fetches to pick up.
+
+Providers enriching schedule items with per-programme detail requests should
+declare a detail resolver (``fetch_schedule``, ``resolve_details`` and
+``assemble_programmes``, see :mod:`src.details`) so that the orchestrators
+can deduplicate those requests across channels and run them in parallel.
+
+Providers request one schedule window per day. They iterate over
+:meth:`Context.fetch_days` rather than ``range(ctx.days)`` so that an
+incremental build can restrict them to the days that need refreshing.
 """
 
 from dataclasses import dataclass, field
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Sequence
 
 import pytz
 import requests
 
+from ..enrichment import MISSING
+
 
 @dataclass
 class Context:
@@ -24,6 +48,14 @@ class Context:
             cache should itself be a mutable object (e.g. a dict) so that
             providers can store and retrieve intermediate results across
             multiple calls.
+        async_session: An optional :class:`src.http.AsyncSession`, set only
+            while the asyncio orchestrator is running. Providers implementing
+            ``fetch_programmes_async`` use it instead of ``session``.
+        day_offsets: Optional subset of the days to fetch, as offsets from
+            today (0 is today). ``None`` fetches every day of the horizon.
+        enrichment: An optional :class:`src.enrichment.EnrichmentStore`
+            persisting detail lookups between runs. Providers use it through
+            :meth:`recall` and :meth:`remember`.
     """
     session: requests.Session
     tz: pytz.BaseTzInfo
@@ -31,3 +63,28 @@ class Context:
     # 7-day guide without needing parameters.
     days: int = 7
     caches: Dict[str, Any] = field(default_factory=dict)
+    async_session: Optional[Any] = None
+    day_offsets: Optional[Sequence[int]] = None
+    enrichment: Optional[Any] = None
+
+    def fetch_days(self) -> List[int]:
+        """Return the offsets from today of the days providers should fetch."""
+        if self.day_offsets is None:
+            return list(range(self.days))
+        return sorted({day for day in self.day_offsets if 0 <= day < self.days})
+
+    def recall(self, provider: str, key: Any) -> Any:
+        """Return a detail lookup persisted by an earlier run.
+
+        Returns:
+            The stored value, ``None`` if the lookup is known to find
+            nothing, or :data:`src.enrichment.MISSING` if it must be made.
+        """
+        if self.enrichment is None:
+            return MISSING
+        return self.enrichment.get(provider, key)
+
+    def remember(self, provider: str, key: Any, value: Any) -> None:
+        """Persist the result of a detail lookup; ``None`` if it found nothing."""
+        if self.enrichment is not None:
+            self.enrichment.put(provider, key, value)
@@ -5,87 +5,157 @@ Fetches programme data from the Freesat TV Guide API. The API is called
 separately for today and the next seven days. No additional detail API is
 available, so descriptions and images are taken directly from the listing
 data.
+
+The guide's region is selected through cookies set by a handshake (a region
+POST and a channel-info GET). The handshake is made once per postcode, on a
+session of its own forked from ``ctx.session``, and that session is reused by
+every channel of the region. The ``prefetch`` hook performs the handshakes of
+all configured postcodes up front; the day requests of a channel are then
+issued concurrently.
 """
 
-from typing import List, Dict, Any
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import requests
 
+from ..http import fork_session
+from ..programme import Programme
 from ..utils.parsing import parse_duration_value, parse_timestamp
 from .base import Context
 
 
-def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, Any]]:
-    """Fetch programme data for a Freesat channel.
+REGION_URL = "https://www.freesat.co.uk/tv-guide/api/region"
+CHANNEL_INFO_URL = "https://www.freesat.co.uk/tv-guide/api"
+GUIDE_URL = "https://www.freesat.co.uk/tv-guide/api/{day}"
 
-    Args:
-        channel: The channel definition from ``channels.json``.
-        ctx: Shared context carrying a ``requests.Session`` and caches.
+# Number of day requests of one channel kept in flight.
+DAY_WORKERS = 4
 
-    Returns:
-        A list of programme dictionaries for the channel.
-    """
-    programmes: List[Dict[str, Any]] = []
-    session = ctx.session
-
-    # Prepare headers to mimic a regular browser request. Freesat API
-    # occasionally requires these headers to return data.
-    headers = {
-        "authority": "www.freesat.co.uk",
-        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-        "accept-language": "en-GB,en-US;q=0.9,en;q=0.8",
-        "cache-control": "no-cache",
-        "pragma": "no-cache",
-        "sec-ch-ua": '"Not_A Brand";v="8", "Chromium";v="120", "Opera GX";v="106"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "sec-fetch-dest": "document",
-        "sec-fetch-mode": "navigate",
-        "sec-fetch-site": "none",
-        "sec-fetch-user": "?1",
-        "upgrade-insecure-requests": "1",
-        "user-agent": "Mozilla/5.0",
-    }
+# Prepare headers to mimic a regular browser request. Freesat API
+# occasionally requires these headers to return data.
+HEADERS = {
+    "authority": "www.freesat.co.uk",
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "accept-language": "en-GB,en-US;q=0.9,en;q=0.8",
+    "cache-control": "no-cache",
+    "pragma": "no-cache",
+    "sec-ch-ua": '"Not_A Brand";v="8", "Chromium";v="120", "Opera GX";v="106"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+    "sec-fetch-dest": "document",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-site": "none",
+    "sec-fetch-user": "?1",
+    "upgrade-insecure-requests": "1",
+    "user-agent": "Mozilla/5.0",
+}
+
+# Guards the creation of the per-postcode locks in ``ctx.caches``.
+_regions_lock = threading.Lock()
 
-    channel_id = channel.get("provider_id")
-    xmltv_id = channel.get("xmltv_id")
-    postcode = channel.get("postcode")
 
-    # Set the region based on postcode. Failures here are non-fatal.
+def _handshake(session: requests.Session, postcode: str) -> None:
+    """Select the region of ``postcode`` on ``session``. Failures are non-fatal."""
     try:
-        session.post(
-            "https://www.freesat.co.uk/tv-guide/api/region",
-            headers=headers,
-            data=f"{postcode}",
-            timeout=(5, 30),
-        )
+        session.post(REGION_URL, headers=HEADERS, data=f"{postcode}", timeout=(5, 30))
     except Exception:
         pass
 
     # Fetch channel info (not strictly used but mirrors the original logic)
     try:
-        channel_info_url = f"https://www.freesat.co.uk/tv-guide/api?post_code={postcode.replace(' ', '%')}"
-        session.get(channel_info_url, headers=headers, timeout=(5, 30))
+        channel_info_url = f"{CHANNEL_INFO_URL}?post_code={postcode.replace(' ', '%')}"
+        session.get(channel_info_url, headers=HEADERS, timeout=(5, 30))
     except Exception:
         pass
 
-    params = {"channel": [channel_id]}
-    epg_data = []
+
+def _region_session(postcode: str, ctx: Context) -> requests.Session:
+    """Return the session of a postcode's region, making the handshake if needed.
+
+    Concurrent callers for the same postcode wait for a single handshake.
+    """
+    with _regions_lock:
+        locks: Dict[str, threading.Lock] = ctx.caches.setdefault("freesat_region_locks", {})
+        lock = locks.setdefault(postcode, threading.Lock())
+    sessions: Dict[str, requests.Session] = ctx.caches.setdefault("freesat_sessions", {})
+    with lock:
+        session = sessions.get(postcode)
+        if session is None:
+            session = fork_session(ctx.session)
+            _handshake(session, postcode)
+            sessions[postcode] = session
+    return session
+
+
+def prefetch(channels: List[Dict[str, Any]], ctx: Context) -> None:
+    """Make the region handshake of every Freesat postcode once.
+
+    Args:
+        channels: The Freesat channel definitions about to be fetched.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+    """
+    postcodes = list(dict.fromkeys(channel.get("postcode") for channel in channels))
+    with ThreadPoolExecutor(max_workers=DAY_WORKERS) as pool:
+        # Copy the caller's context so requests stay attributed to Freesat.
+        futures = [
+            pool.submit(contextvars.copy_context().run, _region_session, postcode, ctx)
+            for postcode in postcodes
+        ]
+        for future in futures:
+            future.result()
+
+
+def _fetch_day(
+    session: requests.Session, channel_id: Any, day: int
+) -> Optional[List[Dict[str, Any]]]:
+    """Return the events of one channel and day, or ``None`` on any error."""
+    try:
+        resp = session.get(
+            GUIDE_URL.format(day=day),
+            params={"channel": [channel_id]},
+            headers=HEADERS,
+            timeout=(5, 30),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception:
+        return None
+    if data and isinstance(data, list) and len(data) > 0:
+        return data[0].get("event", [])
+    return None
+
+
+def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Programme]:
+    """Fetch programme data for a Freesat channel.
+
+    Args:
+        channel: The channel definition from ``channels.json``.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+
+    Returns:
+        A list of programmes for the channel.
+    """
+    programmes: List[Programme] = []
+    channel_id = channel.get("provider_id")
+    xmltv_id = channel.get("xmltv_id")
+    session = _region_session(channel.get("postcode"), ctx)
+
     # The API exposes endpoints for successive days starting at 0.
     # Freesat's public guide is generally 7 days, so we default to ctx.days.
-    for i in range(ctx.days):
-        try:
-            resp = session.get(
-                f"https://www.freesat.co.uk/tv-guide/api/{i}",
-                params=params,
-                headers=headers,
-                timeout=(5, 30),
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            if data and isinstance(data, list) and len(data) > 0:
-                events = data[0].get("event", [])
-                epg_data.extend(events)
-        except Exception:
-            continue
+    days = ctx.fetch_days()
+    with ThreadPoolExecutor(max_workers=max(1, min(DAY_WORKERS, len(days)))) as pool:
+        # Copy the caller's context so requests stay attributed to Freesat.
+        futures = [
+            pool.submit(contextvars.copy_context().run, _fetch_day, session, channel_id, day)
+            for day in days
+        ]
+        epg_data = []
+        for future in futures:
+            epg_data.extend(future.result() or [])
+
     for item in epg_data:
         title = item.get("name")
         desc = item.get("description")
@@ -105,13 +175,13 @@ def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, An
                 f"https://fdp-sv15-image-v1-0.gcprod1.freetime-platform.net/270x180-0{item['image']}"
             )
         programmes.append(
-            {
-                "title": title,
-                "description": desc,
-                "start": start,
-                "stop": end,
-                "icon": icon,
-                "channel": xmltv_id,
-            }
+            Programme(
+                title=title,
+                description=desc,
+                start=start,
+                stop=end,
+                icon=icon,
+                channel=xmltv_id,
+            )
         )
     return programmes
@@ -5,127 +5,290 @@ Fetches programme data from the Freeview Play API. Programme data is
 retrieved for midnight UTC today and the next seven days. Additional
 programme details are fetched via a secondary API endpoint, and results
 are cached to avoid redundant requests. The provider returns a list of
-programme dictionaries ready for XMLTV serialisation.
+programmes ready for XMLTV serialisation.
+
+A tv-guide payload covers every service of a region, so it is requested once
+per region and day and indexed by service ID straight away. Only the events
+of configured services are kept in the index; if a later fetch of the same
+run configures more services of the region, for example a fallback tier or
+a timeshift refetch, the index is rebuilt for them.
+
+The ``prefetch`` hook loads the tv-guide payloads of every region and day on
+a bounded thread pool before any channel is fetched, so channels sharing a
+region do not race for the same payload.
+
+Programme details are looked up through a detail resolver (see
+:mod:`src.details`): ``fetch_schedule`` lists the ``program_id`` of every
+event, and the orchestrators look up each unique programme once across all
+Freeview channels, in parallel. A national programme listed in many regions
+is therefore only looked up once.
 """
 
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, FrozenSet, Tuple, Optional, Set
 
+from ..details import Schedule
+from ..enrichment import MISSING, is_permanent_failure
+from ..programme import Programme
 from ..utils.parsing import parse_duration_value, parse_timestamp
 from .base import Context
 
 
-def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, Any]]:
-    """Fetch programme data for a Freeview channel.
+GUIDE_URL = "https://www.freeview.co.uk/api/tv-guide"
+PROGRAM_URL = "https://www.freeview.co.uk/api/program"
+
+# Number of requests ``prefetch`` keeps in flight.
+PREFETCH_WORKERS = 8
+
+_missing = object()
+
+
+def _epochs(ctx: Context) -> List[int]:
+    """Return midnight UTC of each requested day from today."""
+    base = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return [int((base + timedelta(days=i)).timestamp()) for i in ctx.fetch_days()]
+
+
+def _index_services(
+    payload: Any, wanted: Optional[Set[Any]]
+) -> Dict[Any, List[Dict[str, Any]]]:
+    """Index the events of a tv-guide payload by service ID.
 
     Args:
-        channel: The channel definition from ``channels.json``.
-        ctx: Shared context carrying a ``requests.Session`` and caches.
+        payload: The decoded tv-guide response of one region and day.
+        wanted: Service IDs to keep, or ``None`` to keep every service.
+    """
+    index: Dict[Any, List[Dict[str, Any]]] = {}
+    for service in payload.get("data", {}).get("programs", []):
+        service_id = service.get("service_id")
+        if wanted is not None and service_id not in wanted:
+            continue
+        index.setdefault(service_id, []).extend(service.get("events", []))
+    return index
+
+
+def _region_events(
+    region_id: Any, epoch: int, ctx: Context
+) -> Optional[Dict[Any, List[Dict[str, Any]]]]:
+    """Return the indexed events of a region and day, fetching them if needed.
 
     Returns:
-        A list of programme dictionaries for the channel.
+        The index, or ``None`` if the payload could not be fetched. Failures
+        are not cached so that a later channel can try again.
     """
-    programmes: List[Dict[str, Any]] = []
-    region_id = channel.get("region_id")
-    provider_id = channel.get("provider_id")
-    xmltv_id = channel.get("xmltv_id")
+    # Region payloads are reduced to an index of the configured services'
+    # events before they are cached on the context, along with the services
+    # each index was built for (``None`` for every service).
+    data_cache: Dict[Tuple[Any, int], Dict[Any, List[Dict[str, Any]]]] = ctx.caches.setdefault(
+        "freeview_events", {}
+    )
+    indexed: Dict[Tuple[Any, int], Optional[FrozenSet[Any]]] = ctx.caches.setdefault(
+        "freeview_indexed", {}
+    )
+    data_key = (region_id, epoch)
+    wanted = ctx.caches.get("freeview_services", {}).get(region_id)
+    wanted = frozenset(wanted) if wanted is not None else None
+    if data_key in data_cache:
+        built = indexed.get(data_key)
+        if built is None or wanted is None or wanted <= built:
+            return data_cache[data_key]
+    try:
+        resp = ctx.session.get(
+            GUIDE_URL,
+            params={"nid": f"{region_id}", "start": f"{epoch}"},
+            timeout=(5, 30),
+        )
+        resp.raise_for_status()
+        index = _index_services(resp.json(), wanted)
+    except Exception:
+        return None
+    data_cache[data_key] = index
+    indexed[data_key] = wanted
+    return index
 
-    # Compute midnight UTC for today and the next (ctx.days-1) days
-    base = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    epoch_times = [int((base + timedelta(days=i)).timestamp()) for i in range(ctx.days)]
 
-    # Use caches on the context to avoid redundant requests
-    data_cache: Dict[Tuple[Any, int], Any] = ctx.caches.setdefault("freeview_data", {})
+def _program_details(
+    region_id: Any, service_id: Any, listing: Dict[str, Any], ctx: Context
+) -> Optional[Dict[str, Any]]:
+    """Return the details of a listing's programme, fetching them if needed.
+
+    Details are cached by ``program_id`` only, so the same programme listed
+    in several regions or on several services is fetched once. Failed
+    lookups are cached as ``None``. Results are also persisted between runs
+    through ``ctx.remember``.
+    """
     # Note: we must distinguish "missing" from "cached None" (when details fetch fails).
-    details_cache: Dict[Tuple[Any, int, Any, str, str], Optional[Dict]] = ctx.caches.setdefault(
+    details_cache: Dict[Any, Optional[Dict[str, Any]]] = ctx.caches.setdefault(
         "freeview_details", {}
     )
+    program_id = listing.get("program_id")
+    if program_id is None:
+        return None
+    info = details_cache.get(program_id, _missing)
+    if info is _missing:
+        info = ctx.recall("freeview", program_id)
+        if info is not MISSING:
+            details_cache[program_id] = info
+            return info
+        try:
+            # The query is URL-encoded: a raw "+" in start_time would reach
+            # the server as a space.
+            info_resp = ctx.session.get(
+                PROGRAM_URL,
+                params={
+                    "sid": f"{service_id}",
+                    "nid": f"{region_id}",
+                    "pid": f"{program_id}",
+                    "start_time": listing.get("start_time"),
+                    "duration": listing.get("duration"),
+                },
+                timeout=(5, 30),
+            )
+            info_resp.raise_for_status()
+            res = info_resp.json()
+            programmes_list = res.get("data", {}).get("programs", [])
+            info = programmes_list[0] if programmes_list else None
+            ctx.remember("freeview", program_id, info)
+        except Exception as exc:
+            info = None
+            if is_permanent_failure(exc):
+                ctx.remember("freeview", program_id, None)
+        details_cache[program_id] = info
+    return info
+
+
+def prefetch(channels: List[Dict[str, Any]], ctx: Context) -> None:
+    """Load the guides of all Freeview channels' regions.
+
+    Args:
+        channels: The Freeview channel definitions about to be fetched.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+    """
+    services: Dict[Any, Set[Any]] = ctx.caches.setdefault("freeview_services", {})
+    for channel in channels:
+        services.setdefault(channel.get("region_id"), set()).add(channel.get("provider_id"))
+
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as pool:
+        # Copy the caller's context so requests stay attributed to Freeview.
+        futures = [
+            pool.submit(contextvars.copy_context().run, _region_events, region_id, epoch, ctx)
+            for region_id in services
+            for epoch in _epochs(ctx)
+        ]
+        for future in futures:
+            future.result()
+
+
+def fetch_schedule(channel: Dict[str, Any], ctx: Context) -> Schedule:
+    """Collect the events of a Freeview channel from its region's guides.
 
-    _missing = object()
+    Returns:
+        ``(listing, start, stop)`` tuples of the channel's events, with one
+        detail lookup per programme. The first listing of each programme
+        supplies the lookup parameters.
+    """
+    items: List[Tuple[Dict[str, Any], int, int]] = []
+    lookups: Dict[Any, Tuple[Any, Any, Dict[str, Any]]] = {}
+    region_id = channel.get("region_id")
+    provider_id = channel.get("provider_id")
+    # A region indexed for some services only must include this one too.
+    services = ctx.caches.get("freeview_services", {}).get(region_id)
+    if services is not None:
+        services.add(provider_id)
 
-    for epoch in epoch_times:
-        data_key = (region_id, epoch)
-        if data_key not in data_cache:
-            url = "https://www.freeview.co.uk/api/tv-guide"
+    for epoch in _epochs(ctx):
+        index = _region_events(region_id, epoch, ctx)
+        if index is None:
+            # Skip this epoch on any error
+            continue
+        for listing in index.get(provider_id, []):
+            start_time_str = listing.get("start_time")
+            duration_str = listing.get("duration")
+            if not start_time_str or not duration_str:
+                continue
             try:
-                resp = ctx.session.get(
-                    url,
-                    params={"nid": f"{region_id}", "start": f"{epoch}"},
-                    timeout=(5, 30),
-                )
-                resp.raise_for_status()
-                data_cache[data_key] = resp.json()
+                start_ts = parse_timestamp(start_time_str)
+                duration_seconds = parse_duration_value(duration_str)
             except Exception:
-                # Skip this epoch on any error
                 continue
-        epg_data = data_cache[data_key].get("data", {}).get("programs", [])
-        for service in epg_data:
-            if service.get("service_id") != provider_id:
-                continue
-            for listing in service.get("events", []):
-                ch_name = xmltv_id
-                title = listing.get("main_title")
-                desc = listing.get("secondary_title") or "No further information..."
-                start_time_str = listing.get("start_time")
-                duration_str = listing.get("duration")
-                if not start_time_str or not duration_str:
-                    continue
-                try:
-                    start_ts = parse_timestamp(start_time_str)
-                    duration_seconds = parse_duration_value(duration_str)
-                except Exception:
-                    continue
-                end_ts = start_ts + duration_seconds
-                # Build a cache key for the detail request
-                service_id = service.get("service_id")
-                program_id = listing.get("program_id")
-                details_key = (
-                    region_id,
-                    service_id,
-                    program_id,
-                    start_time_str,
-                    duration_str,
-                )
-                info = details_cache.get(details_key, _missing)
-                if info is _missing:
-                    data_url = (
-                        f"https://www.freeview.co.uk/api/program?sid={service_id}&nid={region_id}"
-                        f"&pid={program_id}&start_time={start_time_str}&duration={duration_str}"
-                    )
-                    try:
-                        info_resp = ctx.session.get(data_url, timeout=(5, 30))
-                        info_resp.raise_for_status()
-                        res = info_resp.json()
-                        programmes_list = res.get("data", {}).get("programs", [])
-                        info = programmes_list[0] if programmes_list else None
-                    except Exception:
-                        info = None
-                    details_cache[details_key] = info
-                # Determine description and icon based on detail
-                icon = None
-                if info:
-                    synopsis = info.get("synopsis")
-                    if isinstance(synopsis, dict) and synopsis:
-                        medium_synopsis = synopsis.get("medium")
-                        if medium_synopsis:
-                            desc = medium_synopsis
-                    if info.get("image_url"):
-                        icon = f"{info['image_url']}?w=800"
-                    elif listing.get("fallback_image_url"):
-                        icon = f"{listing['fallback_image_url']}?w=800"
-                else:
-                    # When no detail is available, keep the basic listing description and
-                    # use a fallback image if available.
-                    if listing.get("fallback_image_url"):
-                        icon = f"{listing['fallback_image_url']}?w=800"
-                programmes.append(
-                    {
-                        "title": title,
-                        "description": desc,
-                        "start": start_ts,
-                        "stop": end_ts,
-                        "icon": icon,
-                        "channel": ch_name,
-                    }
-                )
+            items.append((listing, start_ts, start_ts + duration_seconds))
+            program_id = listing.get("program_id")
+            if program_id is not None:
+                lookups.setdefault(program_id, (region_id, provider_id, listing))
+    return Schedule(items, lookups)
+
+
+def resolve_details(
+    program_id: Any, request: Tuple[Any, Any, Dict[str, Any]], ctx: Context
+) -> Optional[Dict[str, Any]]:
+    """Return the details of one programme, fetching them if needed.
+
+    Args:
+        program_id: The programme's Freeview ID.
+        request: The region ID, service ID and listing of one of the
+            programme's events, as listed by :func:`fetch_schedule`.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+    """
+    return _program_details(*request, ctx)
+
+
+def assemble_programmes(
+    channel: Dict[str, Any],
+    schedule: Schedule,
+    details: Dict[Any, Optional[Dict[str, Any]]],
+    ctx: Context,
+) -> List[Programme]:
+    """Build a channel's programmes from its events and programme details."""
+    programmes: List[Programme] = []
+    for listing, start_ts, end_ts in schedule.items:
+        title = listing.get("main_title")
+        desc = listing.get("secondary_title") or "No further information..."
+        info = details.get(listing.get("program_id"))
+        # Determine description and icon based on detail
+        icon = None
+        if info:
+            synopsis = info.get("synopsis")
+            if isinstance(synopsis, dict) and synopsis:
+                medium_synopsis = synopsis.get("medium")
+                if medium_synopsis:
+                    desc = medium_synopsis
+            if info.get("image_url"):
+                icon = f"{info['image_url']}?w=800"
+            elif listing.get("fallback_image_url"):
+                icon = f"{listing['fallback_image_url']}?w=800"
+        else:
+            # When no detail is available, keep the basic listing description and
+            # use a fallback image if available.
+            if listing.get("fallback_image_url"):
+                icon = f"{listing['fallback_image_url']}?w=800"
+        programmes.append(
+            Programme(
+                title=title,
+                description=desc,
+                start=start_ts,
+                stop=end_ts,
+                icon=icon,
+                channel=channel.get("xmltv_id"),
+            )
+        )
     return programmes
+
+
+def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Programme]:
+    """Fetch programme data for a Freeview channel.
+
+    Args:
+        channel: The channel definition from ``channels.json``.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+
+    Returns:
+        A list of programmes for the channel.
+    """
+    schedule = fetch_schedule(channel, ctx)
+    details = {
+        program_id: resolve_details(program_id, request, ctx)
+        for program_id, request in schedule.details.items()
+    }
+    return assemble_programmes(channel, schedule, details, ctx)
@@ -1,73 +1,77 @@
 """
 RadioTimes EPG provider implementation.
 
-Fetches programme data from the RadioTimes API. For the required number of days, 
-a schedule endpoint is queried. Additional details for each episode are retrieved 
-to obtain descriptions and images. Duplicate broadcasts (with the same start time) 
+Fetches programme data from the RadioTimes API. For the required number of days,
+a schedule endpoint is queried. Additional details for each episode are retrieved
+to obtain descriptions and images. Duplicate broadcasts (with the same start time)
 are skipped to avoid repeated entries.
+
+The provider declares a detail resolver (see :mod:`src.details`):
+``fetch_schedule`` loads the schedule days and lists the episodes they
+reference, ``resolve_details`` looks up one episode, and
+``assemble_programmes`` builds the programmes. The orchestrators thereby
+look up each episode once across all RadioTimes channels, in parallel.
+``fetch_programmes`` and ``fetch_programmes_async`` run the same phases for
+a single channel.
+
+Episode details are persisted between runs through ``ctx.remember`` (only
+the description and image URL are kept), so a routine build only requests
+details for newly scheduled episodes.
 """
 
+import asyncio
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
+from ..details import Schedule
+from ..enrichment import MISSING, is_permanent_failure
+from ..programme import Programme
 from .base import Context
 
 
-def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, Any]]:
-    """Fetch programme data for a RadioTimes channel.
+SCHEDULE_URL = "https://www.radiotimes.com/api/broadcast/broadcast/channels/{provider_id}/schedule"
+DETAILS_URL = "https://www.radiotimes.com/api/broadcast/broadcast/details/{programme_id}"
 
-    Args:
-        channel: The channel definition from ``channels.json``.
-        ctx: Shared context carrying a ``requests.Session`` and caches.
 
-    Returns:
-        A list of programme dictionaries for the channel.
-    """
-    programmes: List[Dict[str, Any]] = []
-    provider_id = channel.get("provider_id")
-    xmltv_id = channel.get("xmltv_id")
-    session = ctx.session
-    # Compute midnight UTC today and the next (ctx.days-1) days
+def _schedule_urls(provider_id: Any, day_offsets: List[int]) -> List[str]:
+    """Return the schedule URL of each requested day, in UTC days from today."""
     base = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    date_list = [base + timedelta(days=i) for i in range(ctx.days)]
-
-    details_cache = ctx.caches.setdefault("rt_details", {})
-
-    prev_start: float | None = None
-    for date in date_list:
+    urls = []
+    for i in day_offsets:
+        date = base + timedelta(days=i)
         from_str = date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
         to_str = (date + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
-        url = (
-            f"https://www.radiotimes.com/api/broadcast/broadcast/channels/{provider_id}/schedule"
-            f"?from={from_str}&to={to_str}"
+        urls.append(
+            f"{SCHEDULE_URL.format(provider_id=provider_id)}?from={from_str}&to={to_str}"
         )
-        try:
-            resp = session.get(url, timeout=(5, 30))
-            resp.raise_for_status()
-            epg_data = resp.json()
-        except Exception:
-            # Skip this day on any error
-            continue
+    return urls
+
+
+def _build_programmes(
+    schedules: List[Any], details_cache: Dict[str, Any], xmltv_id: str
+) -> List[Programme]:
+    """Assemble programmes from schedule items and cached details.
+
+    Args:
+        schedules: The decoded schedule payload of each day, in day order.
+            Days that failed to load are ``None``.
+        details_cache: Episode details keyed by RadioTimes programme ID.
+        xmltv_id: Channel identifier to attach to each programme.
+    """
+    programmes: List[Programme] = []
+    prev_start: float | None = None
+    for epg_data in schedules:
         if not epg_data:
             continue
         for item in epg_data:
             if item.get("type") != "episode":
                 continue
-            # Fetch details for description and image
+            # Take description and image from the episode details
             desc = None
             icon = None
-            programme_id = item.get("id")
-            if programme_id:
-                details_url = (
-                    f"https://www.radiotimes.com/api/broadcast/broadcast/details/{programme_id}"
-                )
+            details_json = details_cache.get(item.get("id")) if item.get("id") else None
+            if details_json is not None:
                 try:
-                    details_json = details_cache.get(programme_id)
-                    if details_json is None:
-                        details_resp = session.get(details_url, timeout=(5, 30))
-                        details_resp.raise_for_status()
-                        details_json = details_resp.json()
-                        details_cache[programme_id] = details_json
                     desc = details_json.get("description")
                     image = details_json.get("image")
                     if image and image.get("url"):
@@ -93,14 +97,185 @@ def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, An
             if prev_start is not None and prev_start == start_ts:
                 continue
             programmes.append(
-                {
-                    "title": title,
-                    "description": desc,
-                    "start": start_ts,
-                    "stop": end_ts,
-                    "icon": icon,
-                    "channel": xmltv_id,
-                }
+                Programme(
+                    title=title,
+                    description=desc,
+                    start=start_ts,
+                    stop=end_ts,
+                    icon=icon,
+                    channel=xmltv_id,
+                )
             )
             prev_start = start_ts
     return programmes
+
+
+def _episode_ids(schedules: List[Any]) -> List[str]:
+    """Return the unique episode IDs referenced by the schedules, in order."""
+    ids: Dict[str, None] = {}
+    for epg_data in schedules:
+        for item in epg_data or []:
+            if item.get("type") == "episode" and item.get("id"):
+                ids.setdefault(item["id"], None)
+    return list(ids)
+
+
+def _schedule(schedules: List[Any]) -> Schedule:
+    """Wrap the schedule days with one detail lookup per referenced episode."""
+    return Schedule(schedules, {episode_id: episode_id for episode_id in _episode_ids(schedules)})
+
+
+def _recall_details(programme_id: str, ctx: Context) -> bool:
+    """Load an episode's details persisted by an earlier run into the cache.
+
+    Returns:
+        ``True`` if the lookup need not be made, i.e. details were found or
+        the episode is known to have none.
+    """
+    stored = ctx.recall("rt", programme_id)
+    if stored is MISSING:
+        return False
+    if stored is not None:
+        ctx.caches.setdefault("rt_details", {})[programme_id] = stored
+    return True
+
+
+def _remember_details(programme_id: str, details_json: Any, ctx: Context) -> Any:
+    """Persist the parts of an episode's details the guide uses."""
+    if isinstance(details_json, dict):
+        image = details_json.get("image")
+        kept = {"description": details_json.get("description")}
+        if isinstance(image, dict):
+            kept["image"] = {"url": image.get("url")}
+        ctx.remember("rt", programme_id, kept)
+    return details_json
+
+
+def fetch_schedule(channel: Dict[str, Any], ctx: Context) -> Schedule:
+    """Fetch the schedule days of a RadioTimes channel.
+
+    Returns:
+        The decoded schedule of each day (``None`` for days that failed to
+        load), with one detail lookup per referenced episode.
+    """
+    schedules: List[Any] = []
+    for url in _schedule_urls(channel.get("provider_id"), ctx.fetch_days()):
+        try:
+            resp = ctx.session.get(url, timeout=(5, 30))
+            resp.raise_for_status()
+            schedules.append(resp.json())
+        except Exception:
+            # Skip this day on any error
+            schedules.append(None)
+    return _schedule(schedules)
+
+
+async def fetch_schedule_async(channel: Dict[str, Any], ctx: Context) -> Schedule:
+    """Fetch the schedule days of a RadioTimes channel concurrently.
+
+    The result is identical to :func:`fetch_schedule`.
+    """
+
+    async def _fetch_day(url: str) -> Any:
+        try:
+            return await ctx.async_session.get_json(url, timeout=(5, 30))
+        except Exception:
+            # Skip this day on any error
+            return None
+
+    urls = _schedule_urls(channel.get("provider_id"), ctx.fetch_days())
+    schedules = await asyncio.gather(*(_fetch_day(url) for url in urls))
+    return _schedule(list(schedules))
+
+
+def resolve_details(programme_id: str, request: Any, ctx: Context) -> Optional[Any]:
+    """Return the details of one episode, fetching them if needed.
+
+    Transient failures are not cached, so they are retried the next time
+    the episode is seen.
+    """
+    details_cache = ctx.caches.setdefault("rt_details", {})
+    if details_cache.get(programme_id) is None and not _recall_details(programme_id, ctx):
+        try:
+            details_resp = ctx.session.get(
+                DETAILS_URL.format(programme_id=programme_id), timeout=(5, 30)
+            )
+            details_resp.raise_for_status()
+            details_cache[programme_id] = _remember_details(programme_id, details_resp.json(), ctx)
+        except Exception as exc:
+            if is_permanent_failure(exc):
+                ctx.remember("rt", programme_id, None)
+    return details_cache.get(programme_id)
+
+
+async def resolve_details_async(programme_id: str, request: Any, ctx: Context) -> Optional[Any]:
+    """Return the details of one episode, sharing in-flight requests."""
+    details_cache = ctx.caches.setdefault("rt_details", {})
+    pending: Dict[str, asyncio.Task] = ctx.caches.setdefault("rt_details_pending", {})
+    cached = details_cache.get(programme_id)
+    if cached is not None:
+        return cached
+    if _recall_details(programme_id, ctx):
+        return details_cache.get(programme_id)
+    task = pending.get(programme_id)
+    if task is None:
+        url = DETAILS_URL.format(programme_id=programme_id)
+        task = asyncio.ensure_future(ctx.async_session.get_json(url, timeout=(5, 30)))
+        pending[programme_id] = task
+    try:
+        details_json = await asyncio.shield(task)
+    except Exception as exc:
+        if is_permanent_failure(exc):
+            ctx.remember("rt", programme_id, None)
+        return None
+    finally:
+        if task.done():
+            pending.pop(programme_id, None)
+    if details_json is not None and programme_id not in details_cache:
+        details_cache[programme_id] = _remember_details(programme_id, details_json, ctx)
+    return details_json
+
+
+def assemble_programmes(
+    channel: Dict[str, Any], schedule: Schedule, details: Dict[str, Any], ctx: Context
+) -> List[Programme]:
+    """Build a channel's programmes from its schedule and episode details."""
+    return _build_programmes(schedule.items, details, channel.get("xmltv_id"))
+
+
+def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Programme]:
+    """Fetch programme data for a RadioTimes channel.
+
+    Args:
+        channel: The channel definition from ``channels.json``.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+
+    Returns:
+        A list of programmes for the channel.
+    """
+    schedule = fetch_schedule(channel, ctx)
+    details = {
+        programme_id: resolve_details(programme_id, request, ctx)
+        for programme_id, request in schedule.details.items()
+    }
+    return assemble_programmes(channel, schedule, details, ctx)
+
+
+async def fetch_programmes_async(channel: Dict[str, Any], ctx: Context) -> List[Programme]:
+    """Fetch programme data for a RadioTimes channel using ``ctx.async_session``.
+
+    The result is identical to :func:`fetch_programmes`, but all schedule
+    days, and then all episode details, are requested concurrently.
+
+    Args:
+        channel: The channel definition from ``channels.json``.
+        ctx: Shared context carrying an :class:`src.http.AsyncSession`.
+
+    Returns:
+        A list of programmes for the channel.
+    """
+    schedule = await fetch_schedule_async(channel, ctx)
+    values = await asyncio.gather(
+        *(resolve_details_async(key, request, ctx) for key, request in schedule.details.items())
+    )
+    return assemble_programmes(channel, schedule, dict(zip(schedule.details, values)), ctx)
@@ -2,18 +2,212 @@
 Sky EPG provider implementation.
 
 Fetches programme data from the Sky API using a simple HTTP GET. A separate
-request is made for each day of interest (by default, today and the next six days), 
-and events are collated into a list of programme dictionaries.
+request is made for each day of interest (by default, today and the next six days),
+and events are collated into a list of programmes.
+
+Both the synchronous ``fetch_programmes`` and the asyncio
+``fetch_programmes_async`` are provided; the latter requests all days of a
+channel concurrently.
+
+The schedule endpoint accepts a comma-separated list of service IDs, so the
+``prefetch`` hooks request the schedules of all Sky channels in batches of
+:data:`BATCH_SIZE` per day before the channels are fetched. A batch the
+endpoint rejects is split in half and retried, down to single services.
+Each service's share of a batch response is cached under ``ctx.caches``, and
+the per-channel fetches only fall back to their own request for days that
+were not prefetched, including services a batch response left out.
 """
 
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
+from ..programme import Programme
 from ..utils.parsing import parse_duration_value, parse_timestamp
 from .base import Context
 
 
-def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, Any]]:
+SCHEDULE_URL = "https://awk.epgsky.com/hawk/linear/schedule/{date}/{provider_id}"
+
+# Maximum number of service IDs requested together by ``prefetch``.
+BATCH_SIZE = 20
+
+# Number of batch requests ``prefetch`` keeps in flight.
+PREFETCH_WORKERS = 8
+
+# ``ctx.caches`` key of the prefetched schedules, keyed by (date, service ID).
+# A value of ``None`` marks a service whose schedule could not be fetched.
+_SCHEDULES = "sky_schedules"
+
+_missing = object()
+
+
+def _date_strings(day_offsets: List[int]) -> List[str]:
+    """Return the days ``day_offsets`` after today in ``YYYYMMDD`` format."""
+    now = datetime.now()
+    return [(now + timedelta(days=i)).strftime("%Y%m%d") for i in day_offsets]
+
+
+def _parse_schedule(result: Any, xmltv_id: str) -> List[Programme]:
+    """Convert one day of Sky schedule JSON into programmes."""
+    programmes: List[Programme] = []
+    schedule = result.get("schedule")
+    if not schedule:
+        return programmes
+    events = schedule[0].get("events", [])
+    for item in events:
+        title = item.get("t")
+        desc = item.get("sy")
+        start_raw = item.get("st")
+        duration_raw = item.get("d")
+        if start_raw is None or duration_raw is None:
+            continue
+        try:
+            start = parse_timestamp(start_raw)
+            duration = parse_duration_value(duration_raw)
+            end = start + duration
+        except Exception:
+            continue
+        # Determine the best available icon based on identifiers
+        icon = None
+        if item.get("programmeuuid"):
+            icon = f"https://images.metadata.sky.com/pd-image/{item['programmeuuid']}/cover"
+        elif item.get("seasonuuid"):
+            icon = f"https://images.metadata.sky.com/pd-image/{item['seasonuuid']}/cover"
+        elif item.get("seriesuuid"):
+            icon = f"https://images.metadata.sky.com/pd-image/{item['seriesuuid']}/cover"
+        # Determine premiere status
+        premiere = bool(item.get("new")) or (
+            isinstance(title, str) and title.startswith("New:")
+        )
+        season = item.get("seasonnumber")
+        episode = item.get("episodenumber")
+        programmes.append(
+            Programme(
+                title=title,
+                description=desc,
+                start=start,
+                stop=end,
+                icon=icon,
+                channel=xmltv_id,
+                premiere=premiere,
+                season=season,
+                episode=episode,
+            )
+        )
+    return programmes
+
+
+def _batches(channels: List[Dict[str, Any]], ctx: Context) -> List[Tuple[str, List[str]]]:
+    """Group the service IDs of ``channels`` into batches for every day."""
+    service_ids = list(
+        dict.fromkeys(str(ch["provider_id"]) for ch in channels if ch.get("provider_id"))
+    )
+    return [
+        (date, service_ids[i : i + BATCH_SIZE])
+        for date in _date_strings(ctx.fetch_days())
+        for i in range(0, len(service_ids), BATCH_SIZE)
+    ]
+
+
+def _split_batch(result: Any, service_ids: List[str]) -> Dict[str, Any]:
+    """Fan a batch response out into one single-service payload per ID.
+
+    Services missing from the response are left out, so that a truncated
+    batch does not pass for empty schedules; their channels request them
+    on their own instead. A single-service response is the service's
+    payload as it is.
+    """
+    if len(service_ids) == 1:
+        return {service_ids[0]: result}
+    entries = {}
+    for entry in (result or {}).get("schedule") or []:
+        if isinstance(entry, dict) and entry.get("sid") is not None:
+            entries[str(entry["sid"])] = entry
+    return {sid: {"schedule": [entries[sid]]} for sid in service_ids if sid in entries}
+
+
+def _store_batch(ctx: Context, date: str, payloads: Dict[str, Optional[Any]]) -> None:
+    schedules = ctx.caches.setdefault(_SCHEDULES, {})
+    for sid, payload in payloads.items():
+        schedules[(date, sid)] = payload
+
+
+def _fetch_batch(date: str, service_ids: List[str], ctx: Context) -> Dict[str, Optional[Any]]:
+    """Fetch one batch, splitting it in half whenever a request fails."""
+    url = SCHEDULE_URL.format(date=date, provider_id=",".join(service_ids))
+    try:
+        resp = ctx.session.get(url, timeout=(5, 30))
+        resp.raise_for_status()
+        return _split_batch(resp.json(), service_ids)
+    except Exception:
+        if len(service_ids) == 1:
+            return {service_ids[0]: None}
+    middle = len(service_ids) // 2
+    payloads = _fetch_batch(date, service_ids[:middle], ctx)
+    payloads.update(_fetch_batch(date, service_ids[middle:], ctx))
+    return payloads
+
+
+async def _fetch_batch_async(
+    date: str, service_ids: List[str], ctx: Context
+) -> Dict[str, Optional[Any]]:
+    """Asyncio counterpart of :func:`_fetch_batch`."""
+    url = SCHEDULE_URL.format(date=date, provider_id=",".join(service_ids))
+    try:
+        return _split_batch(await ctx.async_session.get_json(url, timeout=(5, 30)), service_ids)
+    except Exception:
+        if len(service_ids) == 1:
+            return {service_ids[0]: None}
+    middle = len(service_ids) // 2
+    halves = await asyncio.gather(
+        _fetch_batch_async(date, service_ids[:middle], ctx),
+        _fetch_batch_async(date, service_ids[middle:], ctx),
+    )
+    return {**halves[0], **halves[1]}
+
+
+def prefetch(channels: List[Dict[str, Any]], ctx: Context) -> None:
+    """Fetch the schedules of all ``channels`` in multi-service batches.
+
+    Args:
+        channels: The Sky channel definitions about to be fetched.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+    """
+    batches = _batches(channels, ctx)
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as pool:
+        # Copy the caller's context so requests stay attributed to Sky.
+        futures = [
+            (date, pool.submit(contextvars.copy_context().run, _fetch_batch, date, ids, ctx))
+            for date, ids in batches
+        ]
+        for date, future in futures:
+            _store_batch(ctx, date, future.result())
+
+
+async def prefetch_async(channels: List[Dict[str, Any]], ctx: Context) -> None:
+    """Fetch the schedules of all ``channels`` in batches using ``ctx.async_session``.
+
+    Args:
+        channels: The Sky channel definitions about to be fetched.
+        ctx: Shared context carrying an :class:`src.http.AsyncSession`.
+    """
+    batches = _batches(channels, ctx)
+    results = await asyncio.gather(
+        *(_fetch_batch_async(date, ids, ctx) for date, ids in batches)
+    )
+    for (date, _), payloads in zip(batches, results):
+        _store_batch(ctx, date, payloads)
+
+
+def _prefetched(ctx: Context, date: str, provider_id: Any) -> Any:
+    """Return the prefetched payload of a channel's day, or ``_missing``."""
+    return ctx.caches.get(_SCHEDULES, {}).get((date, str(provider_id)), _missing)
+
+
+def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Programme]:
     """Fetch programme data for a Sky channel.
 
     Args:
@@ -21,68 +215,59 @@ def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, An
         ctx: Shared context carrying a ``requests.Session`` and caches.
 
     Returns:
-        A list of programme dictionaries for the channel.
+        A list of programmes for the channel.
     """
-    programmes: List[Dict[str, Any]] = []
-
-    # Generate date strings for today and the next (ctx.days-1) days in YYYYMMDD format
-    now = datetime.now()
-    date_strings = [(now + timedelta(days=i)).strftime("%Y%m%d") for i in range(ctx.days)]
-
+    programmes: List[Programme] = []
     provider_id = channel.get("provider_id")
     xmltv_id = channel.get("xmltv_id")
 
-    for date in date_strings:
-        url = f"https://awk.epgsky.com/hawk/linear/schedule/{date}/{provider_id}"
+    for date in _date_strings(ctx.fetch_days()):
+        result = _prefetched(ctx, date, provider_id)
+        if result is None:
+            # The prefetch already failed for this service and day
+            continue
+        url = SCHEDULE_URL.format(date=date, provider_id=provider_id)
         try:
-            resp = ctx.session.get(url, timeout=(5, 30))
-            resp.raise_for_status()
-            result = resp.json()
+            if result is _missing:
+                resp = ctx.session.get(url, timeout=(5, 30))
+                resp.raise_for_status()
+                result = resp.json()
+            day_programmes = _parse_schedule(result, xmltv_id)
         except Exception:
             # Skip this day on any network or parsing error
             continue
-        schedule = result.get("schedule")
-        if not schedule:
-            continue
-        events = schedule[0].get("events", [])
-        for item in events:
-            title = item.get("t")
-            desc = item.get("sy")
-            start_raw = item.get("st")
-            duration_raw = item.get("d")
-            if start_raw is None or duration_raw is None:
-                continue
-            try:
-                start = parse_timestamp(start_raw)
-                duration = parse_duration_value(duration_raw)
-                end = start + duration
-            except Exception:
-                continue
-            # Determine the best available icon based on identifiers
-            icon = None
-            if item.get("programmeuuid"):
-                icon = f"https://images.metadata.sky.com/pd-image/{item['programmeuuid']}/cover"
-            elif item.get("seasonuuid"):
-                icon = f"https://images.metadata.sky.com/pd-image/{item['seasonuuid']}/cover"
-            elif item.get("seriesuuid"):
-                icon = f"https://images.metadata.sky.com/pd-image/{item['seriesuuid']}/cover"
-            # Determine premiere status
-            premiere = bool(item.get("new")) or (
-                isinstance(title, str) and title.startswith("New:")
-            )
-            season = item.get("seasonnumber")
-            episode = item.get("episodenumber")
-            programmes.append(
-                {
-                    "title": title,
-                    "description": desc,
-                    "start": start,
-                    "stop": end,
-                    "icon": icon,
-                    "channel": xmltv_id,
-                    "premiere": premiere,
-                    "season": season,
-                    "episode": episode,
-                }
-            )
+        programmes.extend(day_programmes)
     return programmes
+
+
+async def fetch_programmes_async(channel: Dict[str, Any], ctx: Context) -> List[Programme]:
+    """Fetch programme data for a Sky channel using ``ctx.async_session``.
+
+    All days are requested concurrently. The result is identical to
+    :func:`fetch_programmes`.
+
+    Args:
+        channel: The channel definition from ``channels.json``.
+        ctx: Shared context carrying an :class:`src.http.AsyncSession`.
+
+    Returns:
+        A list of programmes for the channel.
+    """
+    provider_id = channel.get("provider_id")
+    xmltv_id = channel.get("xmltv_id")
+
+    async def _fetch_day(date: str) -> List[Programme]:
+        result = _prefetched(ctx, date, provider_id)
+        if result is None:
+            return []
+        url = SCHEDULE_URL.format(date=date, provider_id=provider_id)
+        try:
+            if result is _missing:
+                result = await ctx.async_session.get_json(url, timeout=(5, 30))
+            return _parse_schedule(result, xmltv_id)
+        except Exception:
+            # Skip this day on any network or parsing error
+            return []
+
+    days = await asyncio.gather(*(_fetch_day(date) for date in _date_strings(ctx.fetch_days())))
+    return [programme for day in days for programme in day]
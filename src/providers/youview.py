@@ -3,12 +3,20 @@ YouView (EE) EPG provider implementation.
 
 Fetches programme schedules from the YouView linear metadata API using a
 service locator. Episode metadata is enriched via the instance-id endpoint,
-and images are derived from the instance-id when available.
+and images are derived from the instance-id when available. Episode lookups
+are persisted between runs through ``ctx.remember``.
+
+The provider declares a detail resolver (see :mod:`src.details`), so the
+orchestrators look up each episode once across all YouView channels, in
+parallel, after every schedule has been fetched.
 """
 
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Iterable, List, Optional
 
+from ..details import Schedule
+from ..enrichment import MISSING, is_permanent_failure
+from ..programme import Programme
 from ..xmltv import parse_duration
 from .base import Context
 
@@ -18,12 +26,12 @@ EPISODE_URL = "https://api.youview.tv/metadata/resolution/v4/episodes/by-instanc
 IMAGE_URL = "https://images-live.youview.tv/images/entity/{instance_id}/primary/1_512x288.jpg"
 
 
-def _intervals(days: int, step_hours: int = 12) -> Iterable[str]:
+def _intervals(day_offsets: Iterable[int], step_hours: int = 12) -> Iterable[str]:
     base = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    total_hours = days * 24
-    for offset in range(0, total_hours, step_hours):
-        start = base + timedelta(hours=offset)
-        yield f"{start:%Y-%m-%dT%H}Z/PT{step_hours}H"
+    for day in day_offsets:
+        for offset in range(0, 24, step_hours):
+            start = base + timedelta(days=day, hours=offset)
+            yield f"{start:%Y-%m-%dT%H}Z/PT{step_hours}H"
 
 
 def _extract_entries(payload: Any) -> List[Dict[str, Any]]:
@@ -129,37 +137,41 @@ def _fetch_episode_details(instance_id: str, ctx: Context) -> Optional[Dict[str,
     )
     if instance_id in cache:
         return cache[instance_id]
+    details = ctx.recall("yv", instance_id)
+    if details is not MISSING:
+        cache[instance_id] = details
+        return details
     try:
         resp = ctx.session.get(
             EPISODE_URL, params={"instanceId": instance_id}, timeout=(5, 30)
         )
         resp.raise_for_status()
         details = _extract_episode(resp.json())
-    except Exception:
+        ctx.remember("yv", instance_id, details)
+    except Exception as exc:
         details = None
+        if is_permanent_failure(exc):
+            ctx.remember("yv", instance_id, None)
     cache[instance_id] = details
     return details
 
 
-def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, Any]]:
-    """Fetch programme data for a YouView channel.
-
-    Args:
-        channel: The channel definition from ``channels.json``.
-        ctx: Shared context carrying a ``requests.Session`` and caches.
+def fetch_schedule(channel: Dict[str, Any], ctx: Context) -> Schedule:
+    """Fetch the schedule entries of a YouView channel.
 
     Returns:
-        A list of programme dictionaries for the channel.
+        ``(entry, start, stop, instance_id)`` tuples of the channel's
+        entries, with one detail lookup per instance ID.
     """
-    programmes: List[Dict[str, Any]] = []
+    items: List[tuple] = []
+    lookups: Dict[str, str] = {}
     service_locator = channel.get("provider_id")
-    xmltv_id = channel.get("xmltv_id")
-    if not service_locator or not xmltv_id:
-        return programmes
+    if not service_locator or not channel.get("xmltv_id"):
+        return Schedule(items, lookups)
 
     seen: set[tuple[str, int]] = set()
 
-    for interval in _intervals(ctx.days, step_hours=12):
+    for interval in _intervals(ctx.fetch_days(), step_hours=12):
         try:
             resp = ctx.session.get(
                 SCHEDULE_URL,
@@ -172,7 +184,6 @@ def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, An
             continue
 
         for entry in _extract_entries(payload):
-            title = _pick_text(entry.get("title"), entry.get("programmeTitle"))
             start_ts = _parse_timestamp(entry.get("publishedStartTime"))
             duration_td = _parse_duration_value(entry.get("publishedDuration"))
             if duration_td is None:
@@ -185,44 +196,77 @@ def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Dict[str, An
                 if dedupe_key in seen:
                     continue
                 seen.add(dedupe_key)
+                lookups.setdefault(instance_id, instance_id)
+            items.append((entry, start_ts, end_ts, instance_id))
+    return Schedule(items, lookups)
+
+
+def resolve_details(instance_id: str, request: Any, ctx: Context) -> Optional[Dict[str, Any]]:
+    """Return the episode details of one instance ID, fetching them if needed."""
+    return _fetch_episode_details(instance_id, ctx)
+
+
+def assemble_programmes(
+    channel: Dict[str, Any],
+    schedule: Schedule,
+    details: Dict[str, Optional[Dict[str, Any]]],
+    ctx: Context,
+) -> List[Programme]:
+    """Build a channel's programmes from its schedule entries and episode details."""
+    programmes: List[Programme] = []
+    for entry, start_ts, end_ts, instance_id in schedule.items:
+        title = _pick_text(entry.get("title"), entry.get("programmeTitle"))
+        info = details.get(instance_id) if instance_id else None
+        description = _pick_text(
+            entry.get("synopsis"),
+            entry.get("description"),
+            _extract_synopsis(info) if info else None,
+        )
+        if title is None and info:
+            title = _pick_text(info.get("title"), info.get("name"))
+        if title is None:
+            continue
 
-            details = _fetch_episode_details(instance_id, ctx) if instance_id else None
-            description = _pick_text(
-                entry.get("synopsis"),
-                entry.get("description"),
-                _extract_synopsis(details) if details else None,
-            )
-            if title is None and details:
-                title = _pick_text(details.get("title"), details.get("name"))
-            if title is None:
-                continue
-
-            icon = None
-            if instance_id:
-                icon = f"{IMAGE_URL.format(instance_id=instance_id)}?overlaygradient=0"
-            elif details and isinstance(details.get("image"), dict):
-                icon = details["image"].get("url")
-
-            season = None
-            episode = None
-            if details:
-                season = (
-                    details.get("seasonNumber")
-                    or details.get("seriesNumber")
-                    or details.get("season")
-                )
-                episode = details.get("episodeNumber") or details.get("episode")
-
-            programmes.append(
-                {
-                    "title": title,
-                    "description": description,
-                    "start": start_ts,
-                    "stop": end_ts,
-                    "icon": icon,
-                    "channel": xmltv_id,
-                    "season": season,
-                    "episode": episode,
-                }
+        icon = None
+        if instance_id:
+            icon = f"{IMAGE_URL.format(instance_id=instance_id)}?overlaygradient=0"
+        elif info and isinstance(info.get("image"), dict):
+            icon = info["image"].get("url")
+
+        season = None
+        episode = None
+        if info:
+            season = info.get("seasonNumber") or info.get("seriesNumber") or info.get("season")
+            episode = info.get("episodeNumber") or info.get("episode")
+
+        programmes.append(
+            Programme(
+                title=title,
+                description=description,
+                start=start_ts,
+                stop=end_ts,
+                icon=icon,
+                channel=channel.get("xmltv_id"),
+                season=season,
+                episode=episode,
             )
+        )
     return programmes
+
+
+def fetch_programmes(channel: Dict[str, Any], ctx: Context) -> List[Programme]:
+    """Fetch programme data for a YouView channel.
+
+    Args:
+        channel: The channel definition from ``channels.json``.
+        ctx: Shared context carrying a ``requests.Session`` and caches.
+
+    Returns:
+        A list of programmes for the channel.
+    """
+    schedule = fetch_schedule(channel, ctx)
+    details = {
+        instance_id: resolve_details(instance_id, request, ctx)
+        for instance_id, request in schedule.details.items()
+    }
+    return assemble_programmes(channel, schedule, details, ctx)
@@ -0,0 +1,159 @@
+"""
+Per-host request rate limiting.
+
+Once channels are fetched concurrently, nothing stops the build from hitting
+an upstream host as hard as it can and then burning retries on HTTP 429s.
+This module provides a token bucket per host, with a configured rate in
+requests per second and a burst size, shared by every thread and coroutine
+using the same :class:`HostRateLimiter`.
+
+Buckets hand out *reservations*: taking a token never blocks while holding
+the lock, it only reports how long the caller must wait before sending. Sync
+callers then ``time.sleep`` and async callers ``await asyncio.sleep``, which
+makes the same limiter safe to share between threads and an event loop.
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+# Default limits as ``host: (requests per second, burst size)``. A host also
+# matches the limits of its parent domains, e.g. ``www.radiotimes.com`` uses
+# the ``radiotimes.com`` entry when it has none of its own.
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "awk.epgsky.com": (20.0, 40),
+    "radiotimes.com": (10.0, 20),
+    "freeview.co.uk": (10.0, 20),
+    "freesat.co.uk": (5.0, 10),
+    "youview.tv": (10.0, 20),
+}
+
+
+class TokenBucket:
+    """A thread-safe token bucket handing out send-time reservations.
+
+    Args:
+        rate: Tokens added per second.
+        burst: Maximum number of tokens held, i.e. requests that may be sent
+            back to back after an idle period.
+        clock: Monotonic clock, injectable for tests.
+    """
+
+    def __init__(
+        self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return the seconds to wait before using it."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+@dataclass
+class HostStats:
+    """Counters of one host's rate limiting, used to tune the limits."""
+
+    requests: int = 0
+    delayed: int = 0
+    wait_seconds: float = 0.0
+    max_wait: float = 0.0
+
+
+class HostRateLimiter:
+    """Rate limit requests per host using one :class:`TokenBucket` each.
+
+    Args:
+        limits: Mapping of host names to ``(rate, burst)`` tuples. Hosts
+            match their own entry or that of the nearest parent domain.
+        default: Optional ``(rate, burst)`` for hosts without an entry. When
+            omitted, such hosts are not limited.
+        clock: Monotonic clock, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        limits: Mapping[str, Tuple[float, int]] = DEFAULT_RATE_LIMITS,
+        default: Optional[Tuple[float, int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.limits = {host.lower(): limit for host, limit in limits.items()}
+        self.default = default
+        self._clock = clock
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._bucket_keys: Dict[str, str] = {}
+        self._stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    def _limit_for(self, host: str) -> Tuple[str, Optional[Tuple[float, int]]]:
+        parts = host.split(".")
+        for i in range(len(parts)):
+            key = ".".join(parts[i:])
+            if key in self.limits:
+                return key, self.limits[key]
+        return host, self.default
+
+    def _reserve(self, host: Optional[str]) -> float:
+        host = (host or "").lower()
+        with self._lock:
+            if host not in self._bucket_keys:
+                self._bucket_keys[host] = self._limit_for(host)[0]
+            key = self._bucket_keys[host]
+            if key not in self._buckets:
+                # Hosts matching the same configured domain share its bucket.
+                limit = self._limit_for(host)[1]
+                self._buckets[key] = (
+                    TokenBucket(limit[0], limit[1], clock=self._clock) if limit else None
+                )
+            bucket = self._buckets[key]
+            stats = self._stats.setdefault(host, HostStats())
+        wait = bucket.reserve() if bucket is not None else 0.0
+        with self._lock:
+            stats.requests += 1
+            if wait > 0:
+                stats.delayed += 1
+                stats.wait_seconds += wait
+                stats.max_wait = max(stats.max_wait, wait)
+        return wait
+
+    def acquire(self, host: Optional[str]) -> float:
+        """Block the calling thread until a request to ``host`` may be sent.
+
+        Returns:
+            The number of seconds waited.
+        """
+        wait = self._reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, host: Optional[str]) -> float:
+        """Suspend the calling coroutine until a request to ``host`` may be sent.
+
+        Returns:
+            The number of seconds waited.
+        """
+        wait = self._reserve(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> Dict[str, HostStats]:
+        """Return a snapshot of the per-host counters."""
+        with self._lock:
+            return {host: HostStats(**vars(stats)) for host, stats in self._stats.items()}
@@ -0,0 +1,301 @@
+"""
+Channels fed by several sources, merged by priority.
+
+A channel normally names a single ``src``. It may instead list several
+sources in priority order under ``sources``, each entry holding the
+provider-specific keys of that source and sharing the rest of the channel
+definition::
+
+    {
+        "name": "BBC One",
+        "xmltv_id": "BBCOne.uk",
+        "sources": [
+            {"src": "sky", "provider_id": "2076"},
+            {"src": "rt", "provider_id": "94"}
+        ]
+    }
+
+The primary source is fetched for every channel. A lower-priority source is
+then fetched only for the channels, and only for the days, that the sources
+above it left uncovered, and its programmes fill the gaps between the
+programmes already kept. Programmes overlapping kept ones are dropped, or
+trimmed when the overlap is no longer than a small tolerance, since two
+sources rarely agree on a schedule to the minute.
+
+Both the gap search and the merge sort each channel's programmes once and
+sweep them against the sorted, disjoint spans already covered, so merging
+takes O(n log n) time per channel.
+
+With a :class:`src.hedge.Hedger`, the primary fetch of a channel with more
+than one source is hedged by its second source instead, and the gaps left by
+whichever answered first are filled as usual.
+"""
+
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .hedge import Hedger
+from .programme import Programme, ProgrammeLike, as_programmes
+from .providers.base import Context
+
+# Overlap in seconds between a lower-priority programme and the programmes
+# already kept that is trimmed off rather than dropping the programme.
+DEFAULT_TOLERANCE = 5 * 60
+
+# Fetches a list of channels with a context and returns their programmes.
+Fetcher = Callable[[List[Dict[str, Any]], Context], List[ProgrammeLike]]
+
+
+def channel_sources(channel: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return a channel's sources in priority order, as channel definitions.
+
+    Each source entry is merged over the shared keys of the channel, so the
+    returned definitions can be passed to a provider as they are. A channel
+    without ``sources`` is its own single source.
+    """
+    sources = channel.get("sources")
+    if not sources:
+        return [channel]
+    shared = {key: value for key, value in channel.items() if key != "sources"}
+    return [{**shared, **source} for source in sources]
+
+
+def source_codes(channels: Iterable[Dict[str, Any]]) -> List[str]:
+    """Return the ``src`` codes of every source of ``channels``, in first-use order."""
+    codes = (source.get("src") for channel in channels for source in channel_sources(channel))
+    return list(dict.fromkeys(codes))
+
+
+def source_tiers(channels: Iterable[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group the channels' sources by priority.
+
+    Tier ``n`` holds the ``n``-th source of every channel that has one, in
+    channel order.
+    """
+    tiers: List[List[Dict[str, Any]]] = []
+    for channel in channels:
+        for priority, source in enumerate(channel_sources(channel)):
+            if priority == len(tiers):
+                tiers.append([])
+            tiers[priority].append(source)
+    return tiers
+
+
+def _covered_spans(programmes: Iterable[Programme]) -> Tuple[List[float], List[float]]:
+    """Return the union of the programmes' time spans as start/stop lists."""
+    starts: List[float] = []
+    stops: List[float] = []
+    for start, stop in sorted((p.start, p.stop) for p in programmes):
+        if stops and start <= stops[-1]:
+            stops[-1] = max(stops[-1], stop)
+        else:
+            starts.append(start)
+            stops.append(stop)
+    return starts, stops
+
+
+def _by_channel(programmes: Iterable[Programme]) -> Dict[Any, List[Programme]]:
+    grouped: Dict[Any, List[Programme]] = {}
+    for programme in programmes:
+        grouped.setdefault(programme.channel, []).append(programme)
+    return grouped
+
+
+def _today(now: Optional[datetime]) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def uncovered_days(
+    channel_ids: Iterable[Any],
+    programmes: Iterable[ProgrammeLike],
+    days: Sequence[int],
+    tolerance: float = DEFAULT_TOLERANCE,
+    now: Optional[datetime] = None,
+) -> Dict[Any, List[int]]:
+    """Return the days each channel's programmes leave partly uncovered.
+
+    Args:
+        channel_ids: XMLTV ids of the channels to check.
+        programmes: Programmes fetched so far, of any channels.
+        days: Day offsets from today that were fetched, in UTC days.
+        tolerance: Uncovered seconds within a day that are ignored.
+        now: Current time, injectable for tests.
+
+    Returns:
+        The uncovered day offsets of every channel in ``channel_ids``, in
+        the order of ``days``. Channels without programmes miss every day.
+    """
+    grouped = _by_channel(as_programmes(programmes))
+    base = _today(now)
+    bounds = [
+        (
+            day,
+            (base + timedelta(days=day)).timestamp(),
+            (base + timedelta(days=day + 1)).timestamp(),
+        )
+        for day in sorted(days)
+    ]
+    missing: Dict[Any, List[int]] = {}
+    for channel_id in channel_ids:
+        starts, stops = _covered_spans(grouped.get(channel_id, ()))
+        gaps: List[int] = []
+        i = 0
+        for day, day_start, day_end in bounds:
+            # Spans are disjoint and sorted, and so are the days: skip the
+            # spans ending before this day and sum the coverage of the rest.
+            while i < len(stops) and stops[i] <= day_start:
+                i += 1
+            covered = 0.0
+            j = i
+            while j < len(starts) and starts[j] < day_end:
+                covered += min(stops[j], day_end) - max(starts[j], day_start)
+                j += 1
+            if day_end - day_start - covered > tolerance:
+                gaps.append(day)
+        missing[channel_id] = gaps
+    return missing
+
+
+def _fill_channel(
+    kept: List[Programme], candidates: List[Programme], tolerance: float
+) -> List[Programme]:
+    """Return the candidates fitting in the gaps between the kept programmes."""
+    starts, stops = _covered_spans(kept)
+    filled: List[Programme] = []
+    # The spans are disjoint, so a candidate can only overlap the spans from
+    # the first one ending after its start; that span only moves forward as
+    # the candidates are swept in start order.
+    i = 0
+    last_stop = None
+    for candidate in sorted(candidates, key=lambda p: (p.start, p.stop)):
+        start, stop = candidate.start, candidate.stop
+        while i < len(stops) and stops[i] <= start:
+            i += 1
+        if last_stop is not None and start < last_stop:
+            # Overlaps a candidate filled just before; trim or drop it alike.
+            start = last_stop if last_stop - start <= tolerance else stop
+        j = i
+        while j < len(starts) and starts[j] < stop:
+            if starts[j] <= start:
+                # Runs into the candidate's start.
+                if stops[j] - start > tolerance:
+                    break
+                start = max(start, stops[j])
+            elif stop - starts[j] <= tolerance and stops[j] >= stop:
+                # Runs over the candidate's end.
+                stop = starts[j]
+            else:
+                break
+            j += 1
+        else:
+            if start < stop:
+                if (start, stop) != (candidate.start, candidate.stop):
+                    candidate = replace(candidate, start=start, stop=stop)
+                filled.append(candidate)
+                last_stop = stop
+    return filled
+
+
+def fill_gaps(
+    programmes: Sequence[ProgrammeLike],
+    fallback: Sequence[ProgrammeLike],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[Programme]:
+    """Merge lower-priority programmes into the gaps of ``programmes``.
+
+    Every programme of ``programmes`` is kept. A programme of ``fallback``
+    is kept when it does not overlap a programme of its channel in
+    ``programmes``; an overlap of at most ``tolerance`` seconds at either of
+    its ends is trimmed off instead.
+
+    Returns:
+        ``programmes`` followed by the kept fallback programmes.
+    """
+    programmes = as_programmes(programmes)
+    kept = _by_channel(programmes)
+    merged = list(programmes)
+    for channel, candidates in _by_channel(as_programmes(fallback)).items():
+        merged.extend(_fill_channel(kept.get(channel, []), candidates, tolerance))
+    return merged
+
+
+def _fetch_hedged(
+    channels: List[Dict[str, Any]], ctx: Context, fetch: Fetcher, hedger: Hedger
+) -> List[ProgrammeLike]:
+    """Fetch the primary sources, hedging those of channels with an alternate."""
+    single: List[Dict[str, Any]] = []
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    for channel in channels:
+        sources = channel_sources(channel)
+        if len(sources) > 1:
+            pairs.append((sources[0], sources[1]))
+        else:
+            single.append(sources[0])
+    # Channels without an alternate are fetched alongside the hedged ones.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        unhedged = pool.submit(contextvars.copy_context().run, fetch, single, ctx)
+        hedged = hedger.fetch(pairs, ctx, fetch)
+        return list(unhedged.result()) + hedged
+
+
+def fetch_sources(
+    channels: List[Dict[str, Any]],
+    ctx: Context,
+    fetch: Fetcher,
+    tolerance: float = DEFAULT_TOLERANCE,
+    now: Optional[datetime] = None,
+    hedger: Optional[Hedger] = None,
+) -> List[Programme]:
+    """Fetch channels from their sources in priority order.
+
+    Args:
+        channels: Channel definitions, with a ``src`` or with ``sources``.
+        ctx: Shared context. Its ``day_offsets`` bound the days checked for
+            gaps.
+        fetch: Fetches a list of single-source channel definitions.
+        tolerance: Seconds of overlap or missing coverage that are ignored.
+        now: Current time, injectable for tests.
+        hedger: Optional hedger of the primary fetches of channels with an
+            alternate source.
+
+    Returns:
+        The merged programmes of every channel.
+    """
+    tiers = source_tiers(channels)
+    if not tiers:
+        return []
+    if hedger is None:
+        programmes = as_programmes(fetch(tiers[0], ctx))
+    else:
+        programmes = as_programmes(_fetch_hedged(channels, ctx, fetch, hedger))
+    for priority, tier in enumerate(tiers[1:], start=1):
+        gaps = uncovered_days(
+            (source.get("xmltv_id") for source in tier),
+            programmes,
+            ctx.fetch_days(),
+            tolerance=tolerance,
+            now=now,
+        )
+        # Channels missing the same days are fetched together, and only for
+        # those days.
+        groups: Dict[Tuple[int, ...], List[Dict[str, Any]]] = {}
+        for source in tier:
+            days = tuple(gaps[source.get("xmltv_id")])
+            if days:
+                groups.setdefault(days, []).append(source)
+        logging.info(
+            "Source priority %d: %d of %d channels have gaps to fill",
+            priority,
+            sum(len(group) for group in groups.values()),
+            len(tier),
+        )
+        fallback: List[ProgrammeLike] = []
+        for days, group in groups.items():
+            fallback.extend(fetch(group, replace(ctx, day_offsets=days)))
+        programmes = fill_gaps(programmes, fallback, tolerance=tolerance)
+    return programmes
@@ -0,0 +1,389 @@
+"""
+Per-request network telemetry and the run report built from it.
+
+Build time is mostly spent waiting on the providers' APIs, but the log only
+says which channel is being fetched. When a :class:`Telemetry` collector is
+given to the sessions of :mod:`src.http`, every request they handle is
+recorded as a :class:`RequestSample`: how long it took, how long it waited
+for the rate limiter, the size of its body, its status, how often it was
+retried and whether the response cache answered it. Samples are tagged with
+the provider and channel being fetched (see :data:`src.http.request_provider`
+and :data:`src.http.request_channel`), the host, and the day of the schedule
+requested, which is read from the URL of schedule requests by
+:data:`DAY_PATTERNS`. Detail lookups are shared between channels and carry
+no channel or day.
+
+At the end of a run, :meth:`Telemetry.write_report` writes a JSON summary
+and :meth:`Telemetry.write_openmetrics` the same figures as an OpenMetrics
+text file: latency percentiles per host, the channels that spent the most
+time on the network and request totals per provider.
+"""
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Union
+
+from .utils import percentile
+
+# Percentiles of request latency reported per host.
+PERCENTILES = (50, 95, 99)
+
+# Number of channels listed as the slowest.
+DEFAULT_TOP_CHANNELS = 10
+
+# Default directory of the run report, and the names of its files.
+DEFAULT_REPORT_DIR = "reports"
+REPORT_NAME = "run.json"
+METRICS_NAME = "metrics.prom"
+
+# Cache outcomes of a request; ``None`` when no cache is configured.
+CACHE_HIT = "hit"
+CACHE_REVALIDATED = "revalidated"
+CACHE_MISS = "miss"
+
+# Schedule URLs and the day they request. A pattern captures the day as a
+# ``date`` (``YYYYMMDD`` or ``YYYY-MM-DD``), an ``epoch`` timestamp or an
+# ``offset`` in days from today (UTC).
+DAY_PATTERNS: Sequence[Pattern] = (
+    re.compile(r"awk\.epgsky\.com/hawk/linear/schedule/(?P<date>\d{8})/"),
+    re.compile(
+        r"radiotimes\.com/api/broadcast/broadcast/channels/[^/]+/schedule"
+        r"\?from=(?P<date>\d{4}-\d{2}-\d{2})"
+    ),
+    re.compile(r"freeview\.co\.uk/api/tv-guide\?.*\bstart=(?P<epoch>\d+)"),
+    re.compile(
+        r"api\.youview\.tv/metadata/linear/v2/schedule/.*\binterval=(?P<date>\d{4}-\d{2}-\d{2})T"
+    ),
+    re.compile(r"freesat\.co\.uk/tv-guide/api/(?P<offset>\d+)(?:\?|$)"),
+)
+
+
+@dataclass(frozen=True)
+class RequestSample:
+    """Measurements of one request made through a session.
+
+    Attributes:
+        provider: Source code of the provider fetch issuing the request.
+        channel: ``xmltv_id`` of the channel being fetched, if any.
+        host: Host the request was addressed to.
+        day: ISO date of the schedule day requested, if known.
+        method: HTTP method.
+        status: Final status code, ``None`` if the request failed.
+        seconds: Time taken, excluding the wait for the rate limiter.
+        wait: Time waited for the rate limiter.
+        bytes: Size of the response body.
+        retries: Number of retried attempts.
+        cache: ``"hit"``, ``"revalidated"``, ``"miss"`` or ``None``.
+    """
+
+    provider: Optional[str]
+    channel: Optional[str]
+    host: Optional[str]
+    day: Optional[str]
+    method: str
+    status: Optional[int]
+    seconds: float
+    wait: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+    cache: Optional[str] = None
+
+    @property
+    def networked(self) -> bool:
+        """Whether the request went to the network rather than the cache."""
+        return self.cache != CACHE_HIT
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def request_day(
+    url: str,
+    patterns: Sequence[Pattern] = DAY_PATTERNS,
+    today: Callable[[], date] = _utc_today,
+) -> Optional[str]:
+    """Return the ISO date of the schedule day ``url`` requests, if any."""
+    for pattern in patterns:
+        match = pattern.search(url)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        if groups.get("date"):
+            return datetime.strptime(groups["date"].replace("-", ""), "%Y%m%d").date().isoformat()
+        if groups.get("epoch"):
+            return datetime.fromtimestamp(int(groups["epoch"]), timezone.utc).date().isoformat()
+        if groups.get("offset"):
+            return (today() + timedelta(days=int(groups["offset"]))).isoformat()
+    return None
+
+
+def _label(value: Optional[str]) -> str:
+    return value if value is not None else "unknown"
+
+
+class Telemetry:
+    """Thread-safe collector of :class:`RequestSample` records.
+
+    Args:
+        clock: Wall clock returning a timezone-aware ``datetime``, injectable
+            for tests.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc)) -> None:
+        self._clock = clock
+        self._samples: List[RequestSample] = []
+        self._lock = threading.Lock()
+        self.started_at = clock()
+
+    def record(self, sample: RequestSample) -> None:
+        """Record the measurements of one request."""
+        with self._lock:
+            self._samples.append(sample)
+
+    def samples(self) -> List[RequestSample]:
+        """Return a snapshot of the recorded samples, in recording order."""
+        with self._lock:
+            return list(self._samples)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def summary(self, top: int = DEFAULT_TOP_CHANNELS) -> Dict[str, Any]:
+        """Summarise the recorded requests.
+
+        Latency percentiles per host only cover requests that went to the
+        network; requests answered by the cache are counted but would make
+        every host look instantaneous.
+
+        Args:
+            top: Number of channels listed as the slowest.
+
+        Returns:
+            A JSON-serialisable report with ``hosts``, ``providers``,
+            ``days`` and ``slowest_channels`` sections.
+        """
+        samples = self.samples()
+        hosts: Dict[str, Dict[str, Any]] = {}
+        latencies: Dict[str, List[float]] = {}
+        providers: Dict[str, Dict[str, Any]] = {}
+        days: Dict[str, Dict[str, Any]] = {}
+        channels: Dict[str, Dict[str, Any]] = {}
+        for sample in samples:
+            failed = sample.status is None or sample.status >= 400
+            host = hosts.setdefault(
+                _label(sample.host),
+                {"requests": 0, "errors": 0, "retries": 0, "bytes": 0, "wait_seconds": 0.0},
+            )
+            host["requests"] += 1
+            host["errors"] += failed
+            host["retries"] += sample.retries
+            host["bytes"] += sample.bytes
+            host["wait_seconds"] += sample.wait
+            if sample.networked:
+                latencies.setdefault(_label(sample.host), []).append(sample.seconds)
+
+            provider = providers.setdefault(
+                _label(sample.provider),
+                {
+                    "requests": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "bytes": 0,
+                    "seconds": 0.0,
+                    "cache": {},
+                    "statuses": {},
+                },
+            )
+            provider["requests"] += 1
+            provider["errors"] += failed
+            provider["retries"] += sample.retries
+            provider["bytes"] += sample.bytes
+            provider["seconds"] += sample.seconds + sample.wait
+            if sample.cache is not None:
+                provider["cache"][sample.cache] = provider["cache"].get(sample.cache, 0) + 1
+            status = str(sample.status) if sample.status is not None else "error"
+            provider["statuses"][status] = provider["statuses"].get(status, 0) + 1
+
+            if sample.day is not None:
+                day = days.setdefault(sample.day, {"requests": 0, "seconds": 0.0})
+                day["requests"] += 1
+                day["seconds"] += sample.seconds + sample.wait
+
+            if sample.channel is not None:
+                channel = channels.setdefault(
+                    sample.channel,
+                    {
+                        "channel": sample.channel,
+                        "provider": sample.provider,
+                        "requests": 0,
+                        "seconds": 0.0,
+                        "wait_seconds": 0.0,
+                        "bytes": 0,
+                    },
+                )
+                channel["requests"] += 1
+                channel["seconds"] += sample.seconds
+                channel["wait_seconds"] += sample.wait
+                channel["bytes"] += sample.bytes
+
+        for name, host in hosts.items():
+            values = sorted(latencies.get(name, []))
+            host["network_requests"] = len(values)
+            host["seconds"] = sum(values)
+            for p in PERCENTILES:
+                host[f"p{p}"] = percentile(values, p)
+            host["max"] = values[-1] if values else 0.0
+
+        slowest = sorted(
+            channels.values(), key=lambda c: (-(c["seconds"] + c["wait_seconds"]), c["channel"])
+        )
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": self._clock().isoformat(timespec="seconds"),
+            "requests": len(samples),
+            "bytes": sum(s.bytes for s in samples),
+            "hosts": dict(sorted(hosts.items())),
+            "providers": dict(sorted(providers.items())),
+            "days": dict(sorted(days.items())),
+            "slowest_channels": slowest[:top],
+        }
+
+    def write_report(
+        self, path: Union[str, Path], top: int = DEFAULT_TOP_CHANNELS
+    ) -> Dict[str, Any]:
+        """Write :meth:`summary` as JSON to ``path`` and return it.
+
+        Args:
+            path: Location of the report. Parent directories are created as
+                needed.
+            top: Number of channels listed as the slowest.
+        """
+        report = self.summary(top)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        return report
+
+    def write_openmetrics(
+        self,
+        path: Union[str, Path],
+        top: int = DEFAULT_TOP_CHANNELS,
+        report: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Write the run's figures to ``path`` in the OpenMetrics text format.
+
+        Args:
+            path: Location of the metrics file. Parent directories are
+                created as needed.
+            top: Number of channels exported as the slowest.
+            report: A :meth:`summary` already computed for this run.
+        """
+        if report is None:
+            report = self.summary(top)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in openmetrics_lines(report))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name: str, labels: Dict[str, Any], value: float) -> str:
+    rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+    number = str(value) if isinstance(value, int) else repr(float(value))
+    return f"{name}{{{rendered}}} {number}" if rendered else f"{name} {number}"
+
+
+def _family(name: str, kind: str, help_text: str, unit: Optional[str] = None) -> List[str]:
+    lines = [f"# TYPE {name} {kind}"]
+    if unit is not None:
+        lines.append(f"# UNIT {name} {unit}")
+    lines.append(f"# HELP {name} {help_text}")
+    return lines
+
+
+def openmetrics_lines(report: Dict[str, Any]) -> Iterable[str]:
+    """Yield the lines of an OpenMetrics exposition of a :meth:`Telemetry.summary`."""
+    hosts = report["hosts"]
+    providers = report["providers"]
+
+    yield from _family(
+        "epg_http_request_seconds",
+        "summary",
+        "Latency of HTTP requests that reached the network.",
+        "seconds",
+    )
+    for host, stats in hosts.items():
+        for p in PERCENTILES:
+            yield _sample(
+                "epg_http_request_seconds", {"host": host, "quantile": p / 100}, stats[f"p{p}"]
+            )
+        yield _sample("epg_http_request_seconds_sum", {"host": host}, stats["seconds"])
+        yield _sample("epg_http_request_seconds_count", {"host": host}, stats["network_requests"])
+
+    yield from _family(
+        "epg_http_rate_limit_wait_seconds",
+        "counter",
+        "Time HTTP requests waited for the rate limiter.",
+        "seconds",
+    )
+    for host, stats in hosts.items():
+        yield _sample(
+            "epg_http_rate_limit_wait_seconds_total", {"host": host}, stats["wait_seconds"]
+        )
+
+    yield from _family("epg_http_requests", "counter", "HTTP requests made, by provider.")
+    for provider, stats in providers.items():
+        yield _sample("epg_http_requests_total", {"provider": provider}, stats["requests"])
+
+    yield from _family(
+        "epg_http_request_errors", "counter", "HTTP requests that failed, by provider."
+    )
+    for provider, stats in providers.items():
+        yield _sample("epg_http_request_errors_total", {"provider": provider}, stats["errors"])
+
+    yield from _family("epg_http_retries", "counter", "Retried HTTP attempts, by provider.")
+    for provider, stats in providers.items():
+        yield _sample("epg_http_retries_total", {"provider": provider}, stats["retries"])
+
+    yield from _family(
+        "epg_http_response_bytes",
+        "counter",
+        "Size of HTTP response bodies, by provider.",
+        "bytes",
+    )
+    for provider, stats in providers.items():
+        yield _sample("epg_http_response_bytes_total", {"provider": provider}, stats["bytes"])
+
+    yield from _family(
+        "epg_http_cache_requests", "counter", "HTTP requests by response cache outcome."
+    )
+    for provider, stats in providers.items():
+        for outcome, count in sorted(stats["cache"].items()):
+            yield _sample(
+                "epg_http_cache_requests_total", {"provider": provider, "outcome": outcome}, count
+            )
+
+    yield from _family(
+        "epg_channel_network_seconds",
+        "gauge",
+        "Time the slowest channels spent on HTTP requests, rate limiting included.",
+        "seconds",
+    )
+    for channel in report["slowest_channels"]:
+        yield _sample(
+            "epg_channel_network_seconds",
+            {"channel": channel["channel"], "provider": _label(channel["provider"])},
+            channel["seconds"] + channel["wait_seconds"],
+        )
+    yield "# EOF"
@@ -0,0 +1,127 @@
+"""
+Normalisation of programme text.
+
+Descriptions, titles and icon URLs repeat heavily across a guide: repeats,
++1 channels and regional variants all carry the same strings, but every
+provider response decodes them into new string objects. Programme text is
+therefore interned as the programmes enter the pipeline, so that repeats
+share one string object per run instead of holding copies of it.
+
+Descriptions are cleaned when the guide is written, by :func:`clean_text`:
+
+* control characters are stripped with :meth:`str.translate`, through a
+  table that classifies each distinct code point once;
+* feature tags and episode annotations are removed with precompiled
+  patterns, behind a bounded memo, so that the repeated descriptions of a
+  guide are cleaned once.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from .programme import Programme, ProgrammeLike, as_programmes
+
+# Number of distinct texts whose cleaned form is memoised.
+TEXT_CACHE_SIZE = 1 << 16
+
+# Feature tags such as [S], [S,SL], [AD], [HD].
+_FEATURE_TAGS = re.compile(r"\[[A-Z,]+\]")
+# Season/episode information like "(Ep 4/10)" or "S3 Ep5".
+_EPISODE_INFO = re.compile(r"\(?[SE]?\d+\s?Ep\s?\d+[\d/]*\)?")
+
+
+class _ControlCharacters(dict):
+    """Translate table deleting control characters (Unicode category C).
+
+    Code points are classified on first use and remembered, so a
+    translation costs one dictionary lookup per character.
+    """
+
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        value = None if unicodedata.category(chr(codepoint))[0] == "C" else codepoint
+        self[codepoint] = value
+        return value
+
+
+_CONTROL_CHARACTERS = _ControlCharacters()
+
+
+def remove_control_characters(s: str) -> str:
+    """Remove all control characters from the given string."""
+    # Printable strings hold no control characters.
+    if s.isprintable():
+        return s
+    return s.translate(_CONTROL_CHARACTERS)
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def clean_text(text: str) -> str:
+    """Clean a piece of text for inclusion in XML.
+
+    This function removes control characters, feature tags (e.g. [AD], [HD])
+    and season/episode annotations to improve readability. Results are
+    memoised, since the same descriptions recur across a guide.
+
+    Args:
+        text: The text to clean.
+
+    Returns:
+        The cleaned text.
+    """
+    text = remove_control_characters(text)
+    text = _FEATURE_TAGS.sub("", text)
+    text = _EPISODE_INFO.sub("", text)
+    return text.strip()
+
+
+class TextPool:
+    """Interns strings, so that equal strings share one object.
+
+    Unlike :func:`sys.intern`, the pool lives only as long as the programmes
+    it was used for.
+    """
+
+    def __init__(self) -> None:
+        self._strings: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def intern(self, value: Optional[str]) -> Optional[str]:
+        """Return the pooled string equal to ``value``; ``None`` passes through."""
+        if value is None:
+            return None
+        return self._strings.setdefault(value, value)
+
+
+def normalise_programmes(
+    programmes: Iterable[ProgrammeLike], pool: Optional[TextPool] = None
+) -> List[Programme]:
+    """Normalise the text of programmes in place.
+
+    Channel IDs, titles, descriptions and icon URLs are interned into
+    ``pool``. The text itself is left as it is; descriptions are cleaned by
+    the XMLTV writer.
+
+    Args:
+        programmes: Programmes as returned by the providers. Dictionaries
+            returned by older providers are converted.
+        pool: Pool to intern into, e.g. to share one between several calls.
+            A new pool is used by default.
+
+    Returns:
+        The normalised programmes.
+    """
+    intern = (pool if pool is not None else TextPool()).intern
+    programmes = as_programmes(programmes)
+    for programme in programmes:
+        programme.channel = intern(programme.channel)
+        if programme.title:
+            programme.title = intern(programme.title)
+        if programme.description:
+            programme.description = intern(programme.description)
+        if programme.icon:
+            programme.icon = intern(programme.icon)
+    return programmes
@@ -0,0 +1,218 @@
+"""
+Timeshift channels derived from their parent channel.
+
+A +1 channel broadcasts its parent's schedule an hour later, yet fetching
+it costs as many schedule and detail requests as the parent. A channel
+definition may instead declare the channel it repeats::
+
+    {
+        "name": "5+1",
+        "xmltv_id": "5Plus1.uk",
+        "timeshift_of": "5.uk",
+        "timeshift_minutes": 60,
+        "src": "sky",
+        "provider_id": "1839"
+    }
+
+Such channels are not fetched: their programmes are copies of the parent's,
+shifted by ``timeshift_minutes`` (60 by default). The parent must be
+configured too; otherwise the channel is fetched from its own source, if it
+has one.
+
+A timeshift channel with a source of its own can be spot-checked: one day
+of it is fetched and compared with the derived schedule, and a channel whose
+schedule diverged is fetched in full instead. Providers format titles
+differently, so programmes are matched by start time and title only when
+the channel and its parent share a provider, and by start time and duration
+otherwise.
+"""
+
+import logging
+from dataclasses import replace
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from .programme import Programme, ProgrammeLike, as_programmes
+from .providers.base import Context
+from .sources import channel_sources
+
+# Shift applied when a channel declares no ``timeshift_minutes``.
+DEFAULT_TIMESHIFT_MINUTES = 60
+
+# Day offset fetched by the spot-check, tomorrow being the first full day.
+SPOT_CHECK_DAY = 1
+
+# Share of spot-checked programmes that must match the derived schedule.
+SPOT_CHECK_AGREEMENT = 0.8
+
+# Fetches a list of channels with a context and returns their programmes.
+Fetcher = Callable[[List[Dict[str, Any]], Context], List[ProgrammeLike]]
+
+
+def timeshift_offset(channel: Dict[str, Any]) -> int:
+    """Return the shift of a timeshift channel in seconds."""
+    return int(channel.get("timeshift_minutes", DEFAULT_TIMESHIFT_MINUTES) * 60)
+
+
+def _has_source(channel: Dict[str, Any]) -> bool:
+    return any(source.get("src") for source in channel_sources(channel))
+
+
+def split_timeshifts(
+    channels: Iterable[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Separate the channels to fetch from those derived from a parent.
+
+    A channel is derived when it declares ``timeshift_of`` and its parent is
+    configured and fetched itself. Timeshift channels whose parent is
+    missing are fetched from their own source, or skipped without one.
+
+    Returns:
+        The channels to fetch and the derived channels, each in channel
+        order.
+    """
+    channels = list(channels)
+    fetched_ids = {ch.get("xmltv_id") for ch in channels if not ch.get("timeshift_of")}
+    fetched: List[Dict[str, Any]] = []
+    derived: List[Dict[str, Any]] = []
+    for channel in channels:
+        parent = channel.get("timeshift_of")
+        if not parent:
+            fetched.append(channel)
+        elif parent in fetched_ids:
+            derived.append(channel)
+        elif _has_source(channel):
+            logging.warning(
+                "Timeshift parent %s of %s is not fetched; fetching the channel itself.",
+                parent,
+                channel.get("name"),
+            )
+            fetched.append(channel)
+        else:
+            logging.warning(
+                "Timeshift parent %s of %s is not fetched; skipping.",
+                parent,
+                channel.get("name"),
+            )
+    return fetched, derived
+
+
+def _shifted(channel: Dict[str, Any], parent_programmes: Sequence[Programme]) -> List[Programme]:
+    channel_id = channel.get("xmltv_id")
+    offset = timeshift_offset(channel)
+    return [
+        replace(p, channel=channel_id, start=p.start + offset, stop=p.stop + offset)
+        for p in parent_programmes
+    ]
+
+
+def apply_timeshifts(
+    derived: Sequence[Dict[str, Any]], programmes: Sequence[ProgrammeLike]
+) -> List[Programme]:
+    """Replace the programmes of derived channels with their parents', shifted.
+
+    Args:
+        derived: Derived channels, as returned by :func:`split_timeshifts`.
+        programmes: Programmes of every channel, e.g. including those of a
+            previous guide.
+
+    Returns:
+        The programmes of the other channels followed by the derived ones.
+    """
+    programmes = as_programmes(programmes)
+    if not derived:
+        return programmes
+    derived_ids = {ch.get("xmltv_id") for ch in derived}
+    parents = {ch.get("timeshift_of") for ch in derived}
+    by_parent: Dict[Any, List[Programme]] = {parent: [] for parent in parents}
+    kept: List[Programme] = []
+    for programme in programmes:
+        if programme.channel in by_parent:
+            by_parent[programme.channel].append(programme)
+        if programme.channel not in derived_ids:
+            kept.append(programme)
+    for channel in derived:
+        kept.extend(_shifted(channel, by_parent[channel.get("timeshift_of")]))
+    return kept
+
+
+def _primary_src(channel: Dict[str, Any]) -> Any:
+    return channel_sources(channel)[0].get("src")
+
+
+def _slot(programme: Programme, by_title: bool) -> Tuple[Any, Any]:
+    if by_title:
+        return programme.start, programme.title
+    return programme.start, programme.stop - programme.start
+
+
+def _agreement(
+    expected: Sequence[Programme], fetched: Sequence[Programme], by_title: bool
+) -> float:
+    """Return the share of fetched programmes found in the expected schedule.
+
+    Programmes are matched by start time and, with ``by_title``, title, or
+    else duration.
+    """
+    slots = {_slot(p, by_title) for p in expected}
+    return sum(_slot(p, by_title) in slots for p in fetched) / len(fetched)
+
+
+def check_timeshifts(
+    derived: Sequence[Dict[str, Any]],
+    programmes: Sequence[ProgrammeLike],
+    ctx: Context,
+    fetch: Fetcher,
+    agreement: float = SPOT_CHECK_AGREEMENT,
+    parents: Sequence[Dict[str, Any]] = (),
+) -> List[Dict[str, Any]]:
+    """Spot-check derived channels against one day of their own schedule.
+
+    Channels without a source of their own are not checked. A check that
+    fetched nothing is inconclusive and passes.
+
+    Args:
+        derived: Derived channels, as returned by :func:`split_timeshifts`.
+        programmes: Programmes of every channel, including the parents'.
+        ctx: Shared context.
+        fetch: Fetches a list of channel definitions.
+        agreement: Share of fetched programmes that must match the derived
+            schedule.
+        parents: Channel definitions of the parents. Programmes of a channel
+            whose primary source is its parent's are matched by start time
+            and title; the others, including those of parents missing here,
+            by start time and duration.
+
+    Returns:
+        The channels whose schedule diverged from the derived one.
+    """
+    checked = [ch for ch in derived if _has_source(ch)]
+    if not checked:
+        return []
+    samples: Dict[Any, List[Programme]] = {}
+    for programme in as_programmes(fetch(checked, replace(ctx, day_offsets=[SPOT_CHECK_DAY]))):
+        samples.setdefault(programme.channel, []).append(programme)
+    parent_srcs = {ch.get("xmltv_id"): _primary_src(ch) for ch in parents}
+    expected: Dict[Any, List[Programme]] = {}
+    for programme in apply_timeshifts(checked, programmes):
+        expected.setdefault(programme.channel, []).append(programme)
+
+    diverged: List[Dict[str, Any]] = []
+    for channel in checked:
+        channel_id = channel.get("xmltv_id")
+        sample = samples.get(channel_id)
+        if not sample:
+            logging.info("Timeshift check of %s fetched nothing; keeping it derived.", channel_id)
+            continue
+        by_title = parent_srcs.get(channel.get("timeshift_of")) == _primary_src(channel)
+        share = _agreement(expected.get(channel_id, []), sample, by_title)
+        if share < agreement:
+            logging.warning(
+                "%s diverged from %s shifted by %d minutes (%.0f%% agree);"
+                " fetching it in full.",
+                channel_id,
+                channel.get("timeshift_of"),
+                timeshift_offset(channel) // 60,
+                100 * share,
+            )
+            diverged.append(channel)
+    return diverged
@@ -0,0 +1,122 @@
+"""
+Fast formatting of XMLTV timestamps.
+
+Every programme has a start and a stop time to format as
+``YYYYmmddHHMMSS +HHMM`` in the guide's timezone. Going through
+``datetime.fromtimestamp(ts, tz).strftime(...)`` localises each timestamp
+through pytz and parses the format string every time, although a week of
+Europe/London has at most two UTC offsets.
+
+:class:`TimestampFormatter` finds the offset transitions of the window the
+timestamps fall in once, then formats each timestamp with integer
+arithmetic: the transition list gives the offset, a memo of day prefixes
+gives the date, and the last formatted value is kept since every stop time
+is usually the next programme's start time. Timestamps outside the window, or
+that are not whole seconds, take the ``strftime`` path, so the output is
+always identical to it.
+"""
+
+import bisect
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+DT_FORMAT = "%Y%m%d%H%M%S %z"
+
+# Step in seconds between the probes looking for offset transitions. Offsets
+# are assumed to change at most once within a step.
+_PROBE_STEP = 3600
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def format_timestamp(timestamp: float, tz) -> str:
+    """Format a UNIX timestamp for XMLTV the straightforward way."""
+    return datetime.fromtimestamp(timestamp, tz).strftime(DT_FORMAT)
+
+
+class TimestampFormatter:
+    """Format UNIX timestamps in one timezone for XMLTV.
+
+    Args:
+        tz: The timezone, e.g. from ``pytz.timezone("Europe/London")``.
+        start: First timestamp of the window to precompute.
+        stop: Last timestamp of the window to precompute.
+    """
+
+    def __init__(self, tz, start: int, stop: int) -> None:
+        self.tz = tz
+        self.start = start
+        self.stop = stop
+        # Offset transitions within the window: offsets[i] applies from
+        # starts[i] up to starts[i + 1].
+        self._starts: List[int] = []
+        self._offsets: List[Optional[str]] = []
+        self._seconds: List[int] = []
+        self._days: Dict[int, str] = {}
+        # The last timestamp formatted and its text. Programmes are written
+        # in order, so a single entry catches the stop times repeated as
+        # start times without growing with the guide.
+        self._last: Tuple[Optional[float], str] = (None, "")
+        self._find_transitions()
+
+    def _offset(self, timestamp: int) -> int:
+        offset = datetime.fromtimestamp(timestamp, self.tz).utcoffset()
+        return int(offset.total_seconds()) if offset is not None else 0
+
+    def _add(self, timestamp: int, seconds: int) -> None:
+        self._starts.append(timestamp)
+        self._seconds.append(seconds)
+        if seconds % 60:
+            # ``%z`` prints seconds for such offsets; leave them to strftime.
+            self._offsets.append(None)
+        else:
+            sign = "-" if seconds < 0 else "+"
+            hours, minutes = divmod(abs(seconds) // 60, 60)
+            self._offsets.append(f"{sign}{hours:02d}{minutes:02d}")
+
+    def _find_transitions(self) -> None:
+        current = self._offset(self.start)
+        self._add(self.start, current)
+        probe = self.start
+        while probe < self.stop:
+            step = min(_PROBE_STEP, self.stop - probe)
+            following = self._offset(probe + step)
+            if following != current:
+                # Narrow down to the first second of the new offset.
+                low, high = probe, probe + step
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._offset(middle) == current:
+                        low = middle
+                    else:
+                        high = middle
+                self._add(high, following)
+                current = following
+            probe += step
+
+    def _day(self, days: int) -> str:
+        prefix = self._days.get(days)
+        if prefix is None:
+            prefix = self._days[days] = date.fromordinal(_EPOCH_ORDINAL + days).strftime("%Y%m%d")
+        return prefix
+
+    def __call__(self, timestamp: float) -> str:
+        """Return ``timestamp`` formatted as ``YYYYmmddHHMMSS +HHMM``."""
+        last, text = self._last
+        if timestamp != last:
+            text = self._format(timestamp)
+            self._last = (timestamp, text)
+        return text
+
+    def _format(self, timestamp: float) -> str:
+        if not self.start <= timestamp <= self.stop or timestamp != int(timestamp):
+            return format_timestamp(timestamp, self.tz)
+        timestamp = int(timestamp)
+        index = bisect.bisect_right(self._starts, timestamp) - 1
+        offset = self._offsets[index]
+        if offset is None:
+            return format_timestamp(timestamp, self.tz)
+        days, seconds = divmod(timestamp + self._seconds[index], 86400)
+        hours, seconds = divmod(seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+        return f"{self._day(days)}{hours:02d}{minutes:02d}{seconds:02d} {offset}"
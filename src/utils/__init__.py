@@ -1,5 +1,6 @@
 """Utility helpers for providers and core modules."""
 
 from .parsing import parse_duration_value, parse_timestamp, pick_first_text
+from .stats import percentile
 
-__all__ = ["parse_duration_value", "parse_timestamp", "pick_first_text"]
+__all__ = ["parse_duration_value", "parse_timestamp", "percentile", "pick_first_text"]
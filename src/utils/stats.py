@@ -0,0 +1,20 @@
+"""Shared statistics helpers for latency measurements."""
+
+import math
+from typing import Sequence
+
+
+def percentile(samples: Sequence[float], p: float) -> float:
+    """Return the nearest-rank percentile ``p`` of sorted ``samples``.
+
+    Args:
+        samples: Samples in ascending order.
+        p: Percentile, from 0 to 100.
+
+    Returns:
+        The sample at the nearest rank, or ``0.0`` without samples.
+    """
+    if not samples:
+        return 0.0
+    rank = math.ceil(p / 100 * len(samples))
+    return samples[min(max(rank, 1), len(samples)) - 1]
@@ -1,53 +1,44 @@
 """
 Functions for assembling an XMLTV document from channel and programme data.
 
-This module encapsulates the logic for cleaning text, parsing durations,
-serialising channels and programmes to XML, and writing files atomically.
+This module encapsulates the logic for cleaning text (implemented in
+:mod:`src.text`), parsing durations, serialising channels and programmes to
+XML, and writing files atomically. Documents are serialised incrementally
+with :func:`lxml.etree.xmlfile`, so the full element tree is never held in
+memory. Gzip and xz copies of an output file can be produced in the same
+pass.
 """
 
+import contextlib
+import gzip
+import io
+import itertools
+import lzma
+import operator
 import os
 import re
-import unicodedata
-from datetime import datetime, timedelta
+from datetime import timedelta
 from pathlib import Path
-from typing import List, Dict
+from typing import BinaryIO, Callable, Dict, Iterator, List, Sequence
 
 from lxml import etree
 
+from .programme import Programme, ProgrammeLike, as_programmes
+from .text import clean_text, remove_control_characters
+from .timestamps import TimestampFormatter
+
 __all__ = [
     "clean_text",
     "remove_control_characters",
     "parse_duration",
     "build_xmltv",
+    "stream_xmltv",
+    "write_xmltv",
     "write_atomic",
+    "COMPRESSED_VARIANTS",
 ]
 
 
-def remove_control_characters(s: str) -> str:
-    """Remove all control characters from the given string."""
-    return "".join(ch for ch in s if unicodedata.category(ch)[0] != "C")
-
-
-def clean_text(text: str) -> str:
-    """Clean a piece of text for inclusion in XML.
-
-    This function removes control characters, feature tags (e.g. [AD], [HD])
-    and season/episode annotations to improve readability.
-
-    Args:
-        text: The text to clean.
-
-    Returns:
-        The cleaned text.
-    """
-    text = remove_control_characters(text)
-    # Remove feature tags such as [S], [S,SL], [AD], [HD]
-    text = re.sub(r"\[[A-Z,]+\]", "", text)
-    # Remove season/episode information like "(Ep 4/10)" or "S3 Ep5"
-    text = re.sub(r"\(?[SE]?\d+\s?Ep\s?\d+[\d/]*\)?", "", text)
-    return text.strip()
-
-
 def parse_duration(iso_duration: str) -> timedelta:
     """Parse an ISO 8601 duration string into a :class:`timedelta`.
 
@@ -85,90 +76,240 @@ def _safe_int(value) -> int:
         return None
 
 
-def build_xmltv(channels: List[Dict], programmes: List[Dict], tz) -> bytes:
+def _channel_element(ch: Dict) -> etree._Element:
+    """Build the ``<channel>`` element of a channel definition."""
+    channel_el = etree.Element("channel")
+    channel_el.set("id", ch.get("xmltv_id"))
+    name_el = etree.SubElement(channel_el, "display-name")
+    name_el.set("lang", ch.get("lang"))
+    name_el.text = ch.get("name")
+    if ch.get("icon_url"):
+        icon_el = etree.SubElement(channel_el, "icon")
+        icon_el.set("src", ch.get("icon_url"))
+        icon_el.text = ""
+    return channel_el
+
+
+def _programme_element(pr: Programme, format_time: Callable[[float], str]) -> etree._Element:
+    """Build the ``<programme>`` element of a programme."""
+    programme_el = etree.Element("programme")
+    programme_el.set("channel", pr.channel)
+    programme_el.set("start", format_time(pr.start))
+    programme_el.set("stop", format_time(pr.stop))
+
+    title_el = etree.SubElement(programme_el, "title")
+    title_el.set("lang", "en")
+    title_el.text = pr.title
+
+    desc = pr.description
+    if desc:
+        desc_el = etree.SubElement(programme_el, "desc")
+        desc_el.set("lang", "en")
+        desc_el.text = clean_text(desc)
+
+    icon = pr.icon
+    if icon:
+        icon_el = etree.SubElement(programme_el, "icon")
+        icon_el.set("src", icon)
+
+    if pr.premiere:
+        etree.SubElement(programme_el, "premiere")
+
+    season = _safe_int(pr.season)
+    episode = _safe_int(pr.episode)
+    if season and episode:
+        ep_ns = etree.SubElement(programme_el, "episode-num")
+        ep_ns.set("system", "xmltv_ns")
+        # xmltv_ns is zero-based
+        ep_ns.text = f"{season - 1}.{episode - 1}.0"
+        ep_os = etree.SubElement(programme_el, "episode-num")
+        ep_os.set("system", "onscreen")
+        ep_os.text = f"S{season}E{episode}"
+    return programme_el
+
+
+_programme_key = operator.attrgetter("channel", "start", "stop", "title")
+
+
+def _iter_elements(
+    channels: List[Dict], programmes: Sequence[ProgrammeLike], tz
+) -> Iterator[etree._Element]:
+    """Yield the children of ``<tv>`` in document order, one at a time."""
+    # Sort channels by their xmltv identifier for deterministic output
+    for ch in sorted(channels, key=lambda c: c.get("xmltv_id")):
+        yield _channel_element(ch)
+
+    # Programmes are sorted by channel, start time, stop time and title.
+    # Grouping by channel first gives the same order as one global sort
+    # (both are stable) while only sorting one channel at a time.
+    programmes = as_programmes(programmes)
+    by_channel: Dict[str, List[Programme]] = {}
+    for pr in programmes:
+        by_channel.setdefault(pr.channel, []).append(pr)
+    if not programmes:
+        return
+    # Precompute the timezone's offsets over the span of the guide.
+    format_time = TimestampFormatter(
+        tz,
+        int(min(pr.start for pr in programmes)),
+        int(max(pr.stop for pr in programmes)) + 1,
+    )
+    for channel in sorted(by_channel):
+        group = by_channel.pop(channel)
+        group.sort(key=_programme_key)
+        for pr in group:
+            yield _programme_element(pr, format_time)
+
+
+def _root_attributes() -> Dict[str, str]:
+    return {
+        "generator-info-name": "freeview-epg",
+        "generator-info-url": "https://github.com/dp247/Freeview-EPG",
+    }
+
+
+def stream_xmltv(
+    out: BinaryIO, channels: List[Dict], programmes: Sequence[ProgrammeLike], tz
+) -> None:
+    """Serialise an XMLTV document into a binary file object.
+
+    Elements are built and written one channel or programme at a time, so
+    memory use does not grow with the size of the guide beyond the input
+    lists themselves. The bytes written are identical to a pretty-printed
+    serialisation of the whole tree, as returned by :func:`build_xmltv`.
+
+    Args:
+        out: Binary file object receiving the document.
+        channels: List of channel dictionaries as read from ``channels.json``.
+        programmes: Deduplicated list of programmes.
+        tz: A timezone object used to format timestamps.
+    """
+    elements = _iter_elements(channels, programmes, tz)
+    first = next(elements, None)
+    if first is None:
+        # An empty document pretty-prints as a self-closing root element.
+        out.write(etree.tostring(etree.Element("tv", _root_attributes()), encoding="utf-8"))
+        out.write(b"\n")
+        return
+    with etree.xmlfile(out, encoding="utf-8") as xf:
+        with xf.element("tv", _root_attributes()):
+            xf.write("\n")
+            for element in itertools.chain([first], elements):
+                # Reproduce the indentation pretty_print would apply to a
+                # child of the root element.
+                etree.indent(element, space="  ", level=1)
+                element.tail = "\n"
+                xf.write("  ")
+                xf.write(element)
+    out.write(b"\n")
+
+
+def build_xmltv(channels: List[Dict], programmes: Sequence[ProgrammeLike], tz) -> bytes:
     """Construct an XMLTV document from channels and programmes.
 
     Channels and programmes are sorted deterministically to ensure stable
     output between runs. Programmes must already be deduplicated before
-    calling this function.
+    calling this function. Use :func:`write_xmltv` to write large guides to
+    disk without holding the document in memory.
 
     Args:
         channels: List of channel dictionaries as read from ``channels.json``.
-        programmes: List of programme dictionaries produced by providers.
+        programmes: List of programmes produced by providers. Dictionaries
+            with the same keys are accepted too.
         tz: A timezone object (e.g. from ``pytz.timezone('Europe/London')``)
             used to format timestamps.
 
     Returns:
         A byte string containing the pretty-printed XMLTV document.
     """
-    dt_format = "%Y%m%d%H%M%S %z"
-    root = etree.Element("tv")
-    root.set("generator-info-name", "freeview-epg")
-    root.set("generator-info-url", "https://github.com/dp247/Freeview-EPG")
+    buffer = io.BytesIO()
+    stream_xmltv(buffer, channels, programmes, tz)
+    return buffer.getvalue()
 
-    # Sort channels by their xmltv identifier for deterministic output
-    for ch in sorted(channels, key=lambda c: c.get("xmltv_id")):
-        channel_el = etree.SubElement(root, "channel")
-        channel_el.set("id", ch.get("xmltv_id"))
-        name_el = etree.SubElement(channel_el, "display-name")
-        name_el.set("lang", ch.get("lang"))
-        name_el.text = ch.get("name")
-        if ch.get("icon_url"):
-            icon_el = etree.SubElement(channel_el, "icon")
-            icon_el.set("src", ch.get("icon_url"))
-            icon_el.text = ""
-
-    # Sort programmes deterministically by channel, start time, stop time and title
-    for pr in sorted(
-        programmes,
-        key=lambda p: (
-            p.get("channel", ""),
-            p.get("start", 0),
-            p.get("stop", 0),
-            p.get("title", ""),
-        ),
-    ):
-        programme_el = etree.SubElement(root, "programme")
-        start_time = datetime.fromtimestamp(pr.get("start"), tz).strftime(dt_format)
-        end_time = datetime.fromtimestamp(pr.get("stop"), tz).strftime(dt_format)
-        programme_el.set("channel", pr.get("channel"))
-        programme_el.set("start", start_time)
-        programme_el.set("stop", end_time)
-
-        title_el = etree.SubElement(programme_el, "title")
-        title_el.set("lang", "en")
-        title_el.text = pr.get("title")
-
-        desc = pr.get("description")
-        if desc:
-            desc_el = etree.SubElement(programme_el, "desc")
-            desc_el.set("lang", "en")
-            desc_el.text = clean_text(desc)
-
-        icon = pr.get("icon")
-        if icon:
-            icon_el = etree.SubElement(programme_el, "icon")
-            icon_el.set("src", icon)
-
-        if pr.get("premiere"):
-            etree.SubElement(programme_el, "premiere")
-
-        season = _safe_int(pr.get("season"))
-        episode = _safe_int(pr.get("episode"))
-        if season and episode:
-            ep_ns = etree.SubElement(programme_el, "episode-num")
-            ep_ns.set("system", "xmltv_ns")
-            # xmltv_ns is zero-based
-            ep_ns.text = f"{season - 1}.{episode - 1}.0"
-            ep_os = etree.SubElement(programme_el, "episode-num")
-            ep_os.set("system", "onscreen")
-            ep_os.text = f"S{season}E{episode}"
-
-    # Return the pretty-printed XML string as bytes
-    return etree.tostring(root, pretty_print=True, encoding="utf-8")
-
-
-def write_atomic(path: str, data: bytes) -> None:
+
+# Compressed variants that can be written alongside an output file, keyed by
+# file extension.
+COMPRESSED_VARIANTS = ("gz", "xz")
+
+
+class _Tee:
+    """Binary file-like object duplicating every write to several files."""
+
+    def __init__(self, files: List[BinaryIO]) -> None:
+        self._files = files
+
+    def write(self, data: bytes) -> int:
+        for f in self._files:
+            f.write(data)
+        return len(data)
+
+
+def _compressor(ext: str, raw: BinaryIO, path: str) -> BinaryIO:
+    if ext == "gz":
+        # A zero mtime keeps the header, and therefore the whole file,
+        # identical whenever the content is unchanged.
+        return gzip.GzipFile(filename=path, mode="wb", fileobj=raw, compresslevel=9, mtime=0)
+    return lzma.LZMAFile(raw, mode="wb", preset=6)
+
+
+@contextlib.contextmanager
+def _atomic_output(path: str, compress: Sequence[str] = ()) -> Iterator[BinaryIO]:
+    """Open ``path`` and its compressed variants for one atomic write pass.
+
+    Yields a file object whose writes go to ``path`` and, compressed on the
+    fly, to ``path.<ext>`` for every extension in ``compress``. Every file is
+    written to a temporary path first and only renamed into place once all
+    of them are complete; on error the temporary files are removed.
+    """
+    unknown = set(compress) - set(COMPRESSED_VARIANTS)
+    if unknown:
+        raise ValueError(f"unsupported compression: {', '.join(sorted(unknown))}")
+    targets = [str(path)] + [f"{path}.{ext}" for ext in compress]
+    tmp_paths = [Path(f"{target}.tmp") for target in targets]
+    try:
+        with contextlib.ExitStack() as stack:
+            raws = [stack.enter_context(open(tmp, "wb")) for tmp in tmp_paths]
+            # Compressors are closed before the files beneath them, which
+            # flushes their trailers.
+            sinks = [raws[0]] + [
+                stack.enter_context(_compressor(ext, raw, target))
+                for ext, raw, target in zip(compress, raws[1:], targets[1:])
+            ]
+            yield _Tee(sinks)
+    except BaseException:
+        for tmp in tmp_paths:
+            tmp.unlink(missing_ok=True)
+        raise
+    for tmp, target in zip(tmp_paths, targets):
+        os.replace(tmp, target)
+
+
+def write_xmltv(
+    path: str,
+    channels: List[Dict],
+    programmes: Sequence[ProgrammeLike],
+    tz,
+    compress: Sequence[str] = (),
+) -> None:
+    """Stream an XMLTV document into ``path`` atomically.
+
+    The document is written to a temporary file next to ``path`` and renamed
+    into place once complete, as by :func:`write_atomic`. Compressed copies
+    are produced in the same pass rather than by re-reading the output.
+
+    Args:
+        path: The destination file path.
+        channels: List of channel dictionaries as read from ``channels.json``.
+        programmes: Deduplicated list of programmes.
+        tz: A timezone object used to format timestamps.
+        compress: Extensions from :data:`COMPRESSED_VARIANTS` to also write
+            as ``path.<ext>``, e.g. ``("gz",)``.
+    """
+    with _atomic_output(path, compress) as out:
+        stream_xmltv(out, channels, programmes, tz)
+
+
+def write_atomic(path: str, data: bytes, compress: Sequence[str] = ()) -> None:
     """Write data to a file atomically.
 
     Writes to a temporary file and then renames it into place. On POSIX
@@ -178,8 +319,8 @@ def write_atomic(path: str, data: bytes) -> None:
     Args:
         path: The destination file path.
         data: The data to write.
+        compress: Extensions from :data:`COMPRESSED_VARIANTS` to also write
+            as ``path.<ext>``.
     """
-    tmp_path = Path(f"{path}.tmp")
-    with open(tmp_path, "wb") as f:
-        f.write(data)
-    os.replace(tmp_path, path)
+    with _atomic_output(path, compress) as out:
+        out.write(data)
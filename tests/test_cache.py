@@ -0,0 +1,195 @@
+import re
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+requests = pytest.importorskip("requests")
+responses = pytest.importorskip("responses")
+
+from src.cache import BUILD_INTERVAL, DEFAULT_TTL_RULES, ResponseCache, TTLRule
+from src.http import make_session, tag_provider
+
+
+class _FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+NOW = datetime(2024, 1, 2, 12, tzinfo=timezone.utc).timestamp()
+SKY_RULE = TTLRule(r"epgsky\.com/schedule/(?P<date>\d{8})/", ttl=1000, near_ttl=10)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "cache" / "http.sqlite"
+        self.clock = _FakeClock(NOW)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _cache(self, **kwargs):
+        kwargs.setdefault("rules", [SKY_RULE])
+        return ResponseCache(self.path, clock=self.clock, **kwargs)
+
+    def test_ttl_depends_on_url_and_date(self):
+        cache = self._cache()
+
+        self.assertEqual(cache.ttl_for("https://epgsky.com/schedule/20240102/1"), 10)
+        self.assertEqual(cache.ttl_for("https://epgsky.com/schedule/20240103/1"), 10)
+        self.assertEqual(cache.ttl_for("https://epgsky.com/schedule/20240108/1"), 1000)
+        self.assertIsNone(cache.ttl_for("https://example.org/other"))
+        cache.close()
+
+    def test_default_ttls_outlast_the_build_interval(self):
+        cache = self._cache(rules=DEFAULT_TTL_RULES)
+        today = datetime.fromtimestamp(NOW, timezone.utc)
+
+        def schedule_urls(day):
+            date = today + timedelta(days=day)
+            midnight = date.replace(hour=0)
+            return [
+                f"https://awk.epgsky.com/hawk/linear/schedule/{date:%Y%m%d}/2002",
+                "https://www.radiotimes.com/api/broadcast/broadcast/channels/bbc1/schedule"
+                f"?from={date:%Y-%m-%d}T00:00:00.000Z&to=later",
+                "https://www.freeview.co.uk/api/tv-guide"
+                f"?nid=64257&start={int(midnight.timestamp())}",
+                "https://api.youview.tv/metadata/linear/v2/schedule/by-servicelocator"
+                f"?serviceLocator=dvb&interval={date:%Y-%m-%d}T12Z%2FPT12H",
+            ]
+
+        for url in schedule_urls(0) + schedule_urls(1):
+            self.assertLess(cache.ttl_for(url), BUILD_INTERVAL, url)
+        for url in schedule_urls(4):
+            self.assertGreaterEqual(cache.ttl_for(url), max(2 * BUILD_INTERVAL, 24 * 3600), url)
+
+        # A later day's schedule is reused by the next build but expires once
+        # its day becomes near.
+        far = schedule_urls(2)[0]
+        cache.put("GET", far, 200, {}, b"{}")
+        self.clock.now += BUILD_INTERVAL - 60
+        self.assertIsNotNone(cache.get("GET", far))
+        self.clock.now = datetime(2024, 1, 3, tzinfo=timezone.utc).timestamp()
+        self.assertIsNone(cache.get("GET", far))
+        cache.close()
+
+    def test_workflow_keeps_the_cache_between_builds(self):
+        workflow = Path(__file__).resolve().parents[1] / ".github" / "workflows" / "build_epg.yml"
+        text = workflow.read_text(encoding="utf-8")
+        hours = re.search(r"cron: '0 \*/(\d+) \* \* \*'", text)
+        self.assertIsNotNone(hours)
+        self.assertEqual(int(hours.group(1)) * 3600, BUILD_INTERVAL)
+        self.assertIn("key: http-cache-${{ github.run_id }}", text)
+        self.assertRegex(text, r"restore-keys: \|\s+http-cache-")
+
+    def test_entries_expire_and_persist_between_runs(self):
+        url = "https://epgsky.com/schedule/20240108/1"
+        cache = self._cache()
+        self.assertTrue(cache.put("GET", url, 200, {"Content-Type": "application/json"}, b"{}"))
+        self.assertFalse(cache.put("GET", url + "x", 500, {}, b"error"))
+        self.assertFalse(cache.put("POST", url, 200, {}, b"{}"))
+        cache.close()
+
+        cache = self._cache()
+        self.assertEqual(cache.get("GET", url).content, b"{}")
+        self.clock.now += 1001
+        self.assertIsNone(cache.get("GET", url))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self._cache(max_bytes=250)
+        urls = [f"https://epgsky.com/schedule/20240108/{n}" for n in range(3)]
+        for url in urls[:2]:
+            cache.put("GET", url, 200, {}, b"x" * 100)
+            self.clock.now += 1
+        # Touch the oldest entry so that the second one is evicted instead.
+        cache.get("GET", urls[0])
+        self.clock.now += 1
+        cache.put("GET", urls[2], 200, {}, b"x" * 100)
+
+        self.assertIsNotNone(cache.get("GET", urls[0]))
+        self.assertIsNone(cache.get("GET", urls[1]))
+        self.assertIsNotNone(cache.get("GET", urls[2]))
+        self.assertEqual(cache.total_bytes, 200)
+
+        cache.clear()
+        self.assertEqual(cache.total_bytes, 0)
+        cache.close()
+
+    @responses.activate
+    def test_session_serves_repeat_requests_from_cache(self):
+        url = "https://epgsky.com/schedule/20240108/1"
+        responses.get(url, json={"schedule": []})
+        cache = self._cache()
+        session = make_session(cache=cache)
+
+        first = session.get(url)
+        second = session.get(url)
+
+        self.assertEqual(first.json(), {"schedule": []})
+        self.assertEqual(second.json(), {"schedule": []})
+        self.assertTrue(getattr(second, "from_cache", False))
+        self.assertEqual(len(responses.calls), 1)
+        cache.close()
+
+    @responses.activate
+    def test_expired_entries_are_revalidated(self):
+        url = "https://epgsky.com/schedule/20240108/1"
+        responses.get(url, json={"schedule": []}, headers={"ETag": '"v1"'})
+        responses.get(
+            url,
+            status=304,
+            headers={"ETag": '"v2"'},
+            match=[responses.matchers.header_matcher({"If-None-Match": '"v1"'})],
+        )
+        cache = self._cache()
+        session = make_session(cache=cache)
+
+        with tag_provider("sky"):
+            session.get(url)
+            self.clock.now += 1001
+            second = session.get(url)
+            # The renewed entry is fresh again and needs no request at all.
+            third = session.get(url)
+
+        self.assertTrue(second.revalidated)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), {"schedule": []})
+        self.assertEqual(cache.lookup("GET", url).validators(), {"If-None-Match": '"v2"'})
+        self.assertTrue(third.from_cache)
+        self.assertEqual(len(responses.calls), 2)
+        stats = cache.stats()["sky"]
+        self.assertEqual((stats.hits, stats.revalidated, stats.transferred), (1, 1, 1))
+        cache.close()
+
+    @responses.activate
+    def test_changed_responses_are_transferred_again(self):
+        url = "https://epgsky.com/schedule/20240108/1"
+        responses.get(url, json={"v": 1}, headers={"Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        responses.get(url, json={"v": 2})
+        cache = self._cache()
+        session = make_session(cache=cache)
+
+        session.get(url)
+        self.clock.now += 1001
+        second = session.get(url)
+
+        self.assertEqual(
+            responses.calls[1].request.headers["If-Modified-Since"],
+            "Mon, 01 Jan 2024 00:00:00 GMT",
+        )
+        self.assertEqual(second.json(), {"v": 2})
+        self.assertEqual(cache.get("GET", url).content, b'{"v": 2}')
+        self.assertEqual(cache.stats()["other"].transferred, 2)
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+import pytest
+
+requests = pytest.importorskip("requests")
+responses = pytest.importorskip("responses")
+
+from src.cassette import RECORD, REPLAY, Cassette
+from src.http import AsyncSession, make_session
+
+SCHEDULE_URL = "https://epgsky.com/schedule/20240108/1"
+REGION_URL = "https://www.freesat.co.uk/tv-guide/api/"
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @responses.activate
+    def test_recorded_exchanges_are_replayed_without_the_network(self):
+        responses.get(SCHEDULE_URL, json={"v": 1})
+        responses.get(SCHEDULE_URL, json={"v": 2})
+        responses.post(REGION_URL, body=b"\xff\x00region", status=201)
+        responses.get(SCHEDULE_URL + "/missing", status=404)
+        recorder = Cassette(self.tmp.name, RECORD)
+        session = make_session(cassette=recorder)
+        session.get(SCHEDULE_URL)
+        session.get(SCHEDULE_URL)
+        session.post(REGION_URL, data="SW1A 1AA")
+        session.get(SCHEDULE_URL + "/missing")
+        recorder.close()
+        self.assertEqual(recorder.recorded, 4)
+
+        responses.reset()
+        player = Cassette(self.tmp.name, REPLAY, latency=False)
+        session = make_session(cassette=player)
+
+        # Repeated requests get their responses in order, then the last one.
+        self.assertEqual(session.get(SCHEDULE_URL).json(), {"v": 1})
+        self.assertEqual(session.get(SCHEDULE_URL).json(), {"v": 2})
+        self.assertEqual(session.get(SCHEDULE_URL).json(), {"v": 2})
+        region = session.post(REGION_URL, data="SW1A 1AA")
+        self.assertEqual((region.status_code, region.content), (201, b"\xff\x00region"))
+        self.assertEqual(session.get(SCHEDULE_URL + "/missing").status_code, 404)
+        # Bodies are part of the request's identity.
+        with self.assertRaises(requests.ConnectionError):
+            session.post(REGION_URL, data="EC1A 1BB")
+        self.assertEqual(len(responses.calls), 0)
+        self.assertEqual((player.replayed, player.missed), (5, 1))
+
+    def _recorded(self, elapsed):
+        recorder = Cassette(self.tmp.name, RECORD)
+        recorder.record("GET", SCHEDULE_URL, None, 200, "OK", {}, b'{"v": 1}', elapsed)
+        recorder.close()
+
+    def test_recorded_latency_is_preserved_or_zeroed(self):
+        self._recorded(0.25)
+        for latency, expected in ((True, 0.25), (False, 0.0)):
+            session = make_session(cassette=Cassette(self.tmp.name, REPLAY, latency=latency))
+            with mock.patch("src.http.time.sleep") as sleep:
+                response = session.get(SCHEDULE_URL)
+            sleep.assert_called_once_with(expected)
+            self.assertTrue(response.replayed)
+
+    def test_async_session_replays(self):
+        pytest.importorskip("aiohttp")
+        self._recorded(0.0)
+        cassette = Cassette(self.tmp.name, REPLAY)
+
+        async def fetch():
+            async with AsyncSession(cassette=cassette) as session:
+                return await session.get_json(SCHEDULE_URL)
+
+        self.assertEqual(asyncio.run(fetch()), {"v": 1})
+        self.assertEqual(cassette.replayed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
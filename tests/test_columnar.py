@@ -0,0 +1,104 @@
+import random
+import unittest
+from operator import attrgetter
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.columnar import ProgrammeStore, dedupe_and_sort
+from src.dedupe import dedupe_programmes, dedupe_sorted
+from src.programme import Programme
+
+
+def _random_programmes(count, seed=0):
+    rng = random.Random(seed)
+    titles = [None, "News", "Weather", "Film", "Quiz"]
+    return [
+        Programme(
+            channel=f"ch{rng.randrange(20)}",
+            start=1_700_000_000 + 1800 * rng.randrange(50),
+            stop=1_700_000_000 + 1800 * rng.randrange(50, 60),
+            title=rng.choice(titles),
+            description=str(index),
+        )
+        for index in range(count)
+    ]
+
+
+def _python_path(programmes):
+    def key(p):
+        return (p.channel, p.start, p.stop, p.title is not None, p.title or "")
+
+    return sorted(dedupe_programmes(programmes), key=key)
+
+
+class TestProgrammeStore(unittest.TestCase):
+    def test_matches_python_dedupe_and_sort(self):
+        programmes = _random_programmes(5000)
+
+        result = dedupe_and_sort(programmes)
+
+        self.assertEqual(
+            [p.description for p in result],
+            [p.description for p in _python_path(programmes)],
+        )
+
+    def test_last_occurrence_is_kept_and_records_are_reused(self):
+        first = Programme(channel="a", start=1, stop=2, title="Show", description="first")
+        last = Programme(channel="a", start=1, stop=3, title="Show", description="last")
+        other = Programme(channel="a", start=0, stop=1, title="Other")
+
+        result = dedupe_and_sort([first, other, last])
+
+        self.assertEqual(result, [other, last])
+        self.assertIs(result[1], last)
+
+    def test_chunks_can_be_appended(self):
+        programmes = _random_programmes(3000, seed=1)
+        store = ProgrammeStore()
+        for index in range(0, len(programmes), 700):
+            store.extend(programmes[index : index + 700])
+
+        self.assertEqual(len(store), len(programmes))
+        self.assertEqual(
+            store.deduped().sorted().to_programmes(),
+            dedupe_and_sort(programmes),
+        )
+
+    def test_dictionaries_are_converted(self):
+        result = dedupe_and_sort([{"channel": "a", "start": 1, "stop": 2, "title": "Show"}])
+
+        self.assertEqual(result, [Programme(channel="a", start=1, stop=2, title="Show")])
+
+    def test_empty_input(self):
+        self.assertEqual(dedupe_and_sort([]), [])
+        self.assertEqual(ProgrammeStore().sorted().to_programmes(), [])
+
+
+class TestDedupeSorted(unittest.TestCase):
+    def test_both_paths_agree(self):
+        programmes = [p for p in _random_programmes(2000, seed=2) if p.title is not None]
+
+        columnar = dedupe_sorted(programmes, threshold=0)
+        python = dedupe_sorted(programmes, threshold=len(programmes) + 1)
+
+        self.assertEqual(columnar, python)
+        self.assertEqual(python, sorted(python, key=attrgetter("channel", "start", "stop", "title")))
+
+    def test_fractional_timestamps_do_not_depend_on_the_threshold(self):
+        programmes = [
+            Programme(channel="a", start=100.75, stop=200.5, title="Show", description="late"),
+            Programme(channel="a", start=100.25, stop=200.5, title="Show", description="early"),
+            Programme(channel="a", start=100.25, stop=200.25, title="Show", description="again"),
+        ]
+
+        columnar = dedupe_sorted(programmes, threshold=0)
+        python = dedupe_sorted(programmes, threshold=len(programmes) + 1)
+
+        self.assertEqual(columnar, python)
+        self.assertEqual([p.description for p in columnar], ["again", "late"])
+
+
+if __name__ == "__main__":
+    unittest.main()
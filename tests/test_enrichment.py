@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from src.enrichment import MISSING, EnrichmentStore, is_permanent_failure
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEnrichmentStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "enrichment.sqlite"
+        self.clock = _FakeClock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _store(self):
+        return EnrichmentStore(
+            self.path, ttls={"rt": 100}, default_ttl=50, negative_ttl=10, clock=self.clock
+        )
+
+    def test_values_persist_until_their_provider_ttl(self):
+        store = self._store()
+        store.put("rt", "ep-1", {"description": "Details"})
+        store.put("yv", "ep-1", {"title": "Other provider"})
+        store.close()
+
+        store = self._store()
+        self.assertEqual(store.get("rt", "ep-1"), {"description": "Details"})
+        self.clock.now += 60
+        self.assertIs(store.get("yv", "ep-1"), MISSING)
+        self.assertEqual(store.get("rt", "ep-1"), {"description": "Details"})
+        self.clock.now += 50
+        self.assertIs(store.get("rt", "ep-1"), MISSING)
+        self.assertEqual(store.stats()["rt"].hits, 2)
+        store.close()
+
+    def test_negative_entries_expire_sooner_and_compaction_drops_them(self):
+        store = self._store()
+        store.put("rt", "gone", None)
+        store.put("rt", "kept", {"description": "x"})
+
+        self.assertIsNone(store.get("rt", "gone"))
+        self.clock.now += 11
+        self.assertIs(store.get("rt", "gone"), MISSING)
+
+        self.assertEqual(store.compact(), 1)
+        self.assertEqual(len(store), 1)
+        store.close()
+
+    def test_only_client_errors_are_permanent(self):
+        def _error(status):
+            return SimpleNamespace(response=SimpleNamespace(status_code=status))
+
+        self.assertTrue(is_permanent_failure(_error(404)))
+        self.assertFalse(is_permanent_failure(_error(429)))
+        self.assertFalse(is_permanent_failure(_error(503)))
+        self.assertFalse(is_permanent_failure(TimeoutError()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,289 @@
+import asyncio
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from src.details import Schedule
+from src.executor import fetch_channels, fetch_channels_async
+
+
+class _ConcurrencyProbe:
+    """Fake fetcher recording the peak number of concurrent calls."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, channel, ctx):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        # Finish later channels first to shuffle completion order.
+        time.sleep(self.delay / (1 + channel["n"]))
+        with self.lock:
+            self.active -= 1
+        return [{"channel": channel["xmltv_id"], "start": channel["n"], "title": "x"}]
+
+
+def _provider(fetch, fetch_async=None):
+    if fetch_async is None:
+        return SimpleNamespace(fetch_programmes=fetch)
+    return SimpleNamespace(fetch_programmes=fetch, fetch_programmes_async=fetch_async)
+
+
+class _Resolver:
+    """Fake provider with a detail resolver; each channel lists two shows."""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def _record(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def fetch_schedule(self, channel, ctx):
+        if channel["n"] == 2:
+            raise RuntimeError("schedule down")
+        self._record(("schedule", channel["n"]))
+        shows = ["shared", f"own{channel['n']}"]
+        return Schedule(shows, {show: f"request-{show}" for show in shows})
+
+    def resolve_details(self, key, request, ctx):
+        self._record(("details", key))
+        return request.upper()
+
+    def assemble_programmes(self, channel, schedule, details, ctx):
+        return [
+            {"channel": channel["xmltv_id"], "title": show, "desc": details[show]}
+            for show in schedule.items
+        ]
+
+    fetch_programmes = None
+
+
+class TestFetchChannels(unittest.TestCase):
+    def test_results_are_in_channel_order(self):
+        channels = [
+            {"src": "a", "xmltv_id": f"ch{n}", "name": f"ch{n}", "n": n} for n in range(12)
+        ]
+        probe = _ConcurrencyProbe()
+
+        programmes = fetch_channels(channels, None, {"a": _provider(probe)}, workers=6)
+
+        self.assertEqual([p["channel"] for p in programmes], [f"ch{n}" for n in range(12)])
+        self.assertGreater(probe.peak, 1)
+
+    def test_failing_channel_is_isolated(self):
+        def boom(channel, ctx):
+            raise RuntimeError("upstream down")
+
+        channels = [
+            {"src": "ok", "xmltv_id": "first", "name": "first", "n": 0},
+            {"src": "bad", "xmltv_id": "broken", "name": "broken", "n": 1},
+            {"src": "unknown", "xmltv_id": "skipped", "name": "skipped", "n": 2},
+            {"src": "ok", "xmltv_id": "last", "name": "last", "n": 3},
+        ]
+        probe = _ConcurrencyProbe(delay=0)
+
+        with self.assertLogs(level="WARNING"):
+            programmes = fetch_channels(
+                channels, None, {"ok": _provider(probe), "bad": _provider(boom)}, workers=4
+            )
+
+        self.assertEqual([p["channel"] for p in programmes], ["first", "last"])
+
+    def test_provider_limit_caps_concurrency(self):
+        capped = _ConcurrencyProbe()
+        free = _ConcurrencyProbe()
+        channels = [
+            {"src": src, "xmltv_id": f"{src}{n}", "name": f"{src}{n}", "n": n}
+            for n in range(6)
+            for src in ("capped", "free")
+        ]
+
+        fetch_channels(
+            channels,
+            None,
+            {"capped": _provider(capped), "free": _provider(free)},
+            workers=6,
+            provider_limits={"capped": 1},
+        )
+
+        self.assertEqual(capped.peak, 1)
+        self.assertGreater(free.peak, 1)
+
+    def test_prefetch_runs_before_the_providers_channels(self):
+        events = []
+
+        def prefetch(channels, ctx):
+            time.sleep(0.02)
+            events.append(("prefetch", [ch["n"] for ch in channels]))
+
+        def fetch(channel, ctx):
+            events.append(("fetch", channel["n"]))
+            return [{"channel": channel["xmltv_id"]}]
+
+        batched = SimpleNamespace(fetch_programmes=fetch, prefetch=prefetch)
+        channels = [{"src": "b", "xmltv_id": f"ch{n}", "name": f"ch{n}", "n": n} for n in range(4)]
+
+        programmes = fetch_channels(channels, None, {"b": batched}, workers=4)
+
+        self.assertEqual(events[0], ("prefetch", [0, 1, 2, 3]))
+        self.assertEqual(sorted(events[1:]), [("fetch", n) for n in range(4)])
+        self.assertEqual(len(programmes), 4)
+
+    def test_failing_prefetch_falls_back_to_channel_fetches(self):
+        def prefetch(channels, ctx):
+            raise RuntimeError("batch endpoint down")
+
+        probe = _ConcurrencyProbe(delay=0)
+        batched = SimpleNamespace(fetch_programmes=probe, prefetch=prefetch)
+        channels = [{"src": "b", "xmltv_id": f"ch{n}", "name": f"ch{n}", "n": n} for n in range(3)]
+
+        with self.assertLogs(level="ERROR"):
+            programmes = fetch_channels(channels, None, {"b": batched}, workers=2)
+
+        self.assertEqual([p["channel"] for p in programmes], ["ch0", "ch1", "ch2"])
+
+    def test_detail_lookups_are_shared_across_channels(self):
+        resolver = _Resolver()
+        channels = [{"src": "d", "xmltv_id": f"ch{n}", "name": f"ch{n}", "n": n} for n in range(4)]
+
+        with self.assertLogs(level="ERROR"):
+            programmes = fetch_channels(channels, None, {"d": resolver}, workers=3)
+
+        kinds = [kind for kind, _ in resolver.events]
+        self.assertEqual(kinds, ["schedule"] * 3 + ["details"] * 4)
+        self.assertEqual(
+            sorted(key for kind, key in resolver.events if kind == "details"),
+            ["own0", "own1", "own3", "shared"],
+        )
+        self.assertEqual(
+            [(p["channel"], p["desc"]) for p in programmes],
+            [
+                ("ch0", "REQUEST-SHARED"),
+                ("ch0", "REQUEST-OWN0"),
+                ("ch1", "REQUEST-SHARED"),
+                ("ch1", "REQUEST-OWN1"),
+                ("ch3", "REQUEST-SHARED"),
+                ("ch3", "REQUEST-OWN3"),
+            ],
+        )
+
+    def test_channels_are_reported_when_started_and_transformed(self):
+        events = []
+
+        def transform(channel, programmes):
+            events.append(("done", channel["xmltv_id"], len(programmes)))
+            return [dict(p, transformed=True) for p in programmes]
+
+        def on_start(channel):
+            events.append(("start", channel["xmltv_id"]))
+
+        channels = [
+            {"src": "a", "xmltv_id": "ch0", "name": "ch0", "n": 0},
+            {"src": "d", "xmltv_id": "ch1", "name": "ch1", "n": 1},
+            {"src": "a", "xmltv_id": "ch3", "name": "ch3", "n": 3},
+        ]
+        providers = {"a": _provider(_ConcurrencyProbe(delay=0)), "d": _Resolver()}
+        hooks = dict(transform=transform, on_start=on_start)
+
+        for run in (
+            lambda: fetch_channels(channels, None, providers, **hooks),
+            lambda: asyncio.run(fetch_channels_async(channels, None, providers, **hooks)),
+        ):
+            events.clear()
+            programmes = run()
+
+            self.assertEqual(
+                sorted(events),
+                [("done", "ch0", 1), ("done", "ch1", 2), ("done", "ch3", 1)]
+                + [("start", "ch0"), ("start", "ch1"), ("start", "ch3")],
+            )
+            for channel in ("ch0", "ch1", "ch3"):
+                started = events.index(("start", channel))
+                self.assertTrue(any(e[:2] == ("done", channel) for e in events[started:]))
+            self.assertEqual([p["channel"] for p in programmes], ["ch0", "ch1", "ch1", "ch3"])
+            self.assertTrue(all(p["transformed"] for p in programmes))
+
+
+class TestFetchChannelsAsync(unittest.TestCase):
+    def test_async_providers_with_sync_fallback(self):
+        async def fetch_async(channel, ctx):
+            # Finish later channels first to shuffle completion order.
+            await asyncio.sleep(0.01 / (1 + channel["n"]))
+            if channel["n"] == 3:
+                raise RuntimeError("upstream down")
+            return [{"channel": channel["xmltv_id"], "via": "async"}]
+
+        def fetch_sync(channel, ctx):
+            return [{"channel": channel["xmltv_id"], "via": "sync"}]
+
+        def not_called(channel, ctx):
+            raise AssertionError("sync fetch used despite async implementation")
+
+        channels = [
+            {"src": "a" if n % 2 else "s", "xmltv_id": f"ch{n}", "name": f"ch{n}", "n": n}
+            for n in range(6)
+        ]
+        providers = {"a": _provider(not_called, fetch_async), "s": _provider(fetch_sync)}
+
+        with self.assertLogs(level="ERROR"):
+            programmes = asyncio.run(
+                fetch_channels_async(channels, None, providers, workers=2)
+            )
+
+        self.assertEqual(
+            [(p["channel"], p["via"]) for p in programmes],
+            [
+                ("ch0", "sync"),
+                ("ch1", "async"),
+                ("ch2", "sync"),
+                ("ch4", "sync"),
+                ("ch5", "async"),
+            ],
+        )
+
+    def test_async_prefetch_runs_before_the_providers_channels(self):
+        events = []
+
+        async def prefetch_async(channels, ctx):
+            await asyncio.sleep(0.01)
+            events.append("prefetch")
+
+        async def fetch_async(channel, ctx):
+            events.append("fetch")
+            return [{"channel": channel["xmltv_id"]}]
+
+        batched = SimpleNamespace(
+            fetch_programmes=None, fetch_programmes_async=fetch_async, prefetch_async=prefetch_async
+        )
+        channels = [{"src": "b", "xmltv_id": f"ch{n}", "name": f"ch{n}", "n": n} for n in range(3)]
+
+        programmes = asyncio.run(fetch_channels_async(channels, None, {"b": batched}))
+
+        self.assertEqual(events, ["prefetch", "fetch", "fetch", "fetch"])
+        self.assertEqual(len(programmes), 3)
+
+    def test_async_detail_lookups_are_shared_across_channels(self):
+        resolver = _Resolver()
+        channels = [{"src": "d", "xmltv_id": f"ch{n}", "name": f"ch{n}", "n": n} for n in range(4)]
+
+        with self.assertLogs(level="ERROR"):
+            programmes = asyncio.run(
+                fetch_channels_async(channels, None, {"d": resolver}, workers=3)
+            )
+
+        kinds = [kind for kind, _ in resolver.events]
+        self.assertEqual(kinds, ["schedule"] * 3 + ["details"] * 4)
+        self.assertEqual(
+            [p["channel"] for p in programmes], ["ch0", "ch0", "ch1", "ch1", "ch3", "ch3"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
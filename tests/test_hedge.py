@@ -0,0 +1,136 @@
+import threading
+import unittest
+from datetime import timezone
+
+from src.hedge import Hedger, LatencyTracker
+from src.programme import Programme
+from src.providers.base import Context
+from src.sources import fetch_sources
+
+
+def _programmes(channel):
+    return [Programme(channel=channel["xmltv_id"], start=0, stop=60, title=channel["src"])]
+
+
+class TestLatencyTracker(unittest.TestCase):
+    def test_default_until_enough_samples(self):
+        tracker = LatencyTracker(percentile=50, default=7.0, min_samples=3)
+        tracker.record("sky", 1.0)
+        tracker.record("sky", 3.0)
+
+        self.assertEqual(tracker.threshold("sky"), 7.0)
+        tracker.record("sky", 2.0)
+        self.assertEqual(tracker.threshold("sky"), 2.0)
+        self.assertEqual(tracker.threshold("rt"), 7.0)
+
+    def test_nearest_rank_percentile(self):
+        tracker = LatencyTracker(percentile=95, min_samples=1)
+        for seconds in range(1, 21):
+            tracker.record("sky", float(seconds))
+
+        self.assertEqual(tracker.threshold("sky"), 19.0)
+
+
+class TestHedger(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.batches = []
+        self.finished = []
+        self.lock = threading.Lock()
+        self.ctx = Context(session=None, tz=timezone.utc, days=0)
+
+    def tearDown(self):
+        self.release.set()
+
+    def fetch(self, channels, ctx, on_start=None, on_result=None):
+        batch = [(channel["xmltv_id"], channel["src"]) for channel in channels]
+        with self.lock:
+            self.batches.append(batch)
+        programmes = []
+        for channel in channels:
+            if on_start is not None:
+                on_start(channel)
+            if channel.get("stall"):
+                self.release.wait(5)
+            ch_programmes = [] if channel.get("fail") else _programmes(channel)
+            if on_result is not None:
+                on_result(channel, ch_programmes)
+            programmes.extend(ch_programmes)
+        with self.lock:
+            self.finished.extend(batch)
+        return programmes
+
+    def test_slow_primary_is_hedged(self):
+        hedger = Hedger(4, LatencyTracker(default=0.05))
+        pairs = [
+            ({"xmltv_id": "a", "src": "sky", "stall": True}, {"xmltv_id": "a", "src": "rt"}),
+            ({"xmltv_id": "b", "src": "yv"}, {"xmltv_id": "b", "src": "rt"}),
+        ]
+
+        programmes = hedger.fetch(pairs, self.ctx, self.fetch)
+
+        self.assertEqual([(p.channel, p.title) for p in programmes], [("a", "rt"), ("b", "yv")])
+        self.assertNotIn([("b", "rt")], self.batches)
+        stats = hedger.stats()["sky"]
+        self.assertEqual(
+            (stats.fetches, stats.hedged, stats.alternate_wins, stats.abandoned), (1, 1, 1, 1)
+        )
+        # The losing fetch is joined before the resources it uses go away.
+        self.assertNotIn(("a", "sky"), self.finished)
+        self.release.set()
+        hedger.close()
+        self.assertIn(("a", "sky"), self.finished)
+
+    def test_only_slow_channels_are_hedged_after_the_learned_delay(self):
+        # The default delay outlasts the stall: the alternate can only win
+        # with the delay learned from the fast channel.
+        hedger = Hedger(4, LatencyTracker(default=60.0, min_samples=1))
+        pairs = [
+            ({"xmltv_id": "a", "src": "sky"}, {"xmltv_id": "a", "src": "rt"}),
+            ({"xmltv_id": "b", "src": "sky", "stall": True}, {"xmltv_id": "b", "src": "rt"}),
+        ]
+
+        programmes = hedger.fetch(pairs, self.ctx, self.fetch)
+
+        self.assertEqual([(p.channel, p.title) for p in programmes], [("a", "sky"), ("b", "rt")])
+        self.assertEqual(self.batches, [[("a", "sky"), ("b", "sky")], [("b", "rt")]])
+        stats = hedger.stats()["sky"]
+        self.assertEqual(
+            (stats.fetches, stats.hedged, stats.alternate_wins, stats.abandoned), (2, 1, 1, 1)
+        )
+        self.assertLess(stats.delay, 5)
+
+    def test_channels_of_a_provider_are_fetched_together(self):
+        hedger = Hedger(2, LatencyTracker(default=5.0))
+        pairs = [
+            ({"xmltv_id": "a", "src": "sky"}, {"xmltv_id": "a", "src": "rt"}),
+            ({"xmltv_id": "b", "src": "sky", "fail": True}, {"xmltv_id": "b", "src": "yv"}),
+        ]
+
+        programmes = hedger.fetch(pairs, self.ctx, self.fetch)
+
+        # Only the channel the primary returned nothing for is hedged.
+        self.assertEqual([(p.channel, p.title) for p in programmes], [("a", "sky"), ("b", "yv")])
+        self.assertEqual(sorted(self.batches), [[("a", "sky"), ("b", "sky")], [("b", "yv")]])
+        self.assertEqual(hedger.stats()["sky"].alternate_wins, 1)
+
+    def test_fetch_sources_hedges_multi_source_channels(self):
+        hedger = Hedger(4, LatencyTracker(default=0.05))
+        channels = [
+            {"xmltv_id": "a", "sources": [{"src": "sky", "stall": True}, {"src": "rt"}]},
+            {"xmltv_id": "b", "src": "sky"},
+        ]
+
+        def fetch(tier, ctx, **hooks):
+            return [p for channel in tier for p in self.fetch([channel], ctx, **hooks)]
+
+        ctx = Context(session=None, tz=timezone.utc, days=0)
+        programmes = fetch_sources(channels, ctx, fetch, hedger=hedger)
+
+        self.assertEqual(
+            sorted((p.channel, p.title) for p in programmes), [("a", "rt"), ("b", "sky")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+pytz = pytest.importorskip("pytz")
+etree = pytest.importorskip("lxml.etree")
+
+from src.incremental import days_to_refresh, load_programmes, merge_programmes
+from src.programme import Programme
+from src.xmltv import build_xmltv
+
+NOW = datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+DAY = 24 * 60 * 60
+# Midnight UTC on the day of NOW.
+TODAY = int(datetime(2024, 1, 2, tzinfo=timezone.utc).timestamp())
+
+
+def _programme(channel, start, stop, title):
+    return {"channel": channel, "start": start, "stop": stop, "title": title}
+
+
+class TestLoadProgrammes(unittest.TestCase):
+    def test_round_trips_build_xmltv_output(self):
+        tz = pytz.timezone("Europe/London")
+        channels = [{"xmltv_id": "a", "name": "Alpha", "lang": "en"}]
+        programmes = [
+            {
+                "channel": "a",
+                "start": TODAY,
+                "stop": TODAY + 1800,
+                "title": "News",
+                "description": "Headlines",
+                "icon": "http://img/news.png",
+                "premiere": True,
+                "season": 2,
+                "episode": 3,
+            },
+            {
+                "channel": "a",
+                "start": TODAY + 1800,
+                "stop": TODAY + 3600,
+                "title": "Film",
+                "description": None,
+                "icon": None,
+                "premiere": False,
+                "season": None,
+                "episode": None,
+            },
+        ]
+        xml = build_xmltv(channels, programmes, tz=tz)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "epg.xml"
+            path.write_bytes(xml)
+            loaded = load_programmes(path)
+
+        self.assertEqual(loaded, [Programme.from_dict(p) for p in programmes])
+        self.assertEqual(build_xmltv(channels, loaded, tz=tz), xml)
+
+    def test_missing_file_yields_no_programmes(self):
+        self.assertEqual(load_programmes("/nonexistent/epg.xml"), [])
+
+
+class TestIncrementalPlan(unittest.TestCase):
+    def test_refreshes_first_days_and_uncovered_tail(self):
+        previous = [
+            _programme("a", TODAY, TODAY + 6 * DAY, "Long"),
+            _programme("b", TODAY, TODAY + 5 * DAY + 3600, "Shorter"),
+            _programme("c", TODAY, TODAY + 3600, "Short"),
+        ]
+
+        days = days_to_refresh(["a", "b", "c", "empty"], previous, days=7, now=NOW)
+
+        # A channel with a short guide only refetches its own missing days.
+        self.assertEqual(days["a"], [0, 1, 6])
+        self.assertEqual(days["b"], [0, 1, 5, 6])
+        self.assertEqual(days["c"], [0, 1, 2, 3, 4, 5, 6])
+        self.assertEqual(days["empty"], [0, 1, 2, 3, 4, 5, 6])
+
+    def test_fresh_programmes_replace_overlapping_previous_ones(self):
+        previous = [
+            _programme("a", TODAY - 3600, TODAY, "Yesterday"),
+            _programme("a", TODAY, TODAY + 3600, "Old schedule"),
+            _programme("a", TODAY + 3 * DAY, TODAY + 3 * DAY + 3600, "Kept"),
+            _programme("gone", TODAY, TODAY + 3600, "Removed channel"),
+        ]
+        fresh = [
+            _programme("a", TODAY, TODAY + 1800, "New"),
+            _programme("a", TODAY + 1800, TODAY + 3600, "Schedule"),
+        ]
+
+        merged = merge_programmes(previous, fresh, ["a"], now=NOW)
+
+        self.assertEqual([p["title"] for p in merged], ["Kept", "New", "Schedule"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from src.dedupe import dedupe_programmes
+from src.programme import Programme, as_programmes
+
+
+class TestProgramme(unittest.TestCase):
+    def test_instances_have_no_per_instance_dict(self):
+        programme = Programme(channel="a", start=1, stop=2, title="Show")
+
+        self.assertFalse(hasattr(programme, "__dict__"))
+        with self.assertRaises(AttributeError):
+            programme.subtitle = "Not a field"
+
+    def test_dictionaries_from_older_providers_are_converted(self):
+        data = {"channel": "a", "start": 1, "stop": 2, "title": "Show", "extra": "dropped"}
+        programme = Programme(channel="a", start=1, stop=2, title="Show")
+
+        converted = as_programmes([data, programme])
+
+        self.assertEqual(converted[0], programme)
+        self.assertIs(converted[1], programme)
+        self.assertFalse(converted[0].premiere)
+
+    def test_fields_can_be_read_like_a_dictionary(self):
+        programme = Programme(channel="a", start=1, stop=2, title="Show", season=3)
+
+        self.assertEqual(programme["title"], "Show")
+        self.assertEqual(programme.get("season"), 3)
+        self.assertEqual(programme.get("extra", "default"), "default")
+        with self.assertRaises(KeyError):
+            programme["extra"]
+
+    def test_dedupe_accepts_mixed_input(self):
+        programmes = [
+            Programme(channel="a", start=1, stop=2, title="Show", description="first"),
+            {"channel": "a", "start": 1, "stop": 2, "title": "Show", "description": "last"},
+        ]
+
+        deduped = dedupe_programmes(programmes)
+
+        self.assertEqual([p.description for p in deduped], ["last"])
+        self.assertIsInstance(deduped[0], Programme)
+
+
+if __name__ == "__main__":
+    unittest.main()
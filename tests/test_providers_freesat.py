@@ -52,3 +52,33 @@ def test_freesat_fetch_programmes_builds_output():
         == "https://fdp-sv15-image-v1-0.gcprod1.freetime-platform.net/270x180-0/image.png"
     )
     assert programme["channel"] == "freesat.test"
+
+
+@responses.activate
+def test_freesat_region_handshake_is_made_once_per_postcode():
+    from src.executor import fetch_channels
+    from src.providers import freesat
+
+    responses.post("https://www.freesat.co.uk/tv-guide/api/region", status=200)
+    responses.get("https://www.freesat.co.uk/tv-guide/api", status=200)
+    for day in range(3):
+        responses.get(
+            f"https://www.freesat.co.uk/tv-guide/api/{day}",
+            json=[{"event": [{"name": f"Day {day}", "startTime": day * 100, "duration": 60}]}],
+        )
+    ctx = Context(session=requests.Session(), tz=pytz.UTC, days=3, caches={})
+    channels = [
+        {"src": "freesat", "provider_id": str(n), "xmltv_id": f"fs{n}", "postcode": postcode}
+        for n, postcode in enumerate(["AB1 2CD", "AB1 2CD", "AB1 2CD", "EF3 4GH"])
+    ]
+
+    programmes = fetch_channels(channels, ctx, {"freesat": freesat}, workers=4)
+
+    region_calls = [c for c in responses.calls if c.request.method == "POST"]
+    assert sorted(c.request.body for c in region_calls) == ["AB1 2CD", "EF3 4GH"]
+    assert len(responses.calls) == 2 * 2 + 4 * 3
+    assert [p["title"] for p in programmes[:3]] == ["Day 0", "Day 1", "Day 2"]
+    assert len(programmes) == 12
+    # Each region keeps its own cookies, separate from the shared session.
+    assert set(ctx.caches["freesat_sessions"]) == {"AB1 2CD", "EF3 4GH"}
+    assert all(s is not ctx.session for s in ctx.caches["freesat_sessions"].values())
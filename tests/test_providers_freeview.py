@@ -82,3 +82,136 @@ def test_freeview_fetch_programmes_builds_details():
     assert programme["description"] == "Detailed synopsis"
     assert programme["icon"] == "http://img/detail?w=800"
     assert programme["channel"] == "freeview.test"
+    # The detail query is URL-encoded; cache and cassette keys depend on it.
+    assert responses.calls[-1].request.url == (
+        "https://www.freeview.co.uk/api/program?sid=999&nid=123&pid=abc"
+        "&start_time=2024-01-02T00%3A00%3A00%2B0000&duration=PT1H"
+    )
+
+
+@freeze_time("2024-01-02 12:00:00", tz_offset=0)
+@responses.activate
+def test_freeview_region_payload_is_indexed_once_per_region():
+    from src.providers.freeview import prefetch
+
+    def _service(service_id, title):
+        return {
+            "service_id": service_id,
+            "events": [
+                {
+                    "main_title": title,
+                    "secondary_title": "Listing",
+                    "start_time": "2024-01-02T00:00:00+0000",
+                    "duration": "PT1H",
+                }
+            ],
+        }
+
+    responses.get(
+        "https://www.freeview.co.uk/api/tv-guide",
+        json={"data": {"programs": [_service(1, "One"), _service(2, "Two"), _service(3, "Three")]}},
+    )
+    ctx = Context(session=requests.Session(), tz=pytz.UTC, days=1, caches={})
+    channels = [
+        {"region_id": 64, "provider_id": 1, "xmltv_id": "one"},
+        {"region_id": 64, "provider_id": 3, "xmltv_id": "three"},
+    ]
+
+    prefetch(channels, ctx)
+    programmes = [fetch_programmes(channel, ctx) for channel in channels]
+
+    assert [[p["title"] for p in progs] for progs in programmes] == [["One"], ["Three"]]
+    guide_calls = [c for c in responses.calls if "/api/tv-guide" in c.request.url]
+    assert len(guide_calls) == 1
+    # Only the configured services of the region are kept.
+    (index,) = ctx.caches["freeview_events"].values()
+    assert sorted(index) == [1, 3]
+
+
+@freeze_time("2024-01-02 12:00:00", tz_offset=0)
+@responses.activate
+def test_freeview_region_index_covers_services_of_later_fetches():
+    from src.executor import fetch_channels
+    from src.providers import freeview
+
+    def _service(service_id, title):
+        return {
+            "service_id": service_id,
+            "events": [
+                {
+                    "main_title": title,
+                    "start_time": "2024-01-02T00:00:00+0000",
+                    "duration": "PT1H",
+                }
+            ],
+        }
+
+    responses.get(
+        "https://www.freeview.co.uk/api/tv-guide",
+        json={"data": {"programs": [_service(1, "A"), _service(2, "B")]}},
+    )
+    ctx = Context(session=requests.Session(), tz=pytz.UTC, days=1, caches={})
+    first = [{"src": "freeview", "region_id": 64, "provider_id": 1, "xmltv_id": "a"}]
+    second = [{"src": "freeview", "region_id": 64, "provider_id": 2, "xmltv_id": "b"}]
+
+    # E.g. a primary tier, then a fallback tier of the same build.
+    tier_one = fetch_channels(first, ctx, {"freeview": freeview}, workers=2)
+    tier_two = fetch_channels(second, ctx, {"freeview": freeview}, workers=2)
+    # A channel fetched without its provider's prefetch hook.
+    again = freeview.fetch_programmes(
+        {"region_id": 64, "provider_id": 2, "xmltv_id": "b2"}, ctx
+    )
+
+    assert [p["title"] for p in tier_one] == ["A"]
+    assert [p["title"] for p in tier_two] == ["B"]
+    assert [p["title"] for p in again] == ["B"]
+    guide_calls = [c for c in responses.calls if "/api/tv-guide" in c.request.url]
+    assert len(guide_calls) == 2
+
+
+@freeze_time("2024-01-02 12:00:00", tz_offset=0)
+@responses.activate
+def test_freeview_details_are_fetched_once_across_regions():
+    from src.executor import fetch_channels
+    from src.providers import freeview
+
+    for region_id in (1, 2):
+        responses.get(
+            "https://www.freeview.co.uk/api/tv-guide",
+            json={
+                "data": {
+                    "programs": [
+                        {
+                            "service_id": 10,
+                            "events": [
+                                {
+                                    "main_title": "National News",
+                                    "start_time": "2024-01-02T18:00:00+0000",
+                                    "duration": "PT30M",
+                                    "program_id": "news",
+                                }
+                            ],
+                        }
+                    ]
+                }
+            },
+            match=[responses.matchers.query_param_matcher({"nid": str(region_id)}, strict_match=False)],
+        )
+    responses.get(
+        "https://www.freeview.co.uk/api/program",
+        json={"data": {"programs": [{"synopsis": {"medium": "Tonight's headlines"}}]}},
+    )
+    ctx = Context(session=requests.Session(), tz=pytz.UTC, days=1, caches={})
+    channels = [
+        {"src": "freeview", "region_id": 1, "provider_id": 10, "xmltv_id": "bbc1.north"},
+        {"src": "freeview", "region_id": 2, "provider_id": 10, "xmltv_id": "bbc1.south"},
+    ]
+
+    programmes = fetch_channels(channels, ctx, {"freeview": freeview}, workers=4)
+
+    guide_calls = [c for c in responses.calls if "/api/tv-guide?" in c.request.url]
+    detail_calls = [c for c in responses.calls if "/api/program?" in c.request.url]
+    assert len(guide_calls) == 2
+    assert len(detail_calls) == 1
+    assert [p["channel"] for p in programmes] == ["bbc1.north", "bbc1.south"]
+    assert [p["description"] for p in programmes] == ["Tonight's headlines"] * 2
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 
 import pytest
@@ -52,3 +53,87 @@ def test_radiotimes_fetch_programmes_includes_details():
     assert programme["description"] == "Radio details"
     assert programme["icon"] == "http://img/radio.png"
     assert programme["channel"] == "rt.test"
+
+
+@freeze_time("2024-01-02 12:00:00", tz_offset=0)
+@responses.activate
+def test_radiotimes_details_persist_between_runs(tmp_path):
+    from src.enrichment import EnrichmentStore
+
+    base = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    schedule_url = (
+        "https://www.radiotimes.com/api/broadcast/broadcast/channels/rt-1/schedule"
+        f"?from={base:%Y-%m-%dT%H:%M:%S.000Z}&to={base + timedelta(days=1):%Y-%m-%dT%H:%M:%S.000Z}"
+    )
+    responses.get(
+        schedule_url,
+        json=[
+            {
+                "type": "episode",
+                "id": episode_id,
+                "title": episode_id,
+                "start": f"2024-01-02T0{n}:00:00Z",
+                "end": f"2024-01-02T0{n}:30:00Z",
+            }
+            for n, episode_id in enumerate(["known", "unknown"])
+        ],
+    )
+    details_url = "https://www.radiotimes.com/api/broadcast/broadcast/details/"
+    responses.get(details_url + "known", json={"description": "Known", "extra": "x" * 100})
+    responses.get(details_url + "unknown", status=404)
+    channel = {"provider_id": "rt-1", "xmltv_id": "rt.test"}
+
+    runs = []
+    for _ in range(2):
+        store = EnrichmentStore(tmp_path / "enrichment.sqlite")
+        ctx = Context(session=requests.Session(), tz=pytz.UTC, days=1, caches={}, enrichment=store)
+        runs.append([p["description"] for p in fetch_programmes(channel, ctx)])
+        store.close()
+
+    assert runs == [["Known", None], ["Known", None]]
+    detail_calls = [c for c in responses.calls if "/details/" in c.request.url]
+    # The second run answers both lookups, including the 404, from the store.
+    assert len(detail_calls) == 2
+
+
+class _FakeAsyncSession:
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.urls = []
+
+    async def get_json(self, url, params=None, headers=None, timeout=None):
+        self.urls.append(url)
+        await asyncio.sleep(0)
+        return self.payloads[url]
+
+
+@freeze_time("2024-01-02 12:00:00", tz_offset=0)
+def test_radiotimes_fetch_programmes_async_shares_detail_requests():
+    from src.providers.radiotimes import fetch_programmes_async
+
+    base = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    schedule_url = "https://www.radiotimes.com/api/broadcast/broadcast/channels/rt-1/schedule"
+    details_url = "https://www.radiotimes.com/api/broadcast/broadcast/details/episode-1"
+    payloads = {details_url: {"description": "Radio details"}}
+    for day in range(2):
+        date = base + timedelta(days=day)
+        from_str = date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        to_str = (date + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        payloads[f"{schedule_url}?from={from_str}&to={to_str}"] = [
+            {
+                "type": "episode",
+                "id": "episode-1",
+                "title": f"Radio Show {day}",
+                "start": f"2024-01-0{2 + day}T00:00:00Z",
+                "end": f"2024-01-0{2 + day}T01:00:00Z",
+            }
+        ]
+    session = _FakeAsyncSession(payloads)
+    ctx = Context(session=None, tz=pytz.UTC, days=2, caches={}, async_session=session)
+    channel = {"provider_id": "rt-1", "xmltv_id": "rt.test"}
+
+    programmes = asyncio.run(fetch_programmes_async(channel, ctx))
+
+    assert [p["title"] for p in programmes] == ["Radio Show 0", "Radio Show 1"]
+    assert all(p["description"] == "Radio details" for p in programmes)
+    assert session.urls.count(details_url) == 1
@@ -0,0 +1,96 @@
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from importlib.metadata import EntryPoint
+from pathlib import Path
+from unittest import mock
+
+from src.providers import ENTRY_POINT_GROUP, ProviderRegistry
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Loads the Sky provider through the default registry and prints the
+# provider modules that ended up imported.
+_IMPORTED_SCRIPT = textwrap.dedent(
+    """
+    import sys
+    from src.providers import PROVIDERS
+
+    providers = PROVIDERS.load(["sky", "sky", "unknown"])
+    print(sorted(providers))
+    print(sorted(m for m in sys.modules if m.startswith("src.providers.")))
+    """
+)
+
+
+class TestProviderRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        sys.path.insert(0, self.tmp.name)
+
+    def tearDown(self):
+        sys.path.remove(self.tmp.name)
+        for name in [m for m in sys.modules if m.startswith("fake_provider")]:
+            del sys.modules[name]
+        self.tmp.cleanup()
+
+    def _module(self, name, source="def fetch_programmes(channel, ctx):\n    return []\n"):
+        (Path(self.tmp.name) / f"{name}.py").write_text(source)
+        return name
+
+    def test_only_referenced_providers_are_imported(self):
+        result = subprocess.run(
+            [sys.executable, "-c", _IMPORTED_SCRIPT],
+            cwd=ROOT,
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+
+        loaded, imported = result.stdout.splitlines()
+        self.assertEqual(loaded, "['sky']")
+        self.assertEqual(imported, "['src.providers.base', 'src.providers.sky']")
+
+    def test_modules_are_imported_on_first_lookup(self):
+        registry = ProviderRegistry({"a": self._module("fake_provider_a")}, group=None)
+
+        self.assertIn("a", registry)
+        self.assertNotIn("fake_provider_a", sys.modules)
+        self.assertIs(registry["a"], sys.modules["fake_provider_a"])
+        self.assertEqual(list(registry), ["a"])
+
+    def test_entry_points_add_but_do_not_replace_providers(self):
+        registry = ProviderRegistry({"a": self._module("fake_provider_a")})
+        entry_points = [
+            EntryPoint("ext", self._module("fake_provider_ext"), ENTRY_POINT_GROUP),
+            EntryPoint("a", "fake_provider_other", ENTRY_POINT_GROUP),
+        ]
+
+        with mock.patch("src.providers.entry_points", return_value=entry_points) as found:
+            with self.assertLogs(level="WARNING"):
+                self.assertIn("ext", registry)
+            self.assertEqual(registry["ext"].__name__, "fake_provider_ext")
+            self.assertEqual(registry["a"].__name__, "fake_provider_a")
+            self.assertNotIn("missing", registry)
+
+        found.assert_called_once_with(group=ENTRY_POINT_GROUP)
+
+    def test_failing_imports_are_left_out(self):
+        registry = ProviderRegistry(
+            {
+                "ok": self._module("fake_provider_ok"),
+                "broken": self._module("fake_provider_broken", "raise ImportError('no lxml')\n"),
+            },
+            group=None,
+        )
+
+        with self.assertLogs(level="ERROR"):
+            providers = registry.load(["broken", "ok", None])
+
+        self.assertEqual(list(providers), ["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
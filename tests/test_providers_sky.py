@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 pytz = pytest.importorskip("pytz")
@@ -51,3 +53,124 @@ def test_sky_fetch_programmes_parses_events():
     assert programme["season"] == 2
     assert programme["episode"] == 5
     assert programme["channel"] == "sky.test"
+
+
+class _FakeAsyncSession:
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.urls = []
+
+    async def get_json(self, url, params=None, headers=None, timeout=None):
+        self.urls.append(url)
+        if url not in self.payloads:
+            raise RuntimeError("not found")
+        return self.payloads[url]
+
+
+@freeze_time("2024-01-02 12:00:00")
+def test_sky_fetch_programmes_async_matches_sync_order():
+    from src.providers.sky import fetch_programmes_async
+
+    payloads = {
+        "https://awk.epgsky.com/hawk/linear/schedule/20240102/1001": {
+            "schedule": [{"events": [{"t": "Day One", "st": 100, "d": 60}]}]
+        },
+        "https://awk.epgsky.com/hawk/linear/schedule/20240104/1001": {
+            "schedule": [{"events": [{"t": "Day Three", "st": 300, "d": 60}]}]
+        },
+    }
+    session = _FakeAsyncSession(payloads)
+    ctx = Context(session=None, tz=pytz.UTC, days=3, caches={}, async_session=session)
+    channel = {"provider_id": "1001", "xmltv_id": "sky.test"}
+
+    programmes = asyncio.run(fetch_programmes_async(channel, ctx))
+
+    assert [p["title"] for p in programmes] == ["Day One", "Day Three"]
+    assert len(session.urls) == 3
+
+
+@freeze_time("2024-01-02 12:00:00")
+def test_sky_fetch_programmes_async_only_requests_selected_days():
+    from src.providers.sky import fetch_programmes_async
+
+    session = _FakeAsyncSession({})
+    ctx = Context(
+        session=None,
+        tz=pytz.UTC,
+        days=7,
+        caches={},
+        async_session=session,
+        day_offsets=[6, 0, 1],
+    )
+
+    asyncio.run(fetch_programmes_async({"provider_id": "1001", "xmltv_id": "sky.test"}, ctx))
+
+    assert session.urls == [
+        "https://awk.epgsky.com/hawk/linear/schedule/20240102/1001",
+        "https://awk.epgsky.com/hawk/linear/schedule/20240103/1001",
+        "https://awk.epgsky.com/hawk/linear/schedule/20240108/1001",
+    ]
+
+
+@freeze_time("2024-01-02 12:00:00")
+@responses.activate
+def test_sky_prefetch_batches_services_and_splits_rejected_batches():
+    from src.providers import sky
+
+    base = "https://awk.epgsky.com/hawk/linear/schedule/20240102/"
+    responses.get(base + "1,2,3,4", status=400)
+    responses.get(
+        base + "1,2",
+        json={
+            "schedule": [
+                {"sid": "1", "events": [{"t": "One", "st": 100, "d": 60}]},
+                {"sid": "2", "events": [{"t": "Two", "st": 200, "d": 60}]},
+            ]
+        },
+    )
+    responses.get(base + "3,4", status=400)
+    responses.get(base + "3", json={"schedule": [{"sid": "3", "events": []}]})
+    responses.get(base + "4", status=404)
+    session = requests.Session()
+    ctx = Context(session=session, tz=pytz.UTC, days=1, caches={})
+    channels = [{"provider_id": str(n), "xmltv_id": f"sky{n}"} for n in range(1, 5)]
+
+    sky.prefetch(channels, ctx)
+    requests_made = len(responses.calls)
+    programmes = [sky.fetch_programmes(channel, ctx) for channel in channels]
+
+    assert requests_made == 5
+    # Every channel is served from the prefetched batches.
+    assert len(responses.calls) == requests_made
+    assert [[p["title"] for p in progs] for progs in programmes] == [["One"], ["Two"], [], []]
+    assert programmes[1][0]["channel"] == "sky2"
+
+
+@freeze_time("2024-01-02 12:00:00")
+@responses.activate
+def test_sky_services_missing_from_a_batch_are_fetched_alone():
+    from src.providers import sky
+
+    base = "https://awk.epgsky.com/hawk/linear/schedule/20240102/"
+    # The batch response leaves out service 2.
+    responses.get(
+        base + "1,2,3",
+        json={
+            "schedule": [
+                {"sid": "1", "events": [{"t": "One", "st": 100, "d": 60}]},
+                {"sid": "3", "events": []},
+            ]
+        },
+    )
+    responses.get(
+        base + "2",
+        json={"schedule": [{"sid": "2", "events": [{"t": "Two", "st": 200, "d": 60}]}]},
+    )
+    ctx = Context(session=requests.Session(), tz=pytz.UTC, days=1, caches={})
+    channels = [{"provider_id": str(n), "xmltv_id": f"sky{n}"} for n in range(1, 4)]
+
+    sky.prefetch(channels, ctx)
+    programmes = [sky.fetch_programmes(channel, ctx) for channel in channels]
+
+    assert [call.request.url for call in responses.calls] == [base + "1,2,3", base + "2"]
+    assert [[p["title"] for p in progs] for progs in programmes] == [["One"], ["Two"], []]
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.ratelimit import HostRateLimiter, TokenBucket
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        clock = _FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+        waits = [bucket.reserve() for _ in range(5)]
+
+        self.assertEqual(waits, [0.0, 0.0, 0.0, 0.5, 1.0])
+
+    def test_refill_is_capped_at_burst(self):
+        clock = _FakeClock()
+        bucket = TokenBucket(rate=10, burst=2, clock=clock)
+        bucket.reserve()
+        bucket.reserve()
+
+        clock.now = 60.0
+
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.1])
+
+
+class TestHostRateLimiter(unittest.TestCase):
+    def test_parent_domain_limits_are_shared(self):
+        clock = _FakeClock()
+        limiter = HostRateLimiter({"radiotimes.com": (1, 1)}, clock=clock)
+
+        self.assertEqual(limiter._reserve("www.radiotimes.com"), 0.0)
+        self.assertEqual(limiter._reserve("images.radiotimes.com"), 1.0)
+        # Hosts without a configured limit are not delayed.
+        self.assertEqual(limiter._reserve("example.org"), 0.0)
+        self.assertEqual(limiter._reserve("example.org"), 0.0)
+
+        stats = limiter.stats()
+        self.assertEqual(stats["images.radiotimes.com"].delayed, 1)
+        self.assertEqual(stats["images.radiotimes.com"].wait_seconds, 1.0)
+        self.assertEqual(stats["example.org"].requests, 2)
+
+    def test_threads_and_coroutines_share_one_budget(self):
+        limiter = HostRateLimiter({"api.test": (200, 2)})
+
+        async def _async_requests():
+            await asyncio.gather(*(limiter.acquire_async("api.test") for _ in range(5)))
+
+        start = time.monotonic()
+        threads = [
+            threading.Thread(target=limiter.acquire, args=("api.test",)) for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        asyncio.run(_async_requests())
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        # Ten requests with a burst of two need at least 8 / 200 seconds.
+        self.assertGreaterEqual(elapsed, 0.035)
+        self.assertEqual(limiter.stats()["api.test"].requests, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+from datetime import datetime, timezone
+
+from src.programme import Programme
+from src.providers.base import Context
+from src.sources import (
+    fetch_sources,
+    fill_gaps,
+    source_codes,
+    source_tiers,
+    uncovered_days,
+)
+
+NOW = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+DAY = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+HOUR = 3600
+
+
+def _programme(channel, start, stop, title="Show", **fields):
+    return Programme(channel=channel, start=DAY + start, stop=DAY + stop, title=title, **fields)
+
+
+def _day(channel, day, title="Show"):
+    """Programmes covering a whole day of a channel, one per hour."""
+    base = day * 24 * HOUR
+    return [
+        _programme(channel, base + hour * HOUR, base + (hour + 1) * HOUR, title)
+        for hour in range(24)
+    ]
+
+
+class TestSourceTiers(unittest.TestCase):
+    def test_sources_share_the_channel_keys(self):
+        channels = [
+            {
+                "name": "One",
+                "xmltv_id": "one.uk",
+                "sources": [{"src": "sky", "provider_id": "1"}, {"src": "rt", "provider_id": "9"}],
+            },
+            {"name": "Two", "xmltv_id": "two.uk", "src": "sky", "provider_id": "2"},
+        ]
+
+        tiers = source_tiers(channels)
+
+        self.assertEqual(
+            tiers[0],
+            [
+                {"name": "One", "xmltv_id": "one.uk", "src": "sky", "provider_id": "1"},
+                {"name": "Two", "xmltv_id": "two.uk", "src": "sky", "provider_id": "2"},
+            ],
+        )
+        self.assertEqual(
+            tiers[1], [{"name": "One", "xmltv_id": "one.uk", "src": "rt", "provider_id": "9"}]
+        )
+        self.assertEqual(source_codes(channels), ["sky", "rt"])
+
+
+class TestUncoveredDays(unittest.TestCase):
+    def test_days_with_gaps_are_reported(self):
+        programmes = _day("a", 0) + [p for p in _day("a", 1) if p.start != DAY + 30 * HOUR]
+
+        gaps = uncovered_days(["a", "b"], programmes, [0, 1, 2], now=NOW)
+
+        self.assertEqual(gaps, {"a": [1, 2], "b": [0, 1, 2]})
+
+    def test_short_gaps_are_tolerated(self):
+        programmes = _day("a", 0)
+        programmes[3] = _programme("a", 3 * HOUR + 60, 4 * HOUR)
+
+        self.assertEqual(uncovered_days(["a"], programmes, [0], tolerance=120, now=NOW), {"a": []})
+        self.assertEqual(uncovered_days(["a"], programmes, [0], tolerance=30, now=NOW), {"a": [0]})
+
+
+class TestFillGaps(unittest.TestCase):
+    def test_primary_programmes_win(self):
+        primary = [_programme("a", 0, HOUR, "P1"), _programme("a", 3 * HOUR, 4 * HOUR, "P2")]
+        fallback = [
+            _programme("a", 0, HOUR, "Same slot"),
+            _programme("a", HOUR, 2 * HOUR, "Gap"),
+            _programme("a", 2 * HOUR, 3 * HOUR + 60, "Trimmed"),
+            _programme("a", 3 * HOUR + 600, 5 * HOUR, "Overlapping"),
+            _programme("b", 0, HOUR, "Other channel"),
+        ]
+
+        merged = fill_gaps(primary, fallback, tolerance=300)
+
+        self.assertEqual(merged[:2], primary)
+        self.assertEqual(
+            [(p.title, p.start - DAY, p.stop - DAY) for p in merged[2:]],
+            [
+                ("Gap", HOUR, 2 * HOUR),
+                ("Trimmed", 2 * HOUR, 3 * HOUR),
+                ("Other channel", 0, HOUR),
+            ],
+        )
+        # Trimming copies the programme rather than changing the fallback.
+        self.assertEqual(fallback[2].stop, DAY + 3 * HOUR + 60)
+
+    def test_trimmed_start(self):
+        primary = [_programme("a", 0, HOUR, "P1")]
+        fallback = [_programme("a", HOUR - 120, 2 * HOUR, "Late", description="kept")]
+
+        merged = fill_gaps(primary, fallback, tolerance=300)
+
+        self.assertEqual(merged[1].start, DAY + HOUR)
+        self.assertEqual(merged[1].description, "kept")
+
+
+class TestFetchSources(unittest.TestCase):
+    def test_fallback_is_fetched_for_uncovered_days_only(self):
+        channels = [
+            {"xmltv_id": "a", "sources": [{"src": "sky"}, {"src": "rt"}]},
+            {"xmltv_id": "b", "sources": [{"src": "sky"}, {"src": "rt"}]},
+            {"xmltv_id": "c", "src": "sky"},
+        ]
+        calls = []
+
+        def fetch(tier, ctx):
+            calls.append(([ch["xmltv_id"] for ch in tier], ctx.fetch_days()))
+            programmes = []
+            for channel in tier:
+                for day in ctx.fetch_days():
+                    if channel["src"] == "rt":
+                        programmes += _day(channel["xmltv_id"], day, "rt")
+                    elif channel["xmltv_id"] != "b" or day == 0:
+                        programmes += _day(channel["xmltv_id"], day, "sky")
+            return programmes
+
+        ctx = Context(session=None, tz=timezone.utc, days=2)
+        programmes = fetch_sources(channels, ctx, fetch, now=NOW)
+
+        self.assertEqual(calls, [(["a", "b", "c"], [0, 1]), (["b"], [1])])
+        titles = {}
+        for programme in programmes:
+            titles.setdefault(programme.channel, set()).add(programme.title)
+        self.assertEqual(titles, {"a": {"sky"}, "b": {"sky", "rt"}, "c": {"sky"}})
+        self.assertEqual(len([p for p in programmes if p.channel == "b"]), 48)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+
+requests = pytest.importorskip("requests")
+responses = pytest.importorskip("responses")
+
+from src.cache import ResponseCache
+from src.http import make_session, tag_channel, tag_provider
+from src.telemetry import RequestSample, Telemetry, percentile, request_day
+
+SKY_URL = "https://awk.epgsky.com/hawk/linear/schedule/20240108/2002"
+
+
+def _clock():
+    return datetime(2024, 1, 8, 6, 0, tzinfo=timezone.utc)
+
+
+def _sample(host, seconds, **kwargs):
+    fields = dict(provider="sky", channel=None, day=None, method="GET", status=200)
+    fields.update(kwargs)
+    return RequestSample(host=host, seconds=seconds, **fields)
+
+
+class TestRequestDay(unittest.TestCase):
+    def test_schedule_urls_are_mapped_to_their_day(self):
+        today = lambda: date(2024, 1, 8)  # noqa: E731
+        cases = {
+            SKY_URL: "2024-01-08",
+            "https://www.radiotimes.com/api/broadcast/broadcast/channels/bbc1/schedule"
+            "?from=2024-01-09T00:00:00.000Z&to=2024-01-10T00:00:00.000Z": "2024-01-09",
+            "https://www.freeview.co.uk/api/tv-guide?nid=64257&start=1704844800": "2024-01-10",
+            "https://api.youview.tv/metadata/linear/v2/schedule/by-servicelocator"
+            "?serviceLocator=dvb%3A%2F%2F233a..1044&interval=2024-01-11T12Z%2FPT12H": "2024-01-11",
+            "https://www.freesat.co.uk/tv-guide/api/4?channel=560": "2024-01-12",
+            "https://www.freeview.co.uk/api/program?sid=1&nid=2&pid=3": None,
+        }
+        for url, expected in cases.items():
+            self.assertEqual(request_day(url, today=today), expected, url)
+
+
+class TestTelemetry(unittest.TestCase):
+    def test_percentiles_are_nearest_rank(self):
+        samples = [float(n) for n in range(1, 101)]
+        self.assertEqual(
+            [percentile(samples, p) for p in (50, 95, 99)], [50.0, 95.0, 99.0]
+        )
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summary_and_metrics(self):
+        telemetry = Telemetry(clock=_clock)
+        for seconds in (0.1, 0.2, 0.3, 0.4):
+            telemetry.record(_sample("a.com", seconds, channel="one", day="2024-01-08"))
+        telemetry.record(_sample("a.com", 0.0, channel="one", cache="hit"))
+        telemetry.record(_sample("b.com", 2.0, provider="rt", channel="two", wait=0.5))
+        telemetry.record(_sample("b.com", 1.0, provider="rt", status=None, retries=3))
+
+        report = telemetry.summary(top=1)
+
+        hosts = report["hosts"]
+        self.assertEqual((hosts["a.com"]["requests"], hosts["a.com"]["network_requests"]), (5, 4))
+        self.assertEqual((hosts["a.com"]["p50"], hosts["a.com"]["p99"]), (0.2, 0.4))
+        self.assertEqual((hosts["b.com"]["errors"], hosts["b.com"]["retries"]), (1, 3))
+        self.assertEqual(report["providers"]["sky"]["cache"], {"hit": 1})
+        self.assertEqual(report["providers"]["rt"]["statuses"], {"200": 1, "error": 1})
+        self.assertEqual(report["days"]["2024-01-08"]["requests"], 4)
+        self.assertEqual([c["channel"] for c in report["slowest_channels"]], ["two"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "reports" / "metrics.prom"
+            telemetry.write_openmetrics(path, report=report)
+            lines = path.read_text(encoding="utf-8").splitlines()
+            written = telemetry.write_report(Path(tmp) / "reports" / "run.json", top=1)
+            self.assertEqual(json.loads((Path(tmp) / "reports" / "run.json").read_text()), written)
+
+        self.assertIn('epg_http_request_seconds{host="b.com",quantile="0.95"} 2.0', lines)
+        self.assertIn('epg_http_request_seconds_count{host="a.com"} 4', lines)
+        self.assertIn('epg_http_requests_total{provider="sky"} 5', lines)
+        self.assertIn('epg_channel_network_seconds{channel="two",provider="rt"} 2.5', lines)
+        self.assertEqual(lines[-1], "# EOF")
+
+
+class TestSessionTelemetry(unittest.TestCase):
+    @responses.activate
+    def test_requests_are_measured_and_tagged(self):
+        responses.get(SKY_URL, json={"schedule": []})
+        responses.get("https://awk.epgsky.com/missing", status=404)
+        telemetry = Telemetry()
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(Path(tmp) / "http.sqlite")
+            session = make_session(cache=cache, telemetry=telemetry)
+            with tag_provider("sky"), tag_channel("SkyNews.uk"):
+                session.get(SKY_URL)
+                session.get(SKY_URL)
+            session.get("https://awk.epgsky.com/missing")
+            cache.close()
+
+        first, second, missing = telemetry.samples()
+        self.assertEqual(
+            (first.provider, first.channel, first.host, first.day),
+            ("sky", "SkyNews.uk", "awk.epgsky.com", "2024-01-08"),
+        )
+        self.assertEqual((first.status, first.bytes, first.cache), (200, 16, "miss"))
+        self.assertEqual(second.cache, "hit")
+        self.assertEqual((missing.provider, missing.channel, missing.status), (None, None, 404))
+
+    def test_failed_requests_are_recorded(self):
+        telemetry = Telemetry()
+        session = make_session(telemetry=telemetry)
+        with responses.RequestsMock():
+            with self.assertRaises(requests.ConnectionError):
+                session.get("https://awk.epgsky.com/unreachable")
+
+        (sample,) = telemetry.samples()
+        self.assertIsNone(sample.status)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unicodedata
+import unittest
+
+from src.programme import Programme
+from src.text import TextPool, normalise_programmes, remove_control_characters
+
+
+class TestRemoveControlCharacters(unittest.TestCase):
+    def test_matches_a_category_scan(self):
+        text = "Tab\there\x00, zero​width, bidi‮, private, kept: é 日本 ☃  "
+
+        expected = "".join(ch for ch in text if unicodedata.category(ch)[0] != "C")
+
+        self.assertEqual(remove_control_characters(text), expected)
+        self.assertEqual(remove_control_characters(text), expected)
+
+    def test_printable_text_is_returned_as_is(self):
+        text = "Nothing to remove"
+
+        self.assertIs(remove_control_characters(text), text)
+
+
+class TestNormaliseProgrammes(unittest.TestCase):
+    def test_text_is_shared_and_left_as_is(self):
+        programmes = [
+            Programme(
+                channel="".join(["a", ".uk"]),
+                start=index,
+                stop=index + 1,
+                title="".join(["B\t", "x"]),
+                description="".join(["Headlines [HD] ", "S3 Ep5"]),
+                icon="".join(["http://", "icon"]),
+            )
+            for index in range(2)
+        ]
+        pool = TextPool()
+
+        first, second = normalise_programmes(programmes, pool)
+
+        # The guide's content is unchanged; the writer cleans descriptions.
+        self.assertEqual(first.title, "B\tx")
+        self.assertEqual(first.description, "Headlines [HD] S3 Ep5")
+        for field in ("channel", "title", "description", "icon"):
+            self.assertIs(getattr(first, field), getattr(second, field))
+        self.assertEqual(len(pool), 4)
+
+    def test_missing_text_is_left_alone(self):
+        (programme,) = normalise_programmes([{"channel": "a", "start": 0, "stop": 1}])
+
+        self.assertIsNone(programme.title)
+        self.assertIsNone(programme.description)
+        self.assertIsNone(programme.icon)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from datetime import timezone
+
+from src.programme import Programme
+from src.providers.base import Context
+from src.timeshift import apply_timeshifts, check_timeshifts, split_timeshifts
+
+HOUR = 3600
+
+
+def _schedule(channel, titles, offset=0):
+    return [
+        Programme(
+            channel=channel,
+            start=offset + index * HOUR,
+            stop=offset + (index + 1) * HOUR,
+            title=title,
+        )
+        for index, title in enumerate(titles)
+    ]
+
+
+PARENT = {"xmltv_id": "five", "src": "sky", "provider_id": "1"}
+PLUS_ONE = {"xmltv_id": "five+1", "timeshift_of": "five", "src": "sky", "provider_id": "2"}
+
+
+class TestSplitTimeshifts(unittest.TestCase):
+    def test_channels_with_a_fetched_parent_are_derived(self):
+        orphan = {"xmltv_id": "orphan+1", "timeshift_of": "missing", "src": "sky"}
+        sourceless = {"xmltv_id": "bare+1", "timeshift_of": "missing"}
+
+        with self.assertLogs(level="WARNING"):
+            fetched, derived = split_timeshifts([PARENT, PLUS_ONE, orphan, sourceless])
+
+        self.assertEqual(fetched, [PARENT, orphan])
+        self.assertEqual(derived, [PLUS_ONE])
+
+
+class TestApplyTimeshifts(unittest.TestCase):
+    def test_parent_programmes_are_shifted(self):
+        parent = _schedule("five", ["News", "Film"])
+        stale = _schedule("five+1", ["Old"])
+        other = _schedule("other", ["Quiz"])
+        plus_two = {"xmltv_id": "five+2", "timeshift_of": "five", "timeshift_minutes": 120}
+
+        programmes = apply_timeshifts([PLUS_ONE, plus_two], parent + stale + other)
+
+        self.assertEqual(programmes[:3], parent + other)
+        self.assertEqual(programmes[3:5], _schedule("five+1", ["News", "Film"], offset=HOUR))
+        self.assertEqual(programmes[5:], _schedule("five+2", ["News", "Film"], offset=2 * HOUR))
+        # The parent's records are copied, not moved.
+        self.assertEqual(parent[0].channel, "five")
+
+
+class TestCheckTimeshifts(unittest.TestCase):
+    def test_diverged_channels_are_reported(self):
+        parent = _schedule("five", ["News", "Film", "Quiz", "Soap", "Drama"])
+        diverged = dict(PLUS_ONE, xmltv_id="diverged+1")
+        calls = []
+
+        def fetch(channels, ctx):
+            calls.append(([ch["xmltv_id"] for ch in channels], ctx.fetch_days()))
+            return _schedule("five+1", ["News", "Film", "Quiz", "Soap", "Drama"], HOUR) + _schedule(
+                "diverged+1", ["Sport"] * 5, HOUR
+            )
+
+        ctx = Context(session=None, tz=timezone.utc, days=7)
+        with self.assertLogs(level="WARNING"):
+            result = check_timeshifts(
+                [PLUS_ONE, diverged, {"xmltv_id": "bare+1", "timeshift_of": "five"}],
+                parent,
+                ctx,
+                fetch,
+                parents=[PARENT],
+            )
+
+        self.assertEqual(result, [diverged])
+        self.assertEqual(calls, [(["five+1", "diverged+1"], [1])])
+
+    def test_other_providers_are_matched_by_start_and_duration(self):
+        parent = _schedule("five", ["News", "Film", "Quiz", "Soap", "Drama"])
+        renamed = dict(PLUS_ONE, src="rt")
+        moved = dict(renamed, xmltv_id="moved+1")
+
+        def fetch(channels, ctx):
+            # Another provider's titles, in the same slots for five+1 only.
+            titles = ["BBC News", "Film: Heat", "Quiz Night", "Soap!", "Drama (New)"]
+            return _schedule("five+1", titles, HOUR) + _schedule("moved+1", titles, HOUR + 1800)
+
+        ctx = Context(session=None, tz=timezone.utc, days=7)
+        with self.assertLogs(level="WARNING"):
+            result = check_timeshifts([renamed, moved], parent, ctx, fetch, parents=[PARENT])
+
+        self.assertEqual(result, [moved])
+
+
+if __name__ == "__main__":
+    unittest.main()
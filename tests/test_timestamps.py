@@ -0,0 +1,59 @@
+import unittest
+
+import pytest
+
+pytz = pytest.importorskip("pytz")
+
+from src.timestamps import TimestampFormatter, format_timestamp
+
+# 2024-03-30 00:00 UTC, the day before the clocks went forward in the UK.
+SPRING = 1711756800
+# 2024-10-26 00:00 UTC, the day before the clocks went back.
+AUTUMN = 1729900800
+DAY = 86400
+
+
+class TestTimestampFormatter(unittest.TestCase):
+    def assertMatchesStrftime(self, tz, start, stop, step=900):
+        formatter = TimestampFormatter(tz, start, stop)
+        for timestamp in range(start - DAY, stop + DAY, step):
+            self.assertEqual(formatter(timestamp), format_timestamp(timestamp, tz), timestamp)
+
+    def test_transitions_match_strftime(self):
+        london = pytz.timezone("Europe/London")
+        self.assertMatchesStrftime(london, SPRING, SPRING + 3 * DAY)
+        self.assertMatchesStrftime(london, AUTUMN, AUTUMN + 3 * DAY)
+
+    def test_transition_second(self):
+        london = pytz.timezone("Europe/London")
+        formatter = TimestampFormatter(london, SPRING, SPRING + 2 * DAY)
+        change = SPRING + DAY + 3600  # 01:00 UTC on 31 March
+
+        self.assertEqual(formatter(change - 1), "20240331005959 +0000")
+        self.assertEqual(formatter(change), "20240331020000 +0100")
+
+    def test_other_timezones(self):
+        for name in ("America/New_York", "Asia/Kolkata", "UTC"):
+            tz = pytz.timezone(name)
+            self.assertMatchesStrftime(tz, AUTUMN, AUTUMN + 8 * DAY, step=3600 + 7)
+
+    def test_fractional_timestamps_match_strftime(self):
+        london = pytz.timezone("Europe/London")
+        formatter = TimestampFormatter(london, SPRING, SPRING + DAY)
+
+        self.assertEqual(formatter(SPRING + 0.5), format_timestamp(SPRING + 0.5, london))
+        self.assertEqual(formatter(float(SPRING)), format_timestamp(SPRING, london))
+
+    def test_repeated_timestamps(self):
+        london = pytz.timezone("Europe/London")
+        formatter = TimestampFormatter(london, SPRING, SPRING + DAY)
+
+        stop = formatter(SPRING + 3600)
+        # A stop time repeated as the next start reuses its text.
+        self.assertIs(formatter(SPRING + 3600), stop)
+        formatter(SPRING + 7200)
+        self.assertEqual(formatter(SPRING + 3600), stop)
+
+
+if __name__ == "__main__":
+    unittest.main()
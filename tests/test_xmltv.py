@@ -1,12 +1,61 @@
+import gzip
+import lzma
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
 import unittest
 from datetime import timedelta
+from pathlib import Path
 
 import pytest
 
 pytz = pytest.importorskip("pytz")
 etree = pytest.importorskip("lxml.etree")
 
-from src.xmltv import build_xmltv, clean_text, parse_duration, remove_control_characters
+from src.xmltv import (
+    _iter_elements,
+    build_xmltv,
+    clean_text,
+    parse_duration,
+    remove_control_characters,
+    write_xmltv,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Writes a guide of N programmes and prints how far the peak RSS rose above
+# the RSS measured once the input programmes were built.
+_RSS_SCRIPT = textwrap.dedent(
+    """
+    import os, resource, sys, tempfile
+    import pytz
+    from src.xmltv import write_xmltv
+
+    n = int(sys.argv[1])
+    channels = [{"xmltv_id": f"ch{i}", "name": f"Channel {i}", "lang": "en"} for i in range(50)]
+    programmes = [
+        {
+            "channel": f"ch{i % 50}",
+            "start": 1_700_000_000 + i * 60,
+            "stop": 1_700_000_000 + i * 60 + 1800,
+            "title": f"Programme {i}",
+            "description": "A fairly long description of the programme " * 4,
+            "icon": f"https://img.example/{i}.jpg",
+            "season": 1,
+            "episode": 2,
+        }
+        for i in range(n)
+    ]
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    before = int(open("/proc/self/statm").read().split()[1]) * page_size
+    with tempfile.TemporaryDirectory() as tmp:
+        write_xmltv(os.path.join(tmp, "epg.xml"), channels, programmes, pytz.UTC)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(max(0, peak - before))
+    """
+)
 
 
 class TestXmltvHelpers(unittest.TestCase):
@@ -82,5 +131,101 @@ class TestBuildXmltv(unittest.TestCase):
         self.assertIsNotNone(early_programme.find("premiere"))
 
 
+class TestWriteXmltv(unittest.TestCase):
+    def _sample(self):
+        channels = [
+            {"xmltv_id": "b", "name": "B & B", "lang": "en", "icon_url": "http://img/b.png"},
+            {"xmltv_id": "a", "name": "Alpha", "lang": "en"},
+        ]
+        programmes = [
+            {
+                "channel": channel,
+                "start": 1_700_000_000 + (i % 5) * 1800,
+                "stop": 1_700_000_000 + (i % 5) * 1800 + 1800,
+                "title": f"Show <{i % 3}>",
+                "description": "Drama [HD]" if i % 2 else None,
+                "icon": "http://img/x.png?a=1&b=2" if i % 4 == 0 else None,
+                "premiere": i % 5 == 0,
+                "season": i % 3,
+                "episode": 4,
+            }
+            for i in range(40)
+            for channel in ("a", "b")
+        ]
+        return channels, programmes
+
+    def test_output_matches_pretty_printed_tree(self):
+        channels, programmes = self._sample()
+        tz = pytz.timezone("Europe/London")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "epg.xml"
+            write_xmltv(str(path), channels, programmes, tz)
+            written = path.read_bytes()
+            self.assertFalse(Path(f"{path}.tmp").exists())
+
+        # Serialise the whole tree in one go, as the writer used to.
+        root = etree.Element(
+            "tv",
+            {
+                "generator-info-name": "freeview-epg",
+                "generator-info-url": "https://github.com/dp247/Freeview-EPG",
+            },
+        )
+        root.extend(_iter_elements(channels, programmes, tz))
+        self.assertEqual(written, etree.tostring(root, pretty_print=True, encoding="utf-8"))
+        self.assertEqual(written, build_xmltv(channels, programmes, tz))
+        self.assertEqual(build_xmltv([], [], tz).count(b"<tv "), 1)
+
+    def test_compressed_variants_are_deterministic(self):
+        channels, programmes = self._sample()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "epg.xml"
+            write_xmltv(str(path), channels, programmes, pytz.UTC, compress=("gz", "xz"))
+            first = {ext: Path(f"{path}.{ext}").read_bytes() for ext in ("gz", "xz")}
+            xml = path.read_bytes()
+            write_xmltv(str(path), channels, programmes, pytz.UTC, compress=("gz", "xz"))
+            second = {ext: Path(f"{path}.{ext}").read_bytes() for ext in ("gz", "xz")}
+            leftovers = sorted(p.name for p in Path(tmp).iterdir())
+
+        self.assertEqual(gzip.decompress(first["gz"]), xml)
+        self.assertEqual(lzma.decompress(first["xz"]), xml)
+        self.assertEqual(first, second)
+        self.assertEqual(leftovers, ["epg.xml", "epg.xml.gz", "epg.xml.xz"])
+
+    def test_failed_write_leaves_previous_files_untouched(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "epg.xml"
+            write_xmltv(str(path), *self._sample(), pytz.UTC, compress=("gz",))
+            before = path.read_bytes()
+            broken = [{"channel": "a", "start": None, "stop": None, "title": "x"}]
+
+            with self.assertRaises(TypeError):
+                write_xmltv(str(path), [], broken, pytz.UTC, compress=("gz",))
+
+            self.assertEqual(path.read_bytes(), before)
+            self.assertEqual(gzip.decompress(Path(f"{path}.gz").read_bytes()), before)
+            self.assertEqual(sorted(p.name for p in Path(tmp).iterdir()), ["epg.xml", "epg.xml.gz"])
+
+    @unittest.skipUnless(os.path.exists("/proc/self/statm"), "needs /proc")
+    def test_peak_memory_does_not_grow_with_programme_count(self):
+        def _rss_growth(n):
+            result = subprocess.run(
+                [sys.executable, "-c", _RSS_SCRIPT, str(n)],
+                cwd=ROOT,
+                capture_output=True,
+                check=True,
+                text=True,
+            )
+            return int(result.stdout)
+
+        small = _rss_growth(5_000)
+        large = _rss_growth(40_000)
+
+        # Eight times the programmes (about 30 MB of XML) must not need
+        # noticeably more memory than the small guide.
+        self.assertLess(large, small + 4 * 1024 * 1024)
+
+
 if __name__ == "__main__":
     unittest.main()